@@ -1,41 +1,30 @@
-import boto3
-import joblib
-import pandas as pd
-import numpy as np
-from io import BytesIO
+from datetime import datetime, timedelta
+
+import instrument
+import s3_io
+import storage
+
+# pandas/numpy/joblib(+xgboost)은 import 비용이 커서 필요한 함수 안에서 import
+# → 컨테이너 init 단계에서는 boto3(storage.py)만 로드 (측정: benchmarks/startup.py)
 
 # ===== 설정 =====
 S3_BUCKET = "subway-whitenut-bucket"
 INPUT_PREFIX = "prepared_data"     # 전처리 완료된 데이터가 있는 폴더
 OUTPUT_PREFIX = "predictions"      # 예측 CSV 저장 폴더
+LATEST_MANIFEST_KEY = f"{INPUT_PREFIX}/_latest.json"      # 전처리 Lambda가 쓰는 최신 포인터
+PREDICTION_INDEX_KEY = f"{OUTPUT_PREFIX}/_index_xgb.json"  # 이 모델의 날짜별 예측 CSV 목록
+PREDICTION_INDEX_DAYS = 90                                  # 목록에 남길 기간 (가장 최근 날짜 기준)
 
 # 모델/인코더 파일
 MODEL_XGB_KEY = "model/model_xgb_only.joblib"
+MODEL_BUNDLE_KEY = "model/bundle_xgb.npy"      # 번들(파일 하나), 없으면 아래 joblib 4개로 로드
 FEATURES_KEY = "model/features.joblib"
 LINE_ENCODER_KEY = "model/line_encoder.joblib"
 STATION_ENCODER_KEY = "model/station_encoder.joblib"
 
-# s3에 저장된 전처리 완료된 데이터 가져오기
-def _read_csv_from_s3(s3, key, encoding="utf-8"):
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    return pd.read_csv(BytesIO(obj["Body"].read()), encoding=encoding)
-
-# 예측결과 S3에 csv 형식으로 저장하기
-def _write_csv_to_s3(s3, df, key):
-    data = df.to_csv(index=False).encode("utf-8")
-    buf = BytesIO(data)
-    s3.upload_fileobj(buf, S3_BUCKET, key, ExtraArgs={"ContentType": "text/csv; charset=utf-8"})
-
-# S3에 저장된 학습 데이터 가져오기
-# 모델 학습, 인코딩 정보
-def _load_joblib(s3, key):
-    buf = BytesIO()
-    s3.download_fileobj(S3_BUCKET, key, buf)
-    buf.seek(0)
-    return joblib.load(buf)
-
 # 날짜 인코딩
 def _onehot_weekday(df):
+    import pandas as pd
     df["날짜"] = pd.to_datetime(df["날짜"]).dt.normalize()
     df["년"] = df["날짜"].dt.year
     df["월"] = df["날짜"].dt.month
@@ -48,7 +37,7 @@ def _onehot_weekday(df):
 
 # 새로 생긴 역이 들어올 경우
 # 라벨인코딩을 안전하게 실행
-def_safe_label_encode(le, series, name):
+def _safe_label_encode(le, series, name):
     series = series.astype(str).str.strip()
     known = set(le.classes_.tolist())
     mask = series.isin(known)
@@ -57,8 +46,14 @@ def_safe_label_encode(le, series, name):
     enc = le.transform(series[mask])
     return enc, mask
 
-# 가장 마지막 날짜의 데이터 가져오기기
+# 가장 마지막 날짜의 데이터 가져오기
+# prepared_data/_latest.json 한 번의 GET으로 결정
+# manifest가 없을 때(도입 이전 데이터)만 폴더 전체를 나열
 def _find_latest_prepared_csv(s3):
+    manifest = s3_io.read_json(s3, S3_BUCKET, LATEST_MANIFEST_KEY)
+    if manifest and manifest.get("key"):
+        return manifest["key"]
+
     paginator = s3.get_paginator("list_objects_v2")
     latest = None
     for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=f"{INPUT_PREFIX}/"):
@@ -69,9 +64,128 @@ def _find_latest_prepared_csv(s3):
                     latest = obj
     return None if latest is None else latest["Key"]
 
+# predictions/_index_xgb.json에 이번 예측 CSV 등록 (병합 Lambda가 두 모델 목록을 읽어 날짜 쌍 결정)
+# 모델마다 자기 목록만 쓰므로 xgb/lgb 예측이 동시에 끝나도 서로의 항목을 덮어쓰지 않음
+# 가장 최근 날짜에서 PREDICTION_INDEX_DAYS일이 지난 항목은 삭제
+# since: 목록이 빠짐없이 담고 있는 첫 날짜 (목록을 처음 만든 날, 이후 보관 기간에 맞춰 올라감)
+def _update_prediction_index(s3, date_token, key):
+    index = s3_io.read_json(s3, S3_BUCKET, PREDICTION_INDEX_KEY) or {"dates": {}, "since": date_token}
+    dates = {**index.get("dates", {}), date_token: key}
+    cutoff = (datetime.strptime(max(dates), "%Y-%m-%d") - timedelta(days=PREDICTION_INDEX_DAYS)).strftime("%Y-%m-%d")
+    index["dates"] = {d: k for d, k in sorted(dates.items()) if d >= cutoff}
+    index["since"] = max(index.get("since") or cutoff, cutoff)
+    index["updated_at"] = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    s3_io.write_json(s3, S3_BUCKET, PREDICTION_INDEX_KEY, index)
+    return index
+
+# 모델/인코더/피처 로드 작업 (입력 CSV와 함께 s3_io.fetch_many로 동시에 가져옴)
+# 번들(model_bundle.py)이 있으면 파일 하나만 /tmp로 받아 열기 (인코더는 mmap 참조, 부스터는 역직렬화)
+# bucket: 기본 S3_BUCKET (상주형 예측기는 모듈 설정을 바꾸지 않고 버킷을 넘김)
+def _artifact_tasks(s3, bucket=None):
+    bucket = bucket or S3_BUCKET
+    return {"bundle": lambda: s3_io.download_to_tmp(s3, bucket, MODEL_BUNDLE_KEY)}
+
+# 번들 도입 이전 모델: joblib 4개 (서로 독립적이라 동시에 가져옴)
+def _joblib_tasks(s3, bucket=None):
+    bucket = bucket or S3_BUCKET
+    return {
+        "models":     lambda: s3_io.load_joblib(s3, bucket, MODEL_XGB_KEY),     # dict 구조
+        "features":   lambda: s3_io.load_joblib(s3, bucket, FEATURES_KEY),      # list
+        "le_line":    lambda: s3_io.load_joblib(s3, bucket, LINE_ENCODER_KEY),
+        "le_station": lambda: s3_io.load_joblib(s3, bucket, STATION_ENCODER_KEY),
+    }
+
+# _artifact_tasks 결과 → (models, features, le_line, le_station)
+def _unpack_artifacts(s3, loaded, bucket=None):
+    if loaded.get("bundle"):
+        import model_bundle
+        return model_bundle.load(loaded["bundle"])
+    legacy = s3_io.fetch_many(_joblib_tasks(s3, bucket))
+    return legacy["models"], legacy["features"], legacy["le_line"], legacy["le_station"]
+
+# 모델/인코더/피처 목록 로드
+# 상주형 예측 서버(Lambda/resident_predictor.py)도 같은 함수로 로드
+def _load_artifacts(s3, bucket=None):
+    return _unpack_artifacts(s3, s3_io.fetch_many(_artifact_tasks(s3, bucket)), bucket)
+
+# 입력 행 → 모델 입력 X (float32 C-order ndarray, feature_matrix.py)
+# 미등록 호선/역명 행은 제외, 반환 df는 X와 같은 순서(0..n-1 인덱스)
+def _prepare_features(df, features, le_line, le_station, stats=None):
+    import feature_matrix
+    return feature_matrix.build(df, features, le_line, le_station, stats)
+
+# 모델 파일 구조 두 가지를 모두 지원
+# - 분리형: {"승차": {"xgb": model}, "하차": {"xgb": model}} → 타깃별 predict
+# - 결합형: {"joint": {"xgb": model}, "targets": ["승차", "하차"], "direction_col": None 또는 "방향"}
+#   direction_col 없음 → predict 한 번이 (n, 타깃 수) 반환 (XGBoost multi_output_tree)
+#   direction_col 있음 → 방향 값(0, 1)을 맨 뒤 열로 붙인 행을 이어 붙여 predict 한 번
+# predict: (model, X) → 예측값, 기본은 model.predict (상주형 예측기는 Booster 직접 호출을 넘김)
+def _predict_targets(models, model_name, X, predict=None):
+    import numpy as np
+    import pandas as pd
+
+    predict = predict or (lambda model, data: model.predict(data))
+    if "joint" not in models:
+        return {t: np.asarray(predict(models[t][model_name], X)) for t in ("승차", "하차")}
+
+    model, targets = models["joint"][model_name], models["targets"]
+    direction, n = models.get("direction_col"), len(X)
+    if direction is None:
+        Y = np.asarray(predict(model, X)).reshape(n, len(targets))
+        return {t: Y[:, j] for j, t in enumerate(targets)}
+    if isinstance(X, pd.DataFrame):
+        stacked = pd.concat([X.assign(**{direction: float(j)}) for j in range(len(targets))], ignore_index=True)
+    else:
+        X = np.asarray(X)
+        stacked = np.vstack([np.column_stack([X, np.full(n, j, dtype=X.dtype)]) for j in range(len(targets))])
+    Y = np.asarray(predict(model, stacked)).reshape(len(targets), n)
+    return {t: Y[j] for j, t in enumerate(targets)}
+
+# 입력 행 → 예측 CSV 행 (역마다 승차/하차 2행), 인코딩 가능한 행이 없으면 None
+# 로컬 파이프라인(Lambda/pipeline_runner.py)도 S3를 거치지 않고 같은 함수로 예측
+def _predict_rows(df, models, features, le_line, le_station, stats=None):
+    import numpy as np
+    import pandas as pd
+    import feature_matrix
+
+    # 파생 컬럼/요일 one-hot, 라벨 인코딩, feature 정렬 (float32 행렬에 바로 채움)
+    with instrument.step("encode", rows_in=len(df)) as st:
+        df, X = _prepare_features(df, features, le_line, le_station, stats)
+        st.rows_out = len(df)
+    if df.empty:
+        return None
+
+    # 예측
+    # 분리형이면 타깃별 2번, 결합형이면 1번의 predict
+    with instrument.step("predict", rows_in=len(X)) as st:
+        preds = _predict_targets(models, "xgb", X, feature_matrix.raw_predict)
+        st.rows_out = 2 * len(X)
+
+    # 결과 생성 (역마다 승차/하차 2행)
+    n = len(df)
+    y = np.column_stack([preds['승차'], preds['하차']]).ravel()
+    return pd.DataFrame({
+        "날짜": np.repeat(df['날짜'].dt.strftime("%Y-%m-%d").to_numpy(), 2),
+        "호선": np.repeat(df['호선'].to_numpy(), 2),
+        "역명": np.repeat(df['역명'].to_numpy(), 2),
+        "구분": np.tile(["승차_xgb", "하차_xgb"], n),
+        "예측값": np.maximum(0, np.rint(y)).astype(int),
+    })
+
+# 예측 CSV 저장 + predictions/_index_xgb.json 등록, 반환: 저장 키
+def _save_predictions(s3, out_df):
+    date_token = str(out_df["날짜"].iloc[0])
+    out_key = f"{OUTPUT_PREFIX}/{date_token}_xgb.csv"
+    with instrument.step("s3_write", rows_in=len(out_df)):
+        s3_io.write_csv(s3, S3_BUCKET, out_key, out_df)
+        _update_prediction_index(s3, date_token, out_key)
+    return out_key
+
+@instrument.handler
 def lambda_handler(event, context):
     try:
-        s3 = boto3.client("s3")
+        s3 = storage.client()
+        s3_io.reset_stats()
 
         # 입력 키 결정
         in_key = (event or {}).get("s3_key")
@@ -82,71 +196,27 @@ def lambda_handler(event, context):
         if not in_key.startswith(f"{INPUT_PREFIX}/") or not in_key.endswith(".csv"):
             return {"status": "error", "message": f"잘못된 입력 키: {in_key}"}
 
-        # 입력 데이터 로드
-        df = _read_csv_from_s3(s3, in_key)
+        # 입력 데이터 + 모델/인코더/피처 동시 로드
+        tasks = _artifact_tasks(s3)
+        tasks["input"] = lambda: s3_io.read_csv(s3, S3_BUCKET, in_key)
+        with instrument.step("s3_read") as st:
+            loaded = s3_io.fetch_many(tasks)
+            st.rows_out = len(loaded["input"])
+        df = loaded["input"]
         if df.empty:
             return {"status": "error", "message": "입력 CSV가 비어 있음", "input_key": in_key}
+        with instrument.step("load_model"):
+            models, features, le_line, le_station = _unpack_artifacts(s3, loaded)
 
-        # 모델/인코더/피처 로드
-        models      = _load_joblib(s3, MODEL_XGB_KEY)
-        features    = _load_joblib(s3, FEATURES_KEY)
-        le_line     = _load_joblib(s3, LINE_ENCODER_KEY)
-        le_station  = _load_joblib(s3, STATION_ENCODER_KEY)
-
-        xgb_board   = models['승차']['xgb']                  # XGBoost(승차)
-        xgb_alight  = models['하차']['xgb']                  # XGBoost(하차)
-
-        # 파생 컬럼/요일 one-hot
-        df = _onehot_weekday(df)
-
-        # 라벨 인코딩 및 미등록 라벨 제거
-        df['호선'] = df['호선'].astype(str).str.strip()
-        df['역명'] = df['역명'].astype(str).str.strip()
-        line_enc, mask_line       = _safe_label_encode(le_line, df['호선'], "호선")
-        station_enc, mask_station = _safe_label_encode(le_station, df['역명'], "역명")
-        mask = mask_line & mask_station
-        df = df[mask].copy()
-        if df.empty:
+        # 예측 → 저장
+        matrix_stats = {}
+        out_df = _predict_rows(df, models, features, le_line, le_station, matrix_stats)
+        if out_df is None:
             return {"status": "error", "message": "인코딩 가능한 행이 없음(모든 라벨이 미등록)"}
-        df.loc[:, '호선_enc'] = line_enc[:len(df)]
-        df.loc[:, '역명_enc'] = station_enc[:len(df)]
-
-        # 결측/형 변환 & feature 정렬
-        for col in ['기온','강수형태','강수','습도','풍속','공휴일여부']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            else:
-                df[col] = 0
-
-        for col in features:
-            if col not in df.columns:
-                df[col] = 0
-        X = df[features].astype(float)
-
-        # 예측
-        y_board  = xgb_board.predict(X)
-        y_alight = xgb_alight.predict(X)
-
-        # 결과 생성
-        out_rows = []
-        for i, row in df.iterrows():
-            day_str = str(pd.to_datetime(row['날짜']).date())
-            out_rows.append({
-                "날짜": day_str, "호선": row["호선"], "역명": row["역명"],
-                "구분": "승차_xgb", "예측값": int(max(0, np.rint(y_board[i])))
-            })
-            out_rows.append({
-                "날짜": day_str, "호선": row["호선"], "역명": row["역명"],
-                "구분": "하차_xgb", "예측값": int(max(0, np.rint(y_alight[i])))
-            })
-        out_df = pd.DataFrame(out_rows)
-
-        # 저장
-        date_token = pd.to_datetime(df['날짜'].iloc[0]).strftime("%Y-%m-%d")
-        out_key = f"{OUTPUT_PREFIX}/{date_token}_xgb.csv"
-        _write_csv_to_s3(s3, out_df, out_key)
-
-        return {"status": "ok", "input_key": in_key, "s3_key": out_key, "rows": int(len(out_df))}
+        out_key = _save_predictions(s3, out_df)
+
+        return {"status": "ok", "input_key": in_key, "s3_key": out_key, "rows": int(len(out_df)),
+                "feature_matrix": matrix_stats, "transfers": s3_io.transfer_summary()}
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
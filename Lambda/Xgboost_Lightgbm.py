@@ -1,12 +1,19 @@
 import re
-import io
-import boto3
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, column, insert, table, text
+
+import dashboard_aggregates
+import db
+import instrument
+import s3_io
+import storage
 
 # ==== 설정 ====
 S3_BUCKET = ""
 PREDICTIONS_PREFIX = "predictions/"
+# 예측 Lambda가 모델별로 갱신하는 날짜별 목록
+PREDICTION_INDEX_KEYS = {m: f"{PREDICTIONS_PREFIX}_index_{m}.json" for m in ("xgb", "lgb")}
 # RDS
 DB_USER = ""
 DB_PASSWORD = ""
@@ -14,10 +21,32 @@ DB_HOST = ""
 DB_PORT = "5432"
 DB_NAME = "subway"
 TABLE_NAME = "pred_data"
+
+# 앙상블 설정 (event의 weights / line_weights / output 으로 덮어쓰기 가능)
+ENSEMBLE_WEIGHTS = {"xgb": 0.5, "lgb": 0.5}   # 기본 가중치 (합이 1이 아니어도 정규화)
+LINE_WEIGHTS = {}                              # 호선별 가중치 예: {"2호선": {"xgb": 0.6, "lgb": 0.4}}
+ENSEMBLE_OUTPUT = "both"                       # "both": xgb/lgb 원본 + 앙상블 행, "ensemble": 앙상블 행만
+ENSEMBLE_SUFFIX = "ens"                        # target_model 값: 승차_ens / 하차_ens
+RANGE_MAX_DATES = 60                           # 범위 모드 한 번에 처리할 최대 날짜 수
+DASHBOARD_AGGREGATES = True                    # 저장 후 대시보드 집계 테이블 갱신 (event의 dashboard로 덮어쓰기 가능)
 # =============
 
 pat = re.compile(r"(?P<date>\d{4}-\d{2}-\d{2})_(?P<model>xgb|lgb)\.csv$")
 
+# predictions/_index_{xgb|lgb}.json 두 개를 동시에 읽어 합침 - 하나라도 아직 없으면 None
+# 반환: {"pairs": {날짜: (xgb 키, lgb 키)}, "since": 두 목록이 모두 빠짐없이 담고 있는 첫 날짜}
+def _read_prediction_index(s3):
+    indexes = s3_io.fetch_many({m: (lambda key=key: s3_io.read_json(s3, S3_BUCKET, key))
+                                for m, key in PREDICTION_INDEX_KEYS.items()})
+    if not all(indexes.values()):
+        return None
+    xgb_dates, lgb_dates = indexes["xgb"].get("dates", {}), indexes["lgb"].get("dates", {})
+    return {
+        "pairs": {d: (k, lgb_dates[d]) for d, k in xgb_dates.items() if d in lgb_dates},
+        "since": max(indexes["xgb"].get("since") or "", indexes["lgb"].get("since") or ""),
+    }
+
+# index가 없을 때(도입 이전 데이터)만 사용하는 전체 나열
 def _list_prediction_keys(s3):
     pg = s3.get_paginator("list_objects_v2")
     keys = []
@@ -52,98 +81,335 @@ def _find_latest_pair(keys):
     lgb_key = f"{PREDICTIONS_PREFIX}{latest}_lgb.csv"
     return latest, xgb_key, lgb_key
 
-def _read_csv(s3, key):
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    return pd.read_csv(io.BytesIO(obj["Body"].read()), encoding="utf-8")
+# index에서 두 모델이 모두 있는 가장 최근 날짜 쌍 결정
+def _find_latest_pair_from_index(index):
+    if not index["pairs"]:
+        return None, None, None
+    latest = max(index["pairs"])
+    return (latest, *index["pairs"][latest])
+
+# 두 모델 예측이 모두 있는 날짜 → (xgb 키, lgb 키)
+# oldest: 필요한 가장 이른 날짜 (""이면 전체)
+# index가 oldest부터 담고 있으면 index(GET 두 번)로 결정, 아니면 전체 나열 (보관 기간 이전 날짜 등)
+def _complete_pairs(s3, oldest=""):
+    index = _read_prediction_index(s3)
+    if index and oldest and oldest >= index["since"]:
+        return index["pairs"]
+    by_date = {}
+    for k in _list_prediction_keys(s3):
+        m = pat.search(k)
+        by_date.setdefault(m.group("date"), {})[m.group("model")] = k
+    return {d: (m["xgb"], m["lgb"]) for d, m in by_date.items() if {"xgb", "lgb"} <= set(m)}
+
+# 기본 가중치 위에 event 가중치를 덮어씀 → 일부 모델만 줘도 나머지는 ENSEMBLE_WEIGHTS
+def _resolve_weights(weights=None):
+    return {**ENSEMBLE_WEIGHTS, **(weights or {})}
+
+# 모델별 예측 values (n, 모델 수) → 행별 가중 평균 (n,)
+# 가중치 계산은 호선 → 가중치 매핑만 pandas, 나머지는 NumPy 배열 연산
+# NaN(그 모델에 없는 행)은 가중치 0으로 두고 재정규화
+# 상주형 예측기(resident_predictor.py)도 같은 함수로 앙상블 → pred_data의 ens 값과 동일
+def _weighted_average(values, lines, models=("xgb", "lgb"), weights=None, line_weights=None):
+    weights = _resolve_weights(weights)
+    line_weights = LINE_WEIGHTS if line_weights is None else line_weights
+    values = np.asarray(values, dtype=float)
+    lines = pd.Series(np.asarray(lines))
+    w = np.empty_like(values)
+    for j, model in enumerate(models):
+        per_line = {line: lw[model] for line, lw in line_weights.items() if model in lw}
+        w[:, j] = lines.map(per_line).fillna(weights[model]).to_numpy(dtype=float)
+    w[np.isnan(values)] = 0.0
+    total = w.sum(axis=1)
+    return np.where(total > 0, np.nansum(values * w, axis=1) / np.where(total > 0, total, 1), 0.0)
+
+# (날짜, 호선, 역명, 승차/하차) 기준으로 xgb·lgb 예측을 키 병합 후 가중 평균
+# 한쪽 모델에만 있는 행은 있는 모델 값만 사용 (가중치 재정규화)
+def _ensemble(df_xgb, df_lgb, weights=None, line_weights=None):
+    keys = ["날짜", "호선", "역명", "방향"]
 
-# 날짜 중복 체크 후 새 날짜 데이터만 DB에 저장
-def _write_db(df):
+    parts = []
+    for model, df in (("xgb", df_xgb), ("lgb", df_lgb)):
+        part = df[["날짜", "호선", "역명", "예측값"]].copy()
+        part["방향"] = df["구분"].str.split("_", n=1).str[0]
+        parts.append(part.rename(columns={"예측값": model}))
+    merged = parts[0].merge(parts[1], on=keys, how="outer")
+
+    ens = _weighted_average(merged[["xgb", "lgb"]].to_numpy(dtype=float), merged["호선"],
+                            weights=weights, line_weights=line_weights)
+
+    out = merged[["날짜", "호선", "역명"]].copy()
+    out["target_model"] = merged["방향"] + f"_{ENSEMBLE_SUFFIX}"
+    out["예측값"] = np.rint(np.clip(ens, 0, None)).astype(int)
+    return out
+
+# pred_data 고유 키: 재실행 시 없는 행은 추가, 값이 바뀐 행만 갱신
+# 기존 테이블에 중복 행이 남아 있으면 인덱스 생성이 실패하므로 최초 1회 정리 필요
+#   DELETE FROM pred_data a USING pred_data b
+#    WHERE a.ctid < b.ctid AND a.날짜 = b.날짜 AND a.호선 = b.호선
+#      AND a.역명 = b.역명 AND a.target_model = b.target_model;
+PRED_KEY_COLS = ["날짜", "호선", "역명", "target_model"]
+PRED_COLS = PRED_KEY_COLS + ["예측값"]
+# 스테이징 적재는 insert() 구문 + 레코드 목록으로 실행
+# → psycopg2에서 여러 행 VALUES로 묶여 전송 (text() executemany는 행마다 한 번씩 실행됨)
+PRED_STAGE = table("pred_data_stage", *(column(c) for c in PRED_COLS))
+
+# DATABASE_URL 환경 변수가 있으면 그 DB (로컬 PostgreSQL/SQLite, db.py)
+def _create_engine():
+    return db.create_engine(db.postgres_url(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME))
+
+def _ensure_pred_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS pred_data (
+            날짜 DATE, 호선 TEXT, 역명 TEXT, target_model TEXT, 예측값 BIGINT
+        )
+    """))
+    conn.execute(text("""
+        CREATE UNIQUE INDEX IF NOT EXISTS pred_data_key_uq
+        ON pred_data (날짜, 호선, 역명, target_model)
+    """))
+
+# 스테이징 테이블 → pred_data 병합, 반환: (추가된 행 수, 갱신된 행 수)
+# xmax = 0 이면 새로 들어간 행, 아니면 갱신된 행
+def _merge_stage_postgres(conn, records):
+    conn.execute(text("""
+        CREATE TEMP TABLE pred_data_stage
+        (LIKE pred_data INCLUDING DEFAULTS) ON COMMIT DROP
+    """))
+    conn.execute(insert(PRED_STAGE), records)
+    result = conn.execute(text("""
+        INSERT INTO pred_data (날짜, 호선, 역명, target_model, 예측값)
+        SELECT 날짜, 호선, 역명, target_model, 예측값 FROM pred_data_stage
+        ON CONFLICT (날짜, 호선, 역명, target_model)
+        DO UPDATE SET 예측값 = EXCLUDED.예측값
+        WHERE pred_data.예측값 IS DISTINCT FROM EXCLUDED.예측값
+        RETURNING (xmax = 0) AS inserted
+    """))
+    flags = [row[0] for row in result]
+    inserted = sum(1 for f in flags if f)
+    return inserted, len(flags) - inserted
+
+# SQLite(로컬 실행): xmax가 없으므로 새 키 수를 먼저 세고, 변경 행 수(rowcount)에서 빼서 갱신 수 계산
+# (INSERT ... SELECT ... ON CONFLICT는 SQLite 파서 때문에 WHERE true 필요)
+def _merge_stage_sqlite(conn, records):
+    conn.execute(text("DROP TABLE IF EXISTS temp.pred_data_stage"))
+    conn.execute(text("""
+        CREATE TEMP TABLE pred_data_stage (
+            날짜 DATE, 호선 TEXT, 역명 TEXT, target_model TEXT, 예측값 BIGINT
+        )
+    """))
+    conn.execute(insert(PRED_STAGE), records)
+    inserted = conn.execute(text("""
+        SELECT COUNT(*) FROM pred_data_stage s
+        WHERE NOT EXISTS (SELECT 1 FROM pred_data p
+                          WHERE p.날짜 = s.날짜 AND p.호선 = s.호선
+                            AND p.역명 = s.역명 AND p.target_model = s.target_model)
+    """)).scalar()
+    changed = conn.execute(text("""
+        INSERT INTO pred_data (날짜, 호선, 역명, target_model, 예측값)
+        SELECT 날짜, 호선, 역명, target_model, 예측값 FROM pred_data_stage WHERE true
+        ON CONFLICT (날짜, 호선, 역명, target_model)
+        DO UPDATE SET 예측값 = excluded.예측값
+        WHERE pred_data.예측값 IS NOT excluded.예측값
+    """)).rowcount
+    conn.execute(text("DROP TABLE temp.pred_data_stage"))
+    return inserted, changed - inserted
+
+# 임시 테이블에 bulk insert 후 INSERT ... ON CONFLICT 한 번으로 병합
+# 부분 실패 후 재실행해도 빠진 행만 채워지고, 같은 값은 건드리지 않음
+# 여러 날짜를 한 번에 넘겨도 하나의 트랜잭션으로 처리
+def _write_db(df, engine=None):
     if df.empty:
         print("저장할 데이터 없음")
-        return
-    engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-    
-    # 예측 날짜 추출
-    target_date = df["날짜"].iloc[0]
-    
-    try:
+        return {"inserted": 0, "updated": 0, "unchanged": 0}
+    engine = engine or _create_engine()
+
+    # 같은 키가 한 배치에 두 번 있으면 ON CONFLICT가 실패하므로 마지막 값만 유지
+    df = df[PRED_COLS].drop_duplicates(subset=PRED_KEY_COLS, keep="last")
+    records = [
+        {"날짜": r[0], "호선": r[1], "역명": r[2], "target_model": r[3], "예측값": int(r[4])}
+        for r in df.itertuples(index=False, name=None)
+    ]
+    merge_stage = _merge_stage_sqlite if db.dialect(engine) == "sqlite" else _merge_stage_postgres
+
+    # 실패 시 instrument가 단계 오류(예외 종류/메시지)를 기록한 뒤 예외를 그대로 올림
+    with instrument.step("db_write", rows_in=len(records)) as st:
         with engine.begin() as conn:
-            # 해당 날짜 데이터가 이미 존재하는지 확인
-            check_query = text("""
-                SELECT COUNT(*) as count 
-                FROM pred_data 
-                WHERE 날짜::text = :target_date
-            """)
-            
-            result = conn.execute(check_query, {"target_date": str(target_date)})
-            existing_count = result.fetchone()[0]
-            
-            # 날짜별 중복 체크
-            if existing_count > 0:
-                print(f"{target_date} 날짜 데이터가 이미 {existing_count}건 존재합니다. 저장 건너뜀.")
-                return
-            else:
-                # 새 날짜 데이터 저장
-                df.to_sql("pred_data", con=conn, if_exists="append", index=False)
-                print(f"{target_date} 날짜 예측 데이터 {len(df)}건 저장 완료")
-                
-    except Exception as e:
-        print(f"DB 저장 중 오류 발생: {str(e)}")
-        raise e  # 상위에서 처리하도록 예외 재발생
-                
+            _ensure_pred_table(conn)
+            inserted, updated = merge_stage(conn, records)
+        st.rows_out = inserted + updated
+
+    counts = {"inserted": inserted, "updated": updated,
+              "unchanged": len(records) - inserted - updated}
+    print(f"예측 데이터 {len(records)}건 병합: {counts}")
+    return counts
+
+# 앙상블 행이 이미 있는 날짜 (고유 인덱스를 타는 조회 한 번)
+def _dates_with_ensemble(engine, dates):
+    ens_models = [f"승차_{ENSEMBLE_SUFFIX}", f"하차_{ENSEMBLE_SUFFIX}"]
+    with engine.begin() as conn:
+        _ensure_pred_table(conn)
+        rows = conn.execute(text("""
+            SELECT DISTINCT 날짜 FROM pred_data
+            WHERE 날짜 IN :dates AND target_model IN :models
+        """).bindparams(bindparam("dates", expanding=True), bindparam("models", expanding=True)),
+            {"dates": [pd.Timestamp(d).date() for d in dates], "models": ens_models})
+        return {str(r[0]) for r in rows}
+
+# pred_data 저장 후 대시보드 집계 테이블 중 바뀐 날짜만 갱신 (dashboard_aggregates.py)
+# 예측은 이미 저장됐으므로 집계 실패는 응답에만 남기고, 빠진 날짜는 다음 실행에서 다시 채워짐
+def _refresh_dashboard(engine, dates, event):
+    if not event.get("dashboard", DASHBOARD_AGGREGATES):
+        return None
+    try:
+        with instrument.step("dashboard") as st:
+            counts = dashboard_aggregates.refresh(engine, dates)
+            st.rows_out = counts["pred_actual"] + counts["top_stations"] + counts["error_daily"]
+        return counts
     except Exception as e:
-        print(f"DB 저장 중 오류 발생: {str(e)}")
-        raise e  # 상위에서 처리하도록 예외 재발생
+        print(f"대시보드 집계 갱신 실패: {str(e)}")
+        return {"error": str(e)}
+
+# 예측 CSV 검증 & 타입 보정 (컬럼 누락 시 ValueError)
+def _normalize(df, name):
+    required_cols = ["날짜","호선","역명","구분","예측값"]
+    missing = [c for c in required_cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"{name} 컬럼 누락: {missing}")
+    df["날짜"] = pd.to_datetime(df["날짜"]).dt.date
+    df["예측값"] = pd.to_numeric(df["예측값"], errors="coerce").fillna(0).astype(int)
+    df["호선"] = df["호선"].astype(str)
+    df["역명"] = df["역명"].astype(str)
+    df["구분"] = df["구분"].astype(str)
+    return df
+
+# 날짜별 (xgb 키, lgb 키)를 동시에 읽어 날짜 구분 없이 한 번에 병합/앙상블
+# 반환: (DB 저장 행, 앙상블 행, 설정)
+def _build_rows(s3, pairs, event):
+    tasks = {}
+    for d, (xgb_key, lgb_key) in pairs.items():
+        tasks[(d, "xgb")] = lambda k=xgb_key: s3_io.read_csv(s3, S3_BUCKET, k)
+        tasks[(d, "lgb")] = lambda k=lgb_key: s3_io.read_csv(s3, S3_BUCKET, k)
+    with instrument.step("s3_read") as st:
+        loaded = s3_io.fetch_many(tasks)
+        st.rows_out = sum(len(df) for df in loaded.values())
+
+    df_xgb = pd.concat([loaded[(d, "xgb")] for d in pairs], ignore_index=True)
+    df_lgb = pd.concat([loaded[(d, "lgb")] for d in pairs], ignore_index=True)
+    return _merge_frames(df_xgb, df_lgb, event)
 
+# 두 모델 예측 행(S3 CSV 또는 로컬 파이프라인의 메모리 DataFrame) → 검증/앙상블
+# 반환: (DB 저장 행, 앙상블 행, 설정)
+def _merge_frames(df_xgb, df_lgb, event):
+    df_xgb = _normalize(df_xgb, "xgb")
+    df_lgb = _normalize(df_lgb, "lgb")
+
+    # 가중 앙상블
+    settings = {
+        "weights": _resolve_weights(event.get("weights")),
+        "line_weights": event.get("line_weights", LINE_WEIGHTS),
+        "output": event.get("output", ENSEMBLE_OUTPUT),
+    }
+    with instrument.step("ensemble", rows_in=len(df_xgb) + len(df_lgb)) as st:
+        df_ens = _ensemble(df_xgb, df_lgb, settings["weights"], settings["line_weights"])
+        st.rows_out = len(df_ens)
+
+    # 저장 형식: 원본 모델 행 + 앙상블 행 또는 앙상블 행만
+    if settings["output"] == "ensemble":
+        df_all = df_ens
+    else:
+        df_raw = pd.concat([df_xgb, df_lgb], ignore_index=True)
+        df_raw = df_raw.rename(columns={"구분": "target_model"})
+        df_all = pd.concat([df_raw[df_ens.columns], df_ens], ignore_index=True)
+    return df_all, df_ens, settings
+
+# 범위 모드: 두 모델 예측은 있는데 앙상블 행이 없는 날짜 전부를 한 번에 처리
+# event: {"mode": "range", "start": "2025-08-01", "end": "2025-08-20", "max_dates": 60}
+#        또는 {"dates": ["2025-08-11", "2025-08-12"]}
+def _handle_range(s3, event):
+    wanted = {str(pd.Timestamp(d).date()) for d in event["dates"]} if event.get("dates") else None
+    start = str(pd.Timestamp(event["start"]).date()) if event.get("start") else None
+    pairs = _complete_pairs(s3, min(wanted) if wanted else (start or ""))
+    if wanted:
+        pairs = {d: k for d, k in pairs.items() if d in wanted}
+    if start:
+        pairs = {d: k for d, k in pairs.items() if d >= start}
+    if event.get("end"):
+        pairs = {d: k for d, k in pairs.items() if d <= str(pd.Timestamp(event["end"]).date())}
+
+    engine = _create_engine()
+    done = _dates_with_ensemble(engine, list(pairs)) if pairs else set()
+    todo = sorted(d for d in pairs if d not in done)
+    todo = todo[: int(event.get("max_dates", RANGE_MAX_DATES))]
+    if not todo:
+        return {"status": "ok", "mode": "range", "dates": [], "rows": 0,
+                "message": "앙상블이 필요한 날짜 없음", "transfers": s3_io.transfer_summary()}
+
+    df_all, df_ens, settings = _build_rows(s3, {d: pairs[d] for d in todo}, event)
+    counts = _write_db(df_all, engine)
+    dashboard = _refresh_dashboard(engine, todo, event)
+    return {
+        "status": "ok",
+        "mode": "range",
+        "dates": todo,
+        "skipped": sorted(done),
+        "rows": int(len(df_all)),
+        "ensemble_rows": int(len(df_ens)),
+        **settings,
+        **counts,
+        "table": TABLE_NAME,
+        "dashboard": dashboard,
+        "transfers": s3_io.transfer_summary(),
+    }
+
+@instrument.handler
 def lambda_handler(event, context):
     try:
-        s3 = boto3.client("s3")
+        s3 = storage.client()
+        s3_io.reset_stats()
+        event = event or {}
+
+        if event.get("mode") == "range" or event.get("dates"):
+            return _handle_range(s3, event)
 
         # 날짜 결정
-        forced_date = (event or {}).get("date")
+        forced_date = event.get("date")
         if forced_date:
             xgb_key = f"{PREDICTIONS_PREFIX}{forced_date}_xgb.csv"
             lgb_key = f"{PREDICTIONS_PREFIX}{forced_date}_lgb.csv"
         else:
-            keys = _list_prediction_keys(s3)
-            latest, xgb_key, lgb_key = _find_latest_pair(keys)
+            index = _read_prediction_index(s3)
+            if index:
+                latest, xgb_key, lgb_key = _find_latest_pair_from_index(index)
+            else:
+                keys = _list_prediction_keys(s3)
+                latest, xgb_key, lgb_key = _find_latest_pair(keys)
             if not latest:
                 return {"status":"error","message":"최근 날짜 쌍(xgb,lgb)을 찾지 못함"}
 
-        # 읽기
-        df_xgb = _read_csv(s3, xgb_key)
-        df_lgb = _read_csv(s3, lgb_key)
-
-        # 검증 & 정리
-        required_cols = ["날짜","호선","역명","구분","예측값"]
-        for name, df in [("xgb", df_xgb), ("lgb", df_lgb)]:
-            missing = [c for c in required_cols if c not in df.columns]
-            if missing:
-                return {"status":"error","message":f"{name} 컬럼 누락: {missing}"}
-
-        # 타입 보정
-        for df in (df_xgb, df_lgb):
-            df["날짜"] = pd.to_datetime(df["날짜"]).dt.date
-            df["예측값"] = pd.to_numeric(df["예측값"], errors="coerce").fillna(0).astype(int)
-            df["호선"] = df["호선"].astype(str)
-            df["역명"] = df["역명"].astype(str)
-            df["구분"] = df["구분"].astype(str)
-
-        # 유니온
-        df_all = pd.concat([df_xgb, df_lgb], ignore_index=True)
-        df_all = df_all.rename(columns={"구분": "target_model"})
-        
-        # DB 저장
-        _write_db(df_all)
+        # 읽기 (두 CSV 동시에) → 검증/앙상블
+        try:
+            df_all, df_ens, settings = _build_rows(s3, {forced_date or latest: (xgb_key, lgb_key)}, event)
+        except ValueError as e:
+            return {"status":"error","message":str(e)}
 
+        # DB 저장 (upsert) → 대시보드 집계 갱신
+        engine = _create_engine()
+        counts = _write_db(df_all, engine)
         target_date = str(df_all["날짜"].iloc[0])
+        dashboard = _refresh_dashboard(engine, [target_date], event)
+
         return {
             "status":"ok",
             "date": target_date,
             "rows": int(len(df_all)),
+            "ensemble_rows": int(len(df_ens)),
+            **settings,
+            **counts,
             "xgb_key": xgb_key,
             "lgb_key": lgb_key,
-            "table": TABLE_NAME
+            "table": TABLE_NAME,
+            "dashboard": dashboard,
+            "transfers": s3_io.transfer_summary(),
         }
 
     except Exception as e:
@@ -0,0 +1,276 @@
+"""
+과거 기간 일괄 백테스트 (매일 파이프라인을 날짜 범위 전체에 대해 한 번에 재현)
+
+Lambda를 날짜마다 실행하는 대신 같은 로직을 날짜 범위 전체에 벡터화해서 적용
+1. 입력  : preprocess.build_input_frame으로 역 × 날짜 전체를 한 프레임으로
+           (lag 피처 모델이면 lag 상태를 날짜순으로 재생 - 예측일 전날까지의 실제값만 사용)
+2. 예측  : feature_matrix로 행렬 한 번, 모델마다 predict 한 번 → 예측 Lambda와 같은 반올림/0 하한
+3. 앙상블: 병합 Lambda(Xgboost_Lightgbm._ensemble)와 같은 가중치/호선별 가중치
+4. 평가  : subway_stats 실제값과 비교해 역/호선/날짜/전체 단위 MAE, RMSE, bias → backtest_metrics 테이블
+날씨/공휴일 데이터가 없는 날짜는 전처리 Lambda처럼 건너뜀
+모델 학습 기간과 겹치는 날짜는 학습 데이터 성능(in-sample)이므로 비교 시 주의
+
+사용 예:
+    python Lambda/backtest.py --model-dir ./model --start 2024-08-01 --end 2025-07-31
+    python Lambda/backtest.py --bucket subway-whitenut-bucket --start 2025-07-01 --end 2025-07-31 --out bt_2025-07
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+import db
+import feature_matrix
+import lag_features
+import preprocess
+import Xgboost_Lightgbm as merge
+from resident_predictor import PREDICTOR_MODULES, TARGETS, ResidentPredictor
+
+METRICS_TABLE = "backtest_metrics"
+METRIC_LEVELS = {
+    "station": ["호선", "역명"],
+    "line": ["호선"],
+    "day": ["날짜"],
+    "all": [],
+}
+METRIC_COLS = ["run_id", "start_date", "end_date", "level", "model", "방향", "날짜", "호선", "역명",
+               "n", "mae", "rmse", "bias", "actual_mean", "created_at"]
+
+
+def load_range(engine, start, end, warmup_days=0):
+    """
+    [start, end] 구간 백테스트에 필요한 원본
+    warmup_days: lag 상태를 채우기 위해 start 이전에 더 읽을 실제값 일수
+    반환: stations, weather, holiday, 실제값 행(subway_stats), 공휴일 날짜 집합
+    """
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    since = start - pd.Timedelta(days=warmup_days + 1)
+    params = {"start": start.date(), "end": end.date()}
+    stations = pd.read_sql(
+        text('SELECT DISTINCT 호선, 역명 FROM subway_stats WHERE 역명 IS NOT NULL'), engine
+    )
+    day = db.as_date(engine, "날짜")
+    weather = pd.read_sql(
+        text(f"SELECT 날짜, 구분, 값 FROM weather_stats WHERE {day} BETWEEN :start AND :end"),
+        engine, params=params
+    )
+    holiday = pd.read_sql(
+        text(f"SELECT 날짜, 공휴일여부 FROM holidays_stats WHERE {day} BETWEEN :start AND :end"),
+        engine, params=params
+    )
+    actual_rows = preprocess.read_actual_rows(engine, since, end)
+    holiday_days = preprocess.read_holiday_days(engine, since, end)
+    return stations, weather, holiday, actual_rows, holiday_days
+
+
+def _available_dates(weather, holiday):
+    # 전처리 Lambda는 날씨/공휴일 중 하나라도 없으면 그날 예측을 만들지 않음
+    w = set(preprocess.safe_to_datetime(weather['날짜']).dt.normalize().dropna())
+    h = set(preprocess.safe_to_datetime(holiday['날짜']).dt.normalize().dropna())
+    return sorted(w & h)
+
+
+def _replay_lag(df, actuals, holiday_days):
+    """날짜순으로 (그날 피처 계산 → 그날 실제값 반영), 예측 Lambda가 매일 하던 순서와 같음"""
+    state = lag_features.LagState()
+    keys = lag_features.LagState.station_keys(df)
+    out = np.full((len(df), len(lag_features.FEATURE_NAMES)), np.nan, dtype=np.float32)
+    frame_days = df.groupby('날짜').indices
+    actual_days = dict(tuple(actuals.groupby('날짜'))) if not actuals.empty else {}
+    for day in sorted(set(frame_days) | set(actual_days)):
+        is_holiday = day in holiday_days
+        if day in frame_days:
+            idx = frame_days[day]
+            out[idx] = state.features_for(day, keys[idx], is_holiday).to_numpy()
+        if day in actual_days:
+            grp = actual_days[day]
+            state.update(day, lag_features.LagState.station_keys(grp),
+                         grp[list(lag_features.TARGETS)].to_numpy(), is_holiday)
+    df = df.copy()
+    for j, name in enumerate(lag_features.FEATURE_NAMES):
+        df[name] = out[:, j]
+    return df
+
+
+def build_frame(stations, weather, holiday, actuals, holiday_days, features):
+    """역 × (날씨·공휴일이 있는 날짜) 입력 프레임, 모델 피처에 lag가 있으면 lag 컬럼 포함"""
+    dates = _available_dates(weather, holiday)
+    if not dates:
+        return pd.DataFrame()
+    df = preprocess.build_input_frame(stations, weather, holiday, dates)
+    if any(f in features for f in lag_features.FEATURE_NAMES):
+        df = _replay_lag(df, actuals, holiday_days)
+    return df
+
+
+def _long(prepared, values, model):
+    """모델 하나의 예측 → 예측 Lambda 출력 CSV와 같은 long 형식 (역마다 승차/하차 2행)"""
+    n = len(prepared)
+    y = np.column_stack([values[t] for t in TARGETS]).ravel()
+    return pd.DataFrame({
+        "날짜": np.repeat(prepared['날짜'].to_numpy(), 2),
+        "호선": np.repeat(prepared['호선'].to_numpy(), 2),
+        "역명": np.repeat(prepared['역명'].to_numpy(), 2),
+        "구분": np.tile([f"{t}_{model}" for t in TARGETS], n),
+        "예측값": np.maximum(0, np.rint(y)).astype(int),
+    })
+
+
+def predict_range(predictor, df, weights=None, line_weights=None):
+    """
+    입력 프레임 전체 → (날짜, 호선, 역명, 방향, model, 예측값)
+    행렬 한 번, 모델마다 predict 한 번, 두 모델이 모두 있으면 앙상블(ens) 행 추가
+    """
+    prepared, X = feature_matrix.build(df, predictor.features, predictor.le_line, predictor.le_station)
+    per_model = {}
+    for model, artifact in predictor.boosters.items():
+        values = PREDICTOR_MODULES[model]._predict_targets(artifact, model, X, feature_matrix.raw_predict)
+        per_model[model] = _long(prepared, values, model)
+
+    parts = list(per_model.values())
+    if {"xgb", "lgb"} <= set(per_model):
+        ens = merge._ensemble(per_model["xgb"], per_model["lgb"], weights, line_weights)
+        parts.append(ens.rename(columns={"target_model": "구분"}))
+    pred = pd.concat(parts, ignore_index=True)
+    split = pred["구분"].str.split("_", n=1)
+    pred["방향"], pred["model"] = split.str[0], split.str[1]
+    return pred.drop(columns="구분")
+
+
+def actual_long(actuals, start, end):
+    """subway_stats 행 → (날짜, 호선, 역명, 방향, 실제값), [start, end] 구간만"""
+    daily = lag_features.daily_actuals(actuals)
+    daily = daily[(daily['날짜'] >= pd.Timestamp(start)) & (daily['날짜'] <= pd.Timestamp(end))]
+    daily = daily.assign(호선=daily["호선"].astype(str).str.strip(), 역명=daily["역명"].astype(str).str.strip())
+    return daily.melt(id_vars=["날짜", "호선", "역명"], value_vars=list(TARGETS),
+                      var_name="방향", value_name="실제값").dropna(subset=["실제값"])
+
+
+def compute_metrics(pred, actual):
+    """
+    예측과 실제값을 (날짜, 호선, 역명, 방향)으로 맞춰 단위별 오차 지표
+    반환: level(station/line/day/all) × model × 방향 (+ 그룹 키) 행, n/mae/rmse/bias/actual_mean
+    """
+    joined = pred.merge(actual, on=["날짜", "호선", "역명", "방향"], how="inner")
+    err = joined["예측값"].to_numpy(dtype=float) - joined["실제값"].to_numpy(dtype=float)
+    joined = joined.assign(err=err, abs_err=np.abs(err), sq_err=err ** 2)
+
+    frames = []
+    for level, keys in METRIC_LEVELS.items():
+        g = joined.groupby(["model", "방향"] + keys, sort=True)
+        m = g.agg(n=("err", "size"), mae=("abs_err", "mean"), mse=("sq_err", "mean"),
+                  bias=("err", "mean"), actual_mean=("실제값", "mean")).reset_index()
+        m["rmse"] = np.sqrt(m.pop("mse"))
+        m["level"] = level
+        frames.append(m)
+    metrics = pd.concat(frames, ignore_index=True)
+    for col in ("날짜", "호선", "역명"):
+        if col not in metrics.columns:
+            metrics[col] = None
+    return metrics
+
+
+def _ensure_metrics_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+            run_id TEXT, start_date DATE, end_date DATE, level TEXT, model TEXT, 방향 TEXT,
+            날짜 DATE, 호선 TEXT, 역명 TEXT,
+            n BIGINT, mae DOUBLE PRECISION, rmse DOUBLE PRECISION, bias DOUBLE PRECISION,
+            actual_mean DOUBLE PRECISION, created_at TIMESTAMP
+        )
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {METRICS_TABLE}_run_idx ON {METRICS_TABLE} (run_id, level)"))
+
+
+# 같은 run_id로 다시 실행하면 이전 결과를 지우고 새로 기록 (하나의 트랜잭션)
+def write_metrics(engine, metrics, run_id, start, end):
+    rows = metrics.assign(run_id=run_id, start_date=pd.Timestamp(start).date(), end_date=pd.Timestamp(end).date(),
+                          created_at=datetime.utcnow().replace(microsecond=0))
+    rows["날짜"] = pd.to_datetime(rows["날짜"]).dt.date
+    rows = rows[METRIC_COLS]
+    with engine.begin() as conn:
+        _ensure_metrics_table(conn)
+        conn.execute(text(f"DELETE FROM {METRICS_TABLE} WHERE run_id = :run_id"), {"run_id": run_id})
+        rows.to_sql(METRICS_TABLE, conn, if_exists="append", index=False, method="multi", chunksize=5000)
+    return len(rows)
+
+
+def run_backtest(engine, predictor, start, end, weights=None, line_weights=None):
+    """
+    반환: (pred, metrics, stats)
+    pred   : 날짜·역·방향·모델별 예측값과 실제값
+    metrics: compute_metrics 결과
+    stats  : 날짜/행 수, 단계별 소요 시간
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    lag = any(f in predictor.features for f in lag_features.FEATURE_NAMES)
+    warmup = lag_features.BOOTSTRAP_DAYS if lag else 0
+    stations, weather, holiday, actual_rows, holiday_days = load_range(engine, start, end, warmup)
+    timings["load_sec"] = round(time.perf_counter() - t0, 2)
+
+    t1 = time.perf_counter()
+    actuals = lag_features.daily_actuals(actual_rows) if not actual_rows.empty else pd.DataFrame(
+        columns=["날짜", "호선", "역명"] + list(TARGETS))
+    df = build_frame(stations, weather, holiday, actuals, holiday_days, predictor.features)
+    if df.empty:
+        raise ValueError(f"{start} ~ {end} 구간에 날씨/공휴일 데이터가 있는 날짜가 없음")
+    timings["frame_sec"] = round(time.perf_counter() - t1, 2)
+
+    t2 = time.perf_counter()
+    pred = predict_range(predictor, df, weights, line_weights)
+    timings["predict_sec"] = round(time.perf_counter() - t2, 2)
+
+    t3 = time.perf_counter()
+    actual = actual_long(actual_rows, start, end) if not actual_rows.empty else pd.DataFrame(
+        columns=["날짜", "호선", "역명", "방향", "실제값"])
+    metrics = compute_metrics(pred, actual)
+    pred = pred.merge(actual, on=["날짜", "호선", "역명", "방향"], how="left")
+    timings["metrics_sec"] = round(time.perf_counter() - t3, 2)
+
+    stats = {
+        "dates": int(df['날짜'].nunique()),
+        "input_rows": int(len(df)),
+        "prediction_rows": int(len(pred)),
+        "matched_rows": int(pred["실제값"].notna().sum()),
+        "lag_features": lag,
+        **timings,
+        "total_sec": round(time.perf_counter() - t0, 2),
+    }
+    return pred, metrics, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="과거 기간 일괄 백테스트")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--bucket", help="모델을 읽을 S3 버킷")
+    src.add_argument("--model-dir", help="model/*.joblib (또는 bundle_*.npy) 로컬 폴더")
+    parser.add_argument("--start", required=True, help="시작일 YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="종료일 YYYY-MM-DD")
+    parser.add_argument("--run-id", default=None, help="결과 구분 ID (기본: 시작_종료_실행시각)")
+    parser.add_argument("--out", default=None, help="예측/지표 CSV를 저장할 폴더")
+    parser.add_argument("--no-db", action="store_true", help=f"{METRICS_TABLE} 테이블에 기록하지 않음")
+    args = parser.parse_args()
+
+    predictor = (ResidentPredictor.from_dir(args.model_dir) if args.model_dir
+                 else ResidentPredictor.from_s3(bucket=args.bucket))
+    engine = preprocess._create_engine()
+    pred, metrics, stats = run_backtest(engine, predictor, args.start, args.end)
+    run_id = args.run_id or f"{args.start}_{args.end}_{datetime.now():%Y%m%d%H%M%S}"
+    print(stats)
+    print(metrics[metrics["level"] == "all"][["model", "방향", "n", "mae", "rmse", "bias"]].to_string(index=False))
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        pred.to_csv(os.path.join(args.out, "predictions.csv"), index=False, encoding="utf-8")
+        metrics.to_csv(os.path.join(args.out, "metrics.csv"), index=False, encoding="utf-8")
+    if not args.no_db:
+        print(f"{METRICS_TABLE}: {write_metrics(engine, metrics, run_id, args.start, args.end)}행 (run_id={run_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Tableau 대시보드용 집계 테이블 (앙상블 Lambda 다음 단계)
+
+대시보드가 pred_data / subway_stats(long 형식)를 라이브 원본으로 열 때마다
+상위 10% 역, 최근 5일 예측 vs 실제, MAE/RMSE를 다시 계산하는 대신
+아래 작은 테이블을 바뀐 날짜만 DELETE + INSERT ... SELECT로 갱신
+- dash_pred_actual  : 날짜 × 역 × 구분(승차/하차) 한 행에 ens/xgb/lgb 예측값 + 실제값 (최근 RETENTION_DAYS일만 보관)
+- dash_top_stations : 날짜별 앙상블 예측 합계(승차+하차) 상위 TOP_FRACTION 역과 순위
+- dash_error_daily  : 날짜 × 호선 × 구분 × 모델 오차 (호선/구분 '전체' 소계 포함)
+                      n, 절대오차 합, 제곱오차 합을 같이 저장 → 여러 날짜 MAE/RMSE도 합으로 정확히 계산
+                      (MAE = SUM(abs_err_sum)/SUM(n), RMSE = SQRT(SUM(sq_err_sum)/SUM(n)))
+
+갱신 날짜 = 이번에 pred_data에 쓴 날짜 + 실제값이 비어 있던 날짜 중 subway_stats에 실제값이 새로 들어온 날짜
+          + 집계가 빠진 최근 날짜
+(실제 데이터는 4일 늦게 수집되므로 예측일 당일에는 실제값 없이 들어가고, 수집 후 다음 실행에서 채워짐)
+
+사용 예 (전체 재구축):
+    python Lambda/dashboard_aggregates.py --start 2025-07-01 --end 2025-08-31
+"""
+import argparse
+
+import pandas as pd
+from sqlalchemy import text
+
+import db
+
+TOP_FRACTION = 0.1
+RETENTION_DAYS = 35
+MODELS = ("ens", "xgb", "lgb")
+ALL_LABEL = "전체"
+
+# 사용일자(YYYYMMDD 또는 YYYY-MM-DD HH:MI:SS) → date
+USE_DATE_SQL = "to_date(left(replace(\"사용일자\", '-', ''), 8), 'YYYYMMDD')"
+# 사용일자 원본 문자열 그대로 비교 (행마다 to_date 변환 없이 날짜 목록과 비교)
+# left() 쪽 조건 때문에 사용일자 인덱스는 쓰이지 않음 → subway_stats를 읽는 쿼리는 날짜를 모아 한 번에 실행
+USE_DATE_MATCH_SQL = "(\"사용일자\" = ANY(:compact) OR left(\"사용일자\", 10) = ANY(:iso))"
+
+
+def _ensure_tables(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS dash_pred_actual (
+            날짜 DATE, 호선 TEXT, 역명 TEXT, 구분 TEXT,
+            pred_ens DOUBLE PRECISION, pred_xgb DOUBLE PRECISION, pred_lgb DOUBLE PRECISION,
+            실제값 DOUBLE PRECISION,
+            PRIMARY KEY (날짜, 호선, 역명, 구분)
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS dash_top_stations (
+            날짜 DATE, 호선 TEXT, 역명 TEXT,
+            승차 DOUBLE PRECISION, 하차 DOUBLE PRECISION, 합계 DOUBLE PRECISION,
+            순위 INTEGER, 역수 INTEGER,
+            PRIMARY KEY (날짜, 호선, 역명)
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS dash_error_daily (
+            날짜 DATE, 호선 TEXT, 구분 TEXT, model TEXT,
+            n INTEGER, abs_err_sum DOUBLE PRECISION, sq_err_sum DOUBLE PRECISION,
+            mae DOUBLE PRECISION, rmse DOUBLE PRECISION,
+            PRIMARY KEY (날짜, 호선, 구분, model)
+        )
+    """))
+
+
+def _date_params(dates):
+    days = [pd.Timestamp(d).date() for d in dates]
+    return {
+        "dates": days,
+        "compact": [d.strftime("%Y%m%d") for d in days],
+        "iso": [d.strftime("%Y-%m-%d") for d in days],
+    }
+
+
+# 따로 갱신해야 하는 날짜
+# - 실제값이 비어 있는 행 중 subway_stats에 같은 (날짜, 호선, 역명, 구분) 실제값이 들어온 행이 있는 날짜
+#   (실제값이 끝내 없는 역(신규/이름 불일치)이 있어도 그 날짜를 매번 다시 집계하지 않음)
+# - 최근 RETENTION_DAYS일 중 pred_data에는 있는데 집계가 없는 날짜 (첫 실행, 이전 실행에서 집계만 실패한 경우)
+def _pending_dates(conn):
+    missing = [r[0] for r in conn.execute(text("""
+        SELECT DISTINCT 날짜 FROM pred_data WHERE 날짜 > (SELECT MAX(날짜) FROM pred_data) - :days
+        EXCEPT
+        SELECT DISTINCT 날짜 FROM dash_pred_actual
+    """), {"days": RETENTION_DAYS})]
+    pending = [r[0] for r in conn.execute(text(
+        "SELECT DISTINCT 날짜 FROM dash_pred_actual WHERE 실제값 IS NULL"))]
+    if not pending:
+        return missing
+    # 후보 날짜의 실제값 키를 _refresh_pred_actual과 같은 정규화로 한 번만 모은 뒤 semi-join
+    # (행마다 subway_stats를 찾지 않음 → subway_stats 스캔은 쿼리당 한 번)
+    filled = [r[0] for r in conn.execute(text(f"""
+        WITH a AS (
+            SELECT DISTINCT {USE_DATE_SQL} AS 날짜, TRIM(호선) AS 호선, TRIM(역명) AS 역명, 구분
+            FROM subway_stats
+            WHERE {USE_DATE_MATCH_SQL} AND 인원수 IS NOT NULL
+        )
+        SELECT DISTINCT d.날짜 FROM dash_pred_actual d
+        JOIN a ON a.날짜 = d.날짜 AND a.호선 = d.호선 AND a.역명 = d.역명 AND a.구분 = d.구분
+        WHERE d.실제값 IS NULL AND d.날짜 = ANY(:dates)
+    """), _date_params(pending))]
+    return missing + filled
+
+
+def _refresh_pred_actual(conn, params):
+    conn.execute(text("DELETE FROM dash_pred_actual WHERE 날짜 = ANY(:dates)"), params)
+    # 실제값: 날짜·역·구분별 평균 (학습 데이터 집계와 같은 방식)
+    return conn.execute(text(f"""
+        INSERT INTO dash_pred_actual (날짜, 호선, 역명, 구분, pred_ens, pred_xgb, pred_lgb, 실제값)
+        SELECT p.날짜, p.호선, p.역명, p.구분, p.pred_ens, p.pred_xgb, p.pred_lgb, a.실제값
+        FROM (
+            SELECT 날짜, 호선, 역명, split_part(target_model, '_', 1) AS 구분,
+                   MAX(CASE WHEN split_part(target_model, '_', 2) = 'ens' THEN 예측값 END) AS pred_ens,
+                   MAX(CASE WHEN split_part(target_model, '_', 2) = 'xgb' THEN 예측값 END) AS pred_xgb,
+                   MAX(CASE WHEN split_part(target_model, '_', 2) = 'lgb' THEN 예측값 END) AS pred_lgb
+            FROM pred_data
+            WHERE 날짜 = ANY(:dates)
+            GROUP BY 날짜, 호선, 역명, split_part(target_model, '_', 1)
+        ) p
+        LEFT JOIN (
+            SELECT {USE_DATE_SQL} AS 날짜, TRIM(호선) AS 호선, TRIM(역명) AS 역명, 구분,
+                   AVG(CAST(인원수 AS DOUBLE PRECISION)) AS 실제값
+            FROM subway_stats
+            WHERE {USE_DATE_MATCH_SQL}
+            GROUP BY 1, 2, 3, 4
+        ) a ON a.날짜 = p.날짜 AND a.호선 = p.호선 AND a.역명 = p.역명 AND a.구분 = p.구분
+    """), params).rowcount
+
+
+def _refresh_top_stations(conn, params):
+    conn.execute(text("DELETE FROM dash_top_stations WHERE 날짜 = ANY(:dates)"), params)
+    return conn.execute(text("""
+        INSERT INTO dash_top_stations (날짜, 호선, 역명, 승차, 하차, 합계, 순위, 역수)
+        SELECT 날짜, 호선, 역명, 승차, 하차, 합계, 순위, 역수
+        FROM (
+            SELECT s.*,
+                   RANK() OVER (PARTITION BY 날짜 ORDER BY 합계 DESC) AS 순위,
+                   COUNT(*) OVER (PARTITION BY 날짜) AS 역수
+            FROM (
+                SELECT 날짜, 호선, 역명,
+                       SUM(CASE WHEN 구분 = '승차' THEN pred END) AS 승차,
+                       SUM(CASE WHEN 구분 = '하차' THEN pred END) AS 하차,
+                       SUM(pred) AS 합계
+                FROM (SELECT 날짜, 호선, 역명, 구분, COALESCE(pred_ens, pred_xgb, pred_lgb) AS pred
+                      FROM dash_pred_actual WHERE 날짜 = ANY(:dates)) d
+                GROUP BY 날짜, 호선, 역명
+            ) s
+        ) r
+        WHERE 순위 <= CEIL(역수 * :fraction)
+    """), {**params, "fraction": TOP_FRACTION}).rowcount
+
+
+def _refresh_error_daily(conn, params):
+    conn.execute(text("DELETE FROM dash_error_daily WHERE 날짜 = ANY(:dates)"), params)
+    values = ", ".join(f"('{m}', pred_{m})" for m in MODELS)
+    # CUBE(호선, 구분): 호선별/구분별/전체 소계를 한 번에, NULL → '전체'
+    return conn.execute(text(f"""
+        INSERT INTO dash_error_daily (날짜, 호선, 구분, model, n, abs_err_sum, sq_err_sum, mae, rmse)
+        SELECT 날짜, COALESCE(호선, :all_label), COALESCE(구분, :all_label), model,
+               COUNT(*), SUM(ABS(err)), SUM(err * err), AVG(ABS(err)), SQRT(AVG(err * err))
+        FROM (
+            SELECT d.날짜, d.호선, d.구분, m.model, m.pred - d.실제값 AS err
+            FROM dash_pred_actual d
+            CROSS JOIN LATERAL (VALUES {values}) AS m(model, pred)
+            WHERE d.날짜 = ANY(:dates) AND d.실제값 IS NOT NULL AND m.pred IS NOT NULL
+        ) e
+        GROUP BY 날짜, model, CUBE(호선, 구분)
+    """), {**params, "all_label": ALL_LABEL}).rowcount
+
+
+def refresh(engine, dates=()):
+    """
+    dates: 이번에 pred_data에 쓴 날짜 (실제값이 새로 들어온 이전 날짜는 자동으로 추가)
+    한 트랜잭션으로 세 테이블을 갱신 → 대시보드는 갱신 전/후 한쪽만 봄
+    반환: 갱신 날짜와 테이블별 행 수
+    PostgreSQL 전용 (CUBE, LATERAL, 배열 파라미터) → 다른 DB(로컬 SQLite 등)에서는 건너뜀
+    """
+    if db.dialect(engine) != "postgresql":
+        return {"dates": [], "pred_actual": 0, "top_stations": 0, "error_daily": 0, "pruned": 0,
+                "skipped": f"{db.dialect(engine)} 미지원"}
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        days = {pd.Timestamp(d).date() for d in dates} | set(_pending_dates(conn))
+        if not days:
+            return {"dates": [], "pred_actual": 0, "top_stations": 0, "error_daily": 0, "pruned": 0}
+        params = _date_params(sorted(days))
+        counts = {
+            "dates": [str(d) for d in params["dates"]],
+            "pred_actual": _refresh_pred_actual(conn, params),
+            "top_stations": _refresh_top_stations(conn, params),
+            "error_daily": _refresh_error_daily(conn, params),
+        }
+        # 예측 vs 실제 (역 단위)는 최근 RETENTION_DAYS일만 보관, 나머지 두 테이블은 날짜당 수백 행이라 유지
+        counts["pruned"] = conn.execute(text("""
+            DELETE FROM dash_pred_actual
+            WHERE 날짜 < (SELECT MAX(날짜) FROM dash_pred_actual) - :days
+        """), {"days": RETENTION_DAYS}).rowcount
+    print(f"대시보드 집계 갱신: {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="대시보드 집계 테이블 재구축 (pred_data 날짜 범위)")
+    parser.add_argument("--start", required=True, help="YYYY-MM-DD")
+    parser.add_argument("--end", required=True, help="YYYY-MM-DD")
+    args = parser.parse_args()
+
+    import Xgboost_Lightgbm as merge
+
+    engine = merge._create_engine()
+    with engine.connect() as conn:
+        dates = [r[0] for r in conn.execute(text(
+            "SELECT DISTINCT 날짜 FROM pred_data WHERE 날짜 BETWEEN :s AND :e ORDER BY 1"),
+            {"s": pd.Timestamp(args.start).date(), "e": pd.Timestamp(args.end).date()})]
+    print(refresh(engine, dates))
+
+
+if __name__ == "__main__":
+    main()
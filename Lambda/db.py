@@ -0,0 +1,82 @@
+"""
+DB 연결 공용 모듈
+
+DATABASE_URL 환경 변수(SQLAlchemy URL)가 있으면 모든 Lambda와 train.py가 그 DB를 사용
+    예: postgresql+psycopg2://user:pw@localhost:5432/subway, sqlite:////tmp/subway.db
+없으면 각 모듈의 RDS 설정으로 만든 PostgreSQL URL
+
+PostgreSQL 전용 문법(::date, to_date, 정규식)이 필요한 곳은 아래 함수로 방언에 맞는 SQL 조각을 만듦
+SQLite에서는 날짜가 'YYYY-MM-DD' 문자열 (date() 결과, 바인딩한 date도 같은 문자열로 변환)
+대시보드 집계(dashboard_aggregates.py)는 CUBE/LATERAL을 쓰므로 PostgreSQL에서만 실행
+"""
+import datetime
+import os
+import sqlite3
+
+from sqlalchemy import create_engine as _create_engine
+
+DATABASE_URL_ENV = "DATABASE_URL"
+
+# 날짜 문자열(YYYYMMDD 또는 YYYY-MM-DD...) → date, 그 외 형식은 NULL
+_SQLITE_DATE_SQL = """
+    CASE
+        WHEN {col} GLOB '[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]'
+            THEN date(substr({col}, 1, 4) || '-' || substr({col}, 5, 2) || '-' || substr({col}, 7, 2))
+        WHEN {col} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' THEN date(substr({col}, 1, 10))
+        ELSE NULL
+    END
+"""
+
+# 사용일자가 (YYYYMMDD, YYYY-MM-DD HH:MI:SS) 두가지가 섞여있어 date로 맞추는 식
+_POSTGRES_USE_DATE_SQL = """
+    CASE
+        WHEN {col} ~ '^[0-9]{{8}}$' THEN to_date({col},'YYYYMMDD')
+        WHEN {col} ~ '^[0-9]{{4}}-[0-9]{{2}}-[0-9]{{2}}' THEN to_date(left({col},10),'YYYY-MM-DD')
+        ELSE NULL
+    END
+"""
+
+
+def postgres_url(user, password, host, port, name):
+    return f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{name}"
+
+
+def create_engine(default_url=None, **kwargs):
+    """DATABASE_URL → default_url 순서로 엔진 생성"""
+    url = os.environ.get(DATABASE_URL_ENV) or default_url
+    if not url:
+        raise ValueError(f"DB URL 없음 ({DATABASE_URL_ENV} 환경 변수 또는 RDS 설정 필요)")
+    engine = _create_engine(url, **kwargs)
+    if engine.dialect.name == "sqlite":
+        # 파이썬 3.12부터 sqlite3 기본 date 변환이 폐기 예정 → 직접 ISO 문자열로 등록
+        sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+        sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(" "))
+    return engine
+
+
+def dialect(bind):
+    """엔진/연결의 방언 이름 (bind가 없으면 배포 환경인 postgresql)"""
+    return bind.dialect.name if bind is not None else "postgresql"
+
+
+def as_date(bind, column):
+    """날짜 컬럼(문자열/timestamp) → date 비교용 SQL"""
+    if dialect(bind) == "sqlite":
+        return _SQLITE_DATE_SQL.format(col=column)
+    return f"CAST({column} AS date)"
+
+
+def use_date(bind, column='"사용일자"'):
+    """subway_stats 사용일자 → date (형식이 맞지 않는 값은 NULL)"""
+    if dialect(bind) == "sqlite":
+        return _SQLITE_DATE_SQL.format(col=column)
+    return _POSTGRES_USE_DATE_SQL.format(col=column)
+
+
+def date_series(bind):
+    """:start ~ :end 날짜를 한 행씩 (컬럼 d) 만드는 SELECT - 빠진 날짜 anti-join용"""
+    if dialect(bind) == "sqlite":
+        return ("WITH RECURSIVE g(d) AS (SELECT date(:start) UNION ALL "
+                "SELECT date(d, '+1 day') FROM g WHERE d < date(:end)) SELECT d FROM g")
+    return ("SELECT CAST(g.d AS date) AS d "
+            "FROM generate_series(CAST(:start AS date), CAST(:end AS date), interval '1 day') AS g(d)")
@@ -0,0 +1,88 @@
+"""
+예측 입력 행렬(X) 생성
+
+DataFrame에 열을 하나씩 추가(요일 one-hot 7개, 없는 피처 0)한 뒤 df[features].astype(float)로
+float64 사본을 한 번 더 만드는 대신, features 순서의 float32 C-order 배열을 미리 할당해
+입력 컬럼에서 열 단위로 바로 채움 → 부스터에 DataFrame 없이 ndarray 그대로 전달
+- 년/월/일/요일_*       : 날짜 열을 한 번만 파싱해서 계산
+- 호선_enc/역명_enc     : LabelEncoder.classes_(정렬됨)에 searchsorted, 미등록 라벨 행은 제외
+- 날씨/공휴일여부        : 숫자 변환, 결측 0 (기존 _prepare_features와 같음)
+- 그 밖의 피처(lag 등)   : 입력에 있으면 숫자 변환, 결측이나 입력에 없는 피처는 NaN (학습과 같이 부스터 missing 처리)
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ['월', '화', '수', '목', '금', '토', '일']
+ZERO_FILL_COLS = ('기온', '강수형태', '강수', '습도', '풍속', '공휴일여부')
+DATE_PARTS = {'년': 'year', '월': 'month', '일': 'day'}
+
+
+def _encode(le, values, name):
+    """values(str 배열) → (코드, 등록 여부 mask), le.transform과 같은 코드"""
+    classes = np.asarray(le.classes_).astype(str)
+    pos = np.minimum(np.searchsorted(classes, values), len(classes) - 1)
+    mask = classes[pos] == values
+    if not mask.all():
+        print(f"[WARN] unseen {name} labels dropped: {pd.unique(values[~mask]).tolist()}")
+    return pos, mask
+
+
+def build(df, features, le_line, le_station, stats=None):
+    """
+    입력 행(날짜, 호선, 역명, 날씨...) → (df, X)
+    df: 미등록 호선/역명을 뺀 행 (0..n-1 인덱스, 호선/역명 공백 제거, 날짜 normalize) - X와 같은 순서
+    X : (n, len(features)) float32 C-order
+    stats(dict)를 주면 행/열 수, X 바이트, 제외 행 수, 소요 시간(ms)을 기록
+    """
+    t0 = time.perf_counter()
+    line = df['호선'].astype(str).str.strip().to_numpy(dtype=str)
+    station = df['역명'].astype(str).str.strip().to_numpy(dtype=str)
+    line_code, mask_line = _encode(le_line, line, "호선")
+    station_code, mask_station = _encode(le_station, station, "역명")
+    rows = np.flatnonzero(mask_line & mask_station)
+
+    kept = df.iloc[rows].reset_index(drop=True)
+    kept['호선'] = line[rows]
+    kept['역명'] = station[rows]
+    days = pd.DatetimeIndex(pd.to_datetime(kept['날짜'])).normalize()
+    kept['날짜'] = days
+
+    X = np.empty((len(rows), len(features)), dtype=np.float32, order='C')
+    weekday = days.dayofweek.to_numpy()
+    for j, feat in enumerate(features):
+        if feat == '호선_enc':
+            X[:, j] = line_code[rows]
+        elif feat == '역명_enc':
+            X[:, j] = station_code[rows]
+        elif feat in DATE_PARTS:
+            X[:, j] = getattr(days, DATE_PARTS[feat]).to_numpy()
+        elif feat.startswith('요일_') and feat[3:] in WEEKDAYS:
+            X[:, j] = weekday == WEEKDAYS.index(feat[3:])
+        elif feat in kept.columns:
+            values = pd.to_numeric(kept[feat], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+            X[:, j] = np.nan_to_num(values, nan=0.0) if feat in ZERO_FILL_COLS else values
+        else:
+            X[:, j] = 0 if feat in ZERO_FILL_COLS else np.nan
+
+    if stats is not None:
+        stats.update({
+            "rows": int(X.shape[0]),
+            "features": int(X.shape[1]),
+            "x_bytes": int(X.nbytes),
+            "dropped": int(len(df) - len(rows)),
+            "build_ms": round((time.perf_counter() - t0) * 1000, 2),
+        })
+    return kept, X
+
+
+def raw_predict(model, X):
+    """
+    ndarray X를 변환 없이 예측
+    LGBMRegressor는 DataFrame으로 학습돼 ndarray 입력 시 feature name 경고 → 내부 Booster 사용
+    """
+    booster = getattr(model, "booster_", None)
+    if booster is not None:
+        return booster.predict(X)
+    return model.predict(X)
@@ -0,0 +1,190 @@
+"""
+핸들러 단계별 계측 (모든 Lambda 공용)
+
+with instrument.step("predict", rows_in=len(X)) as st: ... st.rows_out = len(y)
+- 단계마다 벽시계 시간, CPU 시간, 최대 RSS, 입력/출력 행 수, S3 읽기/쓰기 바이트를 기록
+  · CPU 시간은 프로세스 전체 기준 (부스터의 OpenMP 스레드 포함) → 동시에 실행된 단계끼리는 겹침
+  · 최대 RSS는 단계 종료 시점까지의 프로세스 최대값 (Lambda 메모리 설정과 비교용)
+  · S3 바이트는 단계 동안 s3_io가 기록한 전송 합계 (DB 등은 st.bytes_read로 직접 지정), CPU 시간처럼 동시 단계끼리 겹침
+- 단계가 끝나면 CloudWatch EMF(Embedded Metric Format) JSON 한 줄을 출력
+  → 별도 API 호출 없이 로그에서 지표(네임스페이스 NAMESPACE, 차원 Function/Step)로 추출
+- @instrument.handler: 핸들러 시작 시 초기화, 전체 시간을 "total" 단계로 기록,
+  응답 dict에 "instrument" 요약 추가, 오류 응답은 구조화된 ERROR 로그 한 줄로 출력
+
+s3_io와 같이 모듈 전역 기록 + 핸들러 시작 시 reset() (Lambda 컨테이너 재사용)
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = "SubwayPipeline"
+EMIT_EMF = os.environ.get("INSTRUMENT_EMF", "1") != "0"
+METRIC_UNITS = {
+    "wall_ms": "Milliseconds",
+    "cpu_ms": "Milliseconds",
+    "peak_rss_mb": "Megabytes",
+    "rows_in": "Count",
+    "rows_out": "Count",
+    "bytes_read": "Bytes",
+    "bytes_written": "Bytes",
+}
+
+_steps = []
+_lock = threading.Lock()
+_local = threading.local()
+_function = {"name": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")}
+
+
+class Step:
+    """with instrument.step(...) as st 에서 st.rows_out 등을 채우는 객체"""
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = None
+        self.bytes_written = None
+
+
+def reset(function_name=None):
+    with _lock:
+        _steps.clear()
+    if function_name:
+        _function["name"] = function_name
+
+
+def _peak_rss_mb():
+    # Linux ru_maxrss 단위는 KB (macOS는 바이트)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _s3_marker():
+    s3_io = sys.modules.get("s3_io")
+    return len(s3_io.transfer_stats()) if s3_io else 0
+
+
+def _s3_bytes(marker):
+    s3_io = sys.modules.get("s3_io")
+    if s3_io is None:
+        return 0, 0
+    stats = s3_io.transfer_stats()
+    stats = stats[marker:] if marker <= len(stats) else stats   # 단계 도중 reset_stats()된 경우
+    read = sum(s["bytes"] for s in stats if s["op"] == "get")
+    written = sum(s["bytes"] for s in stats if s["op"] == "put")
+    return read, written
+
+
+@contextmanager
+def scope(name):
+    """이 스레드에서 여는 단계 이름 앞에 name. 을 붙임 (로컬 파이프라인에서 단계 구분용)"""
+    prev = getattr(_local, "scope", None)
+    _local.scope = f"{prev}.{name}" if prev else name
+    try:
+        yield
+    finally:
+        _local.scope = prev
+
+
+@contextmanager
+def step(name, rows_in=None):
+    prefix = getattr(_local, "scope", None)
+    st = Step(f"{prefix}.{name}" if prefix else name, rows_in)
+    marker = _s3_marker()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    error = None
+    try:
+        yield st
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s3_read, s3_written = _s3_bytes(marker)
+        record = {
+            "step": st.name,
+            "status": "error" if error else "ok",
+            "wall_ms": round((time.perf_counter() - wall0) * 1000, 1),
+            "cpu_ms": round((time.process_time() - cpu0) * 1000, 1),
+            "peak_rss_mb": _peak_rss_mb(),
+            "rows_in": st.rows_in,
+            "rows_out": st.rows_out,
+            "bytes_read": st.bytes_read if st.bytes_read is not None else s3_read,
+            "bytes_written": st.bytes_written if st.bytes_written is not None else s3_written,
+        }
+        if error:
+            record["error"] = error
+        with _lock:
+            _steps.append(record)
+        emit(record)
+
+
+def emit(record):
+    """단계 기록 → EMF JSON 한 줄 (값이 없는 지표는 생략)"""
+    if not EMIT_EMF:
+        return
+    metrics = {k: record[k] for k in METRIC_UNITS if record.get(k) is not None}
+    line = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": NAMESPACE,
+                "Dimensions": [["Function", "Step"]],
+                "Metrics": [{"Name": k, "Unit": METRIC_UNITS[k]} for k in metrics],
+            }],
+        },
+        "Function": _function["name"],
+        "Step": record["step"],
+        "status": record["status"],
+        **metrics,
+    }
+    if record.get("error"):
+        line["error"] = record["error"]
+    print(json.dumps(line, ensure_ascii=False))
+
+
+def steps():
+    with _lock:
+        return [dict(s) for s in _steps]
+
+
+# 핸들러 응답용 요약 (단계별 기록 + 최대 RSS)
+def summary():
+    recorded = steps()
+    return {
+        "function": _function["name"],
+        "peak_rss_mb": _peak_rss_mb(),
+        "steps": recorded,
+    }
+
+
+def _is_error(response):
+    if not isinstance(response, dict):
+        return False
+    return response.get("status") == "error" or int(response.get("statusCode", 200)) >= 500
+
+
+def handler(fn):
+    """lambda_handler 데코레이터: 전체 시간 계측 + 응답에 "instrument" 요약 추가"""
+    @functools.wraps(fn)
+    def wrapper(event, context):
+        # 로컬 파이프라인처럼 scope 안에서 호출되면 바깥 기록을 지우지 않음
+        if getattr(_local, "scope", None) is None:
+            reset(getattr(context, "function_name", None) or fn.__module__)
+            if "s3_io" in sys.modules:
+                sys.modules["s3_io"].reset_stats()
+        with step("total"):
+            response = fn(event, context)
+        if _is_error(response):
+            print(json.dumps({"level": "ERROR", "Function": _function["name"],
+                              "message": response.get("message") or response.get("body"),
+                              "failed_steps": [s["step"] for s in steps() if s["status"] == "error"]},
+                             ensure_ascii=False))
+        if isinstance(response, dict):
+            response["instrument"] = summary()
+        return response
+    return wrapper
@@ -0,0 +1,280 @@
+"""
+역별 과거 승하차 기반 피처 (lag / rolling / 요일·공휴일 기준선)
+
+예측일 t의 피처는 t-1일까지의 실제값으로만 계산
+- {승차|하차}_lag7   : 지난주 같은 요일 (t-7) 값
+- {승차|하차}_mean7  : 최근 7일 평균 (t-7 ~ t-1, 빠진 날 제외)
+- {승차|하차}_mean28 : 최근 28일 평균
+- {승차|하차}_base   : 공휴일 보정 기준선
+                      평일/주말이면 같은 요일의 최근 4번(공휴일 제외) 평균, 공휴일이면 최근 공휴일 4번 평균
+
+groupby rolling으로 전체 이력을 다시 계산하지 않도록 역별 상태(최근 28일 링버퍼, 요일별/공휴일 최근 4개)를 유지하고
+하루치가 들어올 때마다 O(역 수)로 갱신
+- train.py   : 학습 이력 전체를 날짜순으로 한 번 훑으며 (피처 계산 → 상태 갱신) → 최종 상태를 S3에 저장
+- preprocess : S3 상태에 DB의 새 날짜만 반영한 뒤 예측일 피처를 CSV에 추가하고 상태를 다시 저장
+- 예측 Lambda: CSV에 들어 있는 피처를 그대로 사용 (features 목록에 있으면)
+"""
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+TARGETS = ("승차", "하차")
+WINDOW = 28
+BASE_HISTORY = 4
+STATE_KEY = "features/lag_state.npz"
+FEATURE_NAMES = [f"{t}_{kind}" for kind in ("lag7", "mean7", "mean28", "base") for t in TARGETS]
+
+# 상태 없이 시작할 때 앞쪽에서 읽을 날짜 수 (28일 창, 요일별 4번, 공휴일 4번 정도를 채울 만큼)
+BOOTSTRAP_DAYS = 120
+
+
+def _ordinal(day):
+    return pd.Timestamp(day).toordinal()
+
+
+def _nanmean(values, axis):
+    # 전부 NaN이면 경고 없이 NaN
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=axis)
+    total = np.where(valid, values, 0).sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / np.maximum(count, 1), np.nan).astype(np.float32)
+
+
+class LagState:
+    """
+    keys     : "호선|역명" 목록 (행 번호 = 역 번호)
+    ring     : (역, 28, 2) 최근 28일 실제값, 칸 = 날짜 ordinal % 28
+    ring_ord : (28,) 각 칸에 들어 있는 날짜 ordinal (요청한 날짜와 다르면 빈 칸)
+    weekday  : (역, 7, 4, 2) 요일별 최근 4번(공휴일 제외), weekday_pos: 다음에 쓸 위치
+    holiday  : (역, 4, 2) 최근 공휴일 4번, holiday_pos
+    last_date: 마지막으로 반영한 날짜
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.index = {}
+        self.ring = np.full((0, WINDOW, 2), np.nan, dtype=np.float32)
+        self.ring_ord = np.full(WINDOW, -1, dtype=np.int64)
+        self.weekday = np.full((0, 7, BASE_HISTORY, 2), np.nan, dtype=np.float32)
+        self.weekday_pos = np.zeros((0, 7), dtype=np.int8)
+        self.holiday = np.full((0, BASE_HISTORY, 2), np.nan, dtype=np.float32)
+        self.holiday_pos = np.zeros(0, dtype=np.int8)
+        self.last_date = None
+
+    @staticmethod
+    def station_keys(df):
+        return (df["호선"].astype(str).str.strip() + "|" + df["역명"].astype(str).str.strip()).to_numpy()
+
+    def _rows(self, keys, grow=False):
+        if grow:
+            new = [k for k in dict.fromkeys(keys) if k not in self.index]
+            if new:
+                self._grow(new)
+        return np.array([self.index.get(k, -1) for k in keys], dtype=np.int64)
+
+    def _grow(self, new_keys):
+        n = len(new_keys)
+        for k in new_keys:
+            self.index[k] = len(self.keys)
+            self.keys.append(k)
+        self.ring = np.concatenate([self.ring, np.full((n, WINDOW, 2), np.nan, dtype=np.float32)])
+        self.weekday = np.concatenate([self.weekday, np.full((n, 7, BASE_HISTORY, 2), np.nan, dtype=np.float32)])
+        self.weekday_pos = np.concatenate([self.weekday_pos, np.zeros((n, 7), dtype=np.int8)])
+        self.holiday = np.concatenate([self.holiday, np.full((n, BASE_HISTORY, 2), np.nan, dtype=np.float32)])
+        self.holiday_pos = np.concatenate([self.holiday_pos, np.zeros(n, dtype=np.int8)])
+
+    def features_for(self, day, keys, is_holiday=False):
+        """
+        예측일 day의 피처 (keys 순서, 상태에 없는 역은 NaN)
+        day는 last_date 이후여야 함 (이후 날짜의 실제값이 섞이지 않도록)
+        """
+        t = _ordinal(day)
+        if self.last_date is not None and t <= _ordinal(self.last_date):
+            raise ValueError(f"{pd.Timestamp(day).date()}는 상태의 마지막 날짜({self.last_date.date()}) 이후여야 함")
+        rows = self._rows(keys)
+        known = rows >= 0
+        out = np.full((len(keys), len(FEATURE_NAMES)), np.nan, dtype=np.float32)
+        if not known.any():
+            return pd.DataFrame(out, columns=FEATURE_NAMES)
+
+        # 최근 28일: k일 전 값 (칸의 날짜가 맞지 않으면 NaN)
+        lags = np.arange(1, WINDOW + 1)
+        slots = (t - lags) % WINDOW
+        valid = self.ring_ord[slots] == (t - lags)
+        recent = self.ring[rows[known]][:, slots]              # (역, 28, 2)
+        recent[:, ~valid] = np.nan
+
+        if is_holiday:
+            base = _nanmean(self.holiday[rows[known]], axis=1)
+        else:
+            base = _nanmean(self.weekday[rows[known], pd.Timestamp(day).weekday()], axis=1)
+
+        block = np.concatenate([
+            recent[:, 6],                         # lag7
+            _nanmean(recent[:, :7], axis=1),      # mean7
+            _nanmean(recent, axis=1),             # mean28
+            base,
+        ], axis=1)
+        out[known] = block
+        return pd.DataFrame(out, columns=FEATURE_NAMES)
+
+    def update(self, day, keys, values, is_holiday=False):
+        """
+        하루치 실제값 반영 - values: (행, 2) 승차/하차
+        같은 날짜를 두 번 반영하거나 과거 날짜를 넣으면 ValueError
+        """
+        t = _ordinal(day)
+        if self.last_date is not None and t <= _ordinal(self.last_date):
+            raise ValueError(f"{pd.Timestamp(day).date()}는 이미 반영된 날짜")
+        rows = self._rows(keys, grow=True)
+        values = np.asarray(values, dtype=np.float32)
+
+        slot = t % WINDOW
+        self.ring[:, slot] = np.nan
+        self.ring_ord[slot] = t
+        self.ring[rows, slot] = values
+
+        has_value = ~np.isnan(values).all(axis=1)
+        rows, values = rows[has_value], values[has_value]
+        if is_holiday:
+            pos = self.holiday_pos[rows]
+            self.holiday[rows, pos] = values
+            self.holiday_pos[rows] = (pos + 1) % BASE_HISTORY
+        else:
+            wd = pd.Timestamp(day).weekday()
+            pos = self.weekday_pos[rows, wd]
+            self.weekday[rows, wd, pos] = values
+            self.weekday_pos[rows, wd] = (pos + 1) % BASE_HISTORY
+        self.last_date = pd.Timestamp(day).normalize()
+
+    # ===== 저장/로드 (npz, 예측 쪽은 numpy만 있으면 됨) =====
+    def to_bytes(self):
+        buf = io.BytesIO()
+        np.savez_compressed(
+            buf,
+            keys=np.array(self.keys, dtype=object).astype(str),
+            ring=self.ring, ring_ord=self.ring_ord,
+            weekday=self.weekday, weekday_pos=self.weekday_pos,
+            holiday=self.holiday, holiday_pos=self.holiday_pos,
+            meta=np.array(json.dumps({"last_date": str(self.last_date.date()) if self.last_date is not None else None})),
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        z = np.load(io.BytesIO(data), allow_pickle=False)
+        state = cls()
+        state.keys = [str(k) for k in z["keys"]]
+        state.index = {k: i for i, k in enumerate(state.keys)}
+        state.ring, state.ring_ord = z["ring"], z["ring_ord"]
+        state.weekday, state.weekday_pos = z["weekday"], z["weekday_pos"]
+        state.holiday, state.holiday_pos = z["holiday"], z["holiday_pos"]
+        last = json.loads(str(z["meta"]))["last_date"]
+        state.last_date = pd.Timestamp(last) if last else None
+        return state
+
+
+def _iter_days(df):
+    """날짜순으로 (날짜, 행 위치) - 정렬은 한 번만"""
+    days = pd.to_datetime(df["날짜"]).dt.normalize().to_numpy()
+    order = np.argsort(days, kind="stable")
+    day_values = days[order]
+    bounds = np.flatnonzero(np.r_[True, day_values[1:] != day_values[:-1], True])
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield pd.Timestamp(day_values[start]), order[start:stop]
+
+
+def _holiday_flags(df):
+    return pd.to_numeric(df["공휴일여부"], errors="coerce").fillna(0).to_numpy() > 0
+
+
+def add_training_features(df, state=None):
+    """
+    학습 프레임(날짜, 호선, 역명, 승차, 하차, 공휴일여부)에 FEATURE_NAMES 컬럼 추가
+    날짜순으로 하루씩: 그날 피처 계산(전날까지 상태) → 그날 실제값으로 상태 갱신
+    반환: (df, 최종 상태)
+    """
+    state = state or LagState()
+    keys = LagState.station_keys(df)
+    values = df[list(TARGETS)].to_numpy(dtype=np.float32)
+    holiday = _holiday_flags(df)
+    out = np.full((len(df), len(FEATURE_NAMES)), np.nan, dtype=np.float32)
+
+    for day, idx in _iter_days(df):
+        if state.last_date is not None and day <= state.last_date:
+            continue
+        is_hol = bool(holiday[idx].any())
+        out[idx] = state.features_for(day, keys[idx], is_hol).to_numpy()
+        state.update(day, keys[idx], values[idx], is_hol)
+
+    df = df.copy()
+    for j, name in enumerate(FEATURE_NAMES):
+        df[name] = out[:, j]
+    return df, state
+
+
+def build_state(df, state=None):
+    """add_training_features와 같은 순서로 상태만 갱신 (피처 계산 생략)"""
+    state = state or LagState()
+    keys = LagState.station_keys(df)
+    values = df[list(TARGETS)].to_numpy(dtype=np.float32)
+    holiday = _holiday_flags(df)
+    for day, idx in _iter_days(df):
+        if state.last_date is None or day > state.last_date:
+            state.update(day, keys[idx], values[idx], bool(holiday[idx].any()))
+    return state
+
+
+def daily_actuals(rows):
+    """subway_stats 행(날짜, 호선, 역명, 구분, 인원수) → 날짜·역별 승차/하차 (wide)"""
+    rows = rows.copy()
+    rows["날짜"] = pd.to_datetime(rows["날짜"]).dt.normalize()
+    rows["인원수"] = pd.to_numeric(rows["인원수"], errors="coerce")
+    wide = rows.pivot_table(index=["날짜", "호선", "역명"], columns="구분", values="인원수",
+                            aggfunc="mean", observed=True)   # train.preprocess와 같은 집계
+    wide.columns = wide.columns.astype(str)
+    wide = wide.reset_index()
+    for t in TARGETS:
+        if t not in wide.columns:
+            wide[t] = np.nan
+    return wide
+
+
+def catch_up(state, actuals, holidays=None):
+    """
+    daily_actuals 결과 중 상태의 마지막 날짜 이후만 순서대로 반영
+    holidays: 공휴일 날짜 집합 (Timestamp)
+    반환: 반영한 날짜 수
+    """
+    holidays = holidays or set()
+    applied = 0
+    for day, grp in actuals.sort_values("날짜").groupby("날짜", sort=True):
+        if state.last_date is not None and day <= state.last_date:
+            continue
+        state.update(day, LagState.station_keys(grp), grp[list(TARGETS)].to_numpy(), day in holidays)
+        applied += 1
+    return applied
+
+
+def attach(df, state, day, is_holiday=False):
+    """예측 대상 행(호선, 역명)에 day의 피처 컬럼 추가"""
+    feats = state.features_for(day, LagState.station_keys(df), is_holiday)
+    df = df.reset_index(drop=True)
+    for name in FEATURE_NAMES:
+        df[name] = feats[name].to_numpy()
+    return df
+
+
+def load_state_s3(s3, bucket, key=STATE_KEY):
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    return LagState.from_bytes(obj["Body"].read())
+
+
+def save_state_s3(s3, bucket, state, key=STATE_KEY):
+    s3.put_object(Bucket=bucket, Key=key, Body=state.to_bytes(), ContentType="application/octet-stream")
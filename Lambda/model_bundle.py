@@ -0,0 +1,201 @@
+"""
+모델 번들 (파일 하나 = 부스터 + 인코더 + 피처 목록)
+
+joblib 5개(model_xgb_only, model_lgb_only, features, line_encoder, station_encoder)를
+GET 5번 + 압축 해제 + unpickle 하는 대신, 예측 Lambda 하나에 필요한 것만 파일 하나로 묶음
+    model/bundle_xgb.npy, model/bundle_lgb.npy
+
+파일은 uint8 1차원 .npy (압축 없음) → np.load(mmap_mode="r")로 열고 구간(offset, length) 단위로 참조
+    [MAGIC 8바이트][헤더 길이 uint32][헤더 JSON][패딩] [구간 1][패딩] [구간 2] ...
+- 구간 시작 위치는 ALIGN(64바이트) 배수
+- 헤더: 포맷 버전, 모델 종류, 레이아웃(분리형/결합형), 피처 목록, 구간별 (offset, length, dtype, shape)
+- 부스터: 라이브러리 고유 바이트 (XGBoost UBJSON raw, LightGBM 모델 문자열) → unpickle 없이 라이브러리 로더로 역직렬화
+          mmap이 아님: XGBoost는 구간을 bytearray로 복사한 뒤 트리를 만들고, LightGBM은 모델 문자열을 파싱
+          → 번들 로드 시간의 대부분은 이 역직렬화 (모델 크기에 비례)
+- 인코더: classes_ 배열 (고정 길이 유니코드) → mmap 구간을 그대로 classes_로 사용 (복사 없음)
+번들이 줄이는 비용: S3 GET 수(5 → 1), joblib 압축 해제, pickle 역직렬화, 인코더 배열 복사
+
+사용 예:
+    python Lambda/model_bundle.py model_dir        # S3 model/ 폴더의 joblib → 번들 변환
+"""
+import argparse
+import io
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"SUBWAYMB"
+FORMAT_VERSION = 1
+ALIGN = 64
+TARGETS = ("승차", "하차")
+BUNDLE_KEYS = {"xgb": "model/bundle_xgb.npy", "lgb": "model/bundle_lgb.npy"}
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def _booster_bytes(model, model_name):
+    if model_name == "xgb":
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        return bytes(booster.save_raw(raw_format="ubj"))
+    booster = getattr(model, "booster_", model)
+    return booster.model_to_string().encode("utf-8")
+
+
+def _load_booster(buf, model_name):
+    if model_name == "xgb":
+        import xgboost as xgb
+
+        model = xgb.XGBRegressor()
+        model.load_model(bytearray(buf))
+        return model
+    import lightgbm as lgb
+
+    # LGBMRegressor 대신 Booster - predict(X) 인터페이스는 같음
+    return lgb.Booster(model_str=bytes(buf).decode("utf-8"))
+
+
+def to_bytes(models, features, le_line, le_station, model_name):
+    """
+    models: 예측 Lambda가 쓰는 모델 파일 dict (train.model_file_payload 결과)
+    반환: .npy 파일 내용 (bytes)
+    """
+    segments, header = [], {
+        "format": "subway-model-bundle",
+        "version": FORMAT_VERSION,
+        "model": model_name,
+        "features": list(features),
+        "segments": {},
+    }
+    if "joint" in models:
+        header["layout"] = "joint"
+        header["targets"] = list(models["targets"])
+        header["direction_col"] = models.get("direction_col")
+        segments.append(("booster/joint", _booster_bytes(models["joint"][model_name], model_name), None))
+    else:
+        header["layout"] = "split"
+        for target in TARGETS:
+            segments.append((f"booster/{target}", _booster_bytes(models[target][model_name], model_name), None))
+    for name, le in (("encoder/line", le_line), ("encoder/station", le_station)):
+        classes = np.asarray(le.classes_).astype(str)
+        segments.append((name, classes.tobytes(), classes.dtype.str))
+
+    # 헤더 크기가 구간 offset에 영향을 주므로 offset을 채운 헤더 길이로 두 번 계산
+    def layout(header_len):
+        pos = len(MAGIC) + 4 + header_len
+        pos += _pad(pos)
+        for name, data, dtype in segments:
+            entry = {"offset": pos, "length": len(data)}
+            if dtype:
+                entry["dtype"] = dtype
+            header["segments"][name] = entry
+            pos += len(data) + _pad(len(data))
+        return json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    encoded = layout(0)
+    while True:
+        again = layout(len(encoded))
+        if len(again) == len(encoded):
+            encoded = again
+            break
+        encoded = again
+
+    body = bytearray(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+    body += b"\0" * _pad(len(body))
+    for name, data, _ in segments:
+        assert len(body) == header["segments"][name]["offset"]
+        body += data + b"\0" * _pad(len(data))
+
+    buf = io.BytesIO()
+    np.save(buf, np.frombuffer(bytes(body), dtype=np.uint8), allow_pickle=False)
+    return buf.getvalue()
+
+
+def save(path, models, features, le_line, le_station, model_name):
+    data = to_bytes(models, features, le_line, le_station, model_name)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+def read_header(raw):
+    """raw: np.load 결과(uint8 1차원) → 헤더 dict, 버전이 다르면 ValueError"""
+    if bytes(raw[:len(MAGIC)]) != MAGIC:
+        raise ValueError("모델 번들 파일이 아님")
+    (header_len,) = struct.unpack("<I", bytes(raw[len(MAGIC):len(MAGIC) + 4]))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(raw[start:start + header_len]).decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"지원하지 않는 번들 버전: {header.get('version')} (지원: {FORMAT_VERSION})")
+    return header
+
+
+def _segment(raw, header, name):
+    seg = header["segments"][name]
+    return raw[seg["offset"]:seg["offset"] + seg["length"]]
+
+
+def load(path, mmap=True):
+    """
+    번들 → (models, features, le_line, le_station)  (예측 Lambda의 _load_artifacts와 같은 형태)
+    mmap=True면 인코더/헤더는 파일 구간을 그대로 참조, 부스터는 구간을 읽어 역직렬화 (복사/파싱 비용 있음)
+    """
+    from sklearn.preprocessing import LabelEncoder
+
+    raw = np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    header = read_header(raw)
+    model_name = header["model"]
+
+    if header["layout"] == "joint":
+        models = {"joint": {model_name: _load_booster(_segment(raw, header, "booster/joint"), model_name)},
+                  "targets": header["targets"],
+                  "direction_col": header["direction_col"]}
+    else:
+        models = {target: {model_name: _load_booster(_segment(raw, header, f"booster/{target}"), model_name)}
+                  for target in TARGETS}
+
+    encoders = []
+    for name in ("encoder/line", "encoder/station"):
+        le = LabelEncoder()
+        le.classes_ = np.frombuffer(_segment(raw, header, name), dtype=header["segments"][name]["dtype"])
+        encoders.append(le)
+    return models, header["features"], encoders[0], encoders[1]
+
+
+def from_joblib_dir(model_dir, out_dir=None, model_types=("xgb", "lgb")):
+    """S3 model/ 폴더를 내려받은 joblib 파일들 → bundle_{xgb|lgb}.npy, 반환: {모델: 경로}"""
+    import joblib
+
+    out_dir = out_dir or model_dir
+
+    def load_joblib(key):
+        return joblib.load(os.path.join(model_dir, os.path.basename(key)))
+
+    features = load_joblib("model/features.joblib")
+    le_line = load_joblib("model/line_encoder.joblib")
+    le_station = load_joblib("model/station_encoder.joblib")
+    written = {}
+    for name in model_types:
+        models = load_joblib(f"model/model_{name}_only.joblib")
+        path = os.path.join(out_dir, os.path.basename(BUNDLE_KEYS[name]))
+        save(path, models, features, le_line, le_station, name)
+        written[name] = path
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="joblib 모델 파일 → 모델 번들 변환")
+    parser.add_argument("model_dir", help="model_xgb_only.joblib 등이 있는 폴더")
+    parser.add_argument("--out-dir", default=None, help="번들 저장 폴더 (기본: model_dir)")
+    args = parser.parse_args()
+    for name, path in from_joblib_dir(args.model_dir, args.out_dir).items():
+        print(f"{name}: {path} ({os.path.getsize(path) / 1024 / 1024:.2f}MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+일일 파이프라인 로컬 실행기 (한 프로세스, 메모리 전달)
+
+EventBridge 고정 시각(수집 21:00 → 전처리 21:30 → XGB 22:00 → LGB 22:30 → 앙상블 23:00)에
+단계마다 S3 CSV를 쓰고 다시 읽는 대신, 같은 Lambda 코드를 의존 관계(DAG) 순서로 한 프로세스에서 호출
+- 단계는 의존 단계가 끝나는 즉시 시작 → 전체 소요 시간 = 단계 실행 시간의 합 (대기 시간 없음)
+- 서로 독립인 단계는 동시에 실행: 모델 로드는 수집/전처리와 함께, XGB/LGB 예측은 서로 함께
+- 단계 사이 데이터는 DataFrame 그대로 전달 (prepared_data/ · predictions/ CSV를 거치지 않음)
+- 단계 안의 세부 계측(instrument.py)은 "단계.세부" 이름으로 기록 (예: predict_xgb.encode)
+- --checkpoint: Lambda와 같은 위치에 전처리 CSV/manifest, 예측 CSV/index도 저장
+  → 중간에 실패해도 기존 Lambda(예측, 앙상블 범위 모드)로 이어서 실행 가능
+
+단계(의존 단계):
+    collect, load_xgb, load_lgb (없음)
+    prepare (collect) → predict_xgb (prepare, load_xgb), predict_lgb (prepare, load_lgb)
+    merge (predict_xgb, predict_lgb)
+
+사용 예:
+    python Lambda/pipeline_runner.py --bucket subway-whitenut-bucket
+    python Lambda/pipeline_runner.py --bucket subway-whitenut-bucket --skip-collect --checkpoint --out run.json
+    # 네트워크 없이 (로컬 폴더의 model/ + SQLite)
+    python Lambda/pipeline_runner.py --skip-collect --storage file:///tmp/s3 --database-url sqlite:////tmp/subway.db
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# 예측 모듈 폴더와 공용 모듈(s3_io 등)이 있는 Lambda/ 폴더를 import 경로에 추가
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.join(_HERE, "Xgboost"), os.path.join(_HERE, "LightGBM"), _HERE):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import Xgboost_Lightgbm as merge
+import db
+import instrument
+import predict_lightgbm
+import predict_xgboost
+import preprocess
+import s3_io
+import storage
+from resident_predictor import PREDICTOR_MODULES
+
+DEFAULT_WORKERS = 4
+
+
+def run_dag(stages, workers=DEFAULT_WORKERS):
+    """
+    stages: {이름: (의존 단계 이름 목록, fn)}, fn(deps) → 결과 (deps: {의존 단계 이름: 결과})
+    의존 단계가 모두 끝난 단계부터 바로 제출, 실패한 단계의 하위 단계는 건너뜀
+    반환: (결과 dict, 단계별 기록 dict)
+    """
+    results, report, running = {}, {}, {}
+    pending = dict(stages)
+    t0 = time.perf_counter()
+
+    def call(name, fn, deps):
+        start = time.perf_counter()
+        try:
+            with instrument.scope(name):
+                return fn(deps), None, start, time.perf_counter()
+        except Exception as e:
+            return None, str(e), start, time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name, (deps, fn) in list(pending.items()):
+                if any(report.get(d, {}).get("status") in ("error", "skipped") for d in deps):
+                    report[name] = {"status": "skipped"}
+                    del pending[name]
+                elif all(d in results for d in deps):
+                    running[pool.submit(call, name, fn, {d: results[d] for d in deps})] = name
+                    del pending[name]
+            if not running:
+                if pending:
+                    raise ValueError(f"의존 단계를 찾을 수 없음: {sorted(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                value, error, start, end = fut.result()
+                report[name] = {
+                    "status": "error" if error else "ok",
+                    "start_sec": round(start - t0, 3),
+                    "elapsed_sec": round(end - start, 3),
+                }
+                if error:
+                    report[name]["message"] = error
+                    print(f"[{name}] 실패: {error}")
+                else:
+                    results[name] = value
+                    print(f"[{name}] 완료 ({report[name]['elapsed_sec']}s)")
+    return results, report
+
+
+def build_stages(s3, engine, collect=True, checkpoint=False, event=None):
+    """일일 파이프라인 단계 정의 (각 단계는 해당 Lambda 모듈의 함수를 그대로 호출)"""
+    event = event or {}
+
+    def collect_stage(deps):
+        import time_date_collection  # requests/holidays는 수집 단계에서만 필요
+
+        result = time_date_collection.lambda_handler({}, None)
+        if result.get("statusCode") != 200:
+            raise RuntimeError(result.get("body"))
+        return result
+
+    def prepare_stage(deps):
+        df, info = preprocess.prepare_frame(s3, engine)
+        if df is None:
+            raise RuntimeError(info.get("message"))
+        if checkpoint:
+            info["s3_key"] = preprocess.save_prepared(s3, df, info["target_date"])
+        return df, info
+
+    def load_stage(model):
+        return lambda deps: PREDICTOR_MODULES[model]._load_artifacts(s3)
+
+    def predict_stage(model):
+        def fn(deps):
+            df, _ = deps["prepare"]
+            module = PREDICTOR_MODULES[model]
+            out_df = module._predict_rows(df, *deps[f"load_{model}"])
+            if out_df is None:
+                raise RuntimeError("인코딩 가능한 행이 없음(모든 라벨이 미등록)")
+            if checkpoint:
+                module._save_predictions(s3, out_df)
+            return out_df
+        return fn
+
+    def merge_stage(deps):
+        df_all, df_ens, settings = merge._merge_frames(deps["predict_xgb"], deps["predict_lgb"], event)
+        counts = merge._write_db(df_all, engine)
+        dates = sorted({str(d) for d in df_all["날짜"]})
+        dashboard = merge._refresh_dashboard(engine, dates, event)
+        return {"dates": dates, "rows": int(len(df_all)), "ensemble_rows": int(len(df_ens)),
+                **settings, **counts, "dashboard": dashboard}
+
+    stages = {
+        "prepare": (["collect"] if collect else [], prepare_stage),
+        "load_xgb": ([], load_stage("xgb")),
+        "load_lgb": ([], load_stage("lgb")),
+        "predict_xgb": (["prepare", "load_xgb"], predict_stage("xgb")),
+        "predict_lgb": (["prepare", "load_lgb"], predict_stage("lgb")),
+        "merge": (["predict_xgb", "predict_lgb"], merge_stage),
+    }
+    if collect:
+        stages["collect"] = ([], collect_stage)
+    return stages
+
+
+def run_pipeline(s3=None, engine=None, collect=True, checkpoint=False, event=None, workers=DEFAULT_WORKERS):
+    """반환: Lambda 응답과 같은 형식의 dict (단계별 시작/소요 시간 포함)"""
+    s3 = s3 or storage.client()
+    engine = engine or preprocess._create_engine()
+    s3_io.reset_stats()
+    instrument.reset("pipeline_runner")
+    t0 = time.perf_counter()
+    results, report = run_dag(build_stages(s3, engine, collect, checkpoint, event), workers)
+
+    failed = [name for name, r in report.items() if r["status"] != "ok"]
+    out = {
+        "status": "error" if failed else "ok",
+        "elapsed_sec": round(time.perf_counter() - t0, 3),
+        "stages_sec": round(sum(r.get("elapsed_sec", 0) for r in report.values()), 3),
+        "stages": report,
+        "transfers": s3_io.transfer_summary(),
+        "instrument": instrument.summary(),
+    }
+    if "prepare" in results:
+        out["prepare"] = results["prepare"][1]
+    if "merge" in results:
+        out["merge"] = results["merge"]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="일일 파이프라인(수집→전처리→예측→앙상블)을 한 프로세스에서 실행")
+    parser.add_argument("--bucket", help="S3 버킷 (각 Lambda 모듈의 S3_BUCKET 대신 사용)")
+    parser.add_argument("--skip-collect", action="store_true", help="수집 단계 생략 (DB에 이미 적재된 경우)")
+    parser.add_argument("--checkpoint", action="store_true", help="단계 결과를 Lambda와 같은 S3 위치에도 저장")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="동시에 실행할 최대 단계 수")
+    parser.add_argument("--out", help="실행 결과 JSON 경로")
+    parser.add_argument("--storage", help="저장소 URL (s3, file:///경로, memory://), 기본: STORAGE_URL 환경 변수")
+    parser.add_argument("--database-url", help="SQLAlchemy DB URL, 기본: DATABASE_URL 환경 변수 또는 RDS 설정")
+    args = parser.parse_args()
+
+    if args.bucket:
+        for module in (preprocess, predict_xgboost, predict_lightgbm, merge):
+            module.S3_BUCKET = args.bucket
+
+    # 수집 단계 등 각 모듈이 직접 만드는 클라이언트/엔진도 같은 설정을 쓰도록 환경 변수로도 지정
+    if args.storage:
+        os.environ[storage.STORAGE_URL_ENV] = args.storage
+    if args.database_url:
+        os.environ[db.DATABASE_URL_ENV] = args.database_url
+
+    result = run_pipeline(collect=not args.skip_collect, checkpoint=args.checkpoint, workers=args.workers)
+    print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+    return 0 if result["status"] == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
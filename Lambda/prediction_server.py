@@ -0,0 +1,233 @@
+"""
+상주형 예측 서버 (임의 날짜/날씨 조건 질의용)
+
+배치 파이프라인을 다시 돌리지 않고 "다음 주 금요일 30mm 비가 오면?" 같은 질의에 바로 응답
+모델/인코더는 시작 시 한 번만 로드(ResidentPredictor)하고,
+동시에 들어온 요청은 MicroBatcher가 시간 창 단위로 모아 한 번의 predict로 처리
+
+실행 예:
+    python Lambda/prediction_server.py --bucket subway-whitenut-bucket --port 8080
+    python Lambda/prediction_server.py --model-dir ./model --max-batch-size 1024 --max-latency-ms 20
+
+요청 예 (POST /predict, 단건 또는 {"rows": [...]}):
+    {"날짜": "2025-08-22", "호선": "2호선", "역명": "강남",
+     "기온": 24.5, "강수": 30, "강수형태": 1, "습도": 90, "풍속": 3.2, "공휴일여부": 0}
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from resident_predictor import ResidentPredictor
+
+WEATHER_COLS = ["기온", "강수형태", "강수", "습도", "풍속", "공휴일여부"]
+REQUEST_TIMEOUT_SEC = 30
+
+
+class MicroBatcher:
+    """
+    submit()으로 들어온 행들을 큐에 쌓고, 워커 스레드가
+    첫 요청 도착 후 max_latency_ms 동안(또는 max_batch_size 행이 찰 때까지) 모아서
+    predict_fn(DataFrame) 한 번으로 처리한 뒤 요청별로 결과를 나눠 돌려줌
+    묶은 배치가 실패하면 요청마다 다시 실행 → 잘못된 요청만 오류를 받음
+    """
+
+    def __init__(self, predict_fn, max_batch_size=512, max_latency_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "rows": 0, "requests": 0, "predict_sec": 0.0}
+        self._worker = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, rows, timeout=REQUEST_TIMEOUT_SEC):
+        fut = Future()
+        self._queue.put((rows, fut))
+        return fut.result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch, n_rows = [first], len(first[0])
+        deadline = time.monotonic() + self.max_latency
+        while n_rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            rows = [r for req_rows, _ in batch for r in req_rows]
+            try:
+                t0 = time.perf_counter()
+                out = self.predict_fn(pd.DataFrame(rows))
+                elapsed = time.perf_counter() - t0
+            except Exception as e:
+                # 한 요청 때문에 묶인 요청 전체가 실패하지 않도록 요청마다 다시 실행
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    self._run_each(batch)
+                continue
+
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["rows"] += len(rows)
+                self.stats["requests"] += len(batch)
+                self.stats["predict_sec"] += elapsed
+
+            records = _to_records(out)
+            offset = 0
+            for req_rows, fut in batch:
+                fut.set_result(records[offset:offset + len(req_rows)])
+                offset += len(req_rows)
+
+    def _run_each(self, batch):
+        for req_rows, fut in batch:
+            try:
+                fut.set_result(_to_records(self.predict_fn(pd.DataFrame(req_rows))))
+            except Exception as e:
+                fut.set_exception(e)
+
+    def snapshot(self):
+        with self._lock:
+            s = dict(self.stats)
+        s["avg_batch_rows"] = round(s["rows"] / s["batches"], 1) if s["batches"] else 0
+        return s
+
+
+# NaN(미등록 역) → error 표시, numpy 값 → 파이썬 기본형
+def _to_records(df):
+    records = []
+    for rec in df.to_dict(orient="records"):
+        clean = {}
+        for k, v in rec.items():
+            if isinstance(v, (float, np.floating)):
+                clean[k] = None if np.isnan(v) else int(v)
+            else:
+                clean[k] = v
+        if clean.get("승차") is None:
+            clean["error"] = "미등록 호선/역명"
+        records.append(clean)
+    return records
+
+
+# 요청 JSON → 행 목록 (date/line/station 영문 키도 허용)
+def _parse_rows(payload):
+    rows = payload.get("rows", [payload]) if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        raise ValueError("요청 본문은 객체, 객체 목록 또는 {\"rows\": [...]} 이어야 함")
+    aliases = {"date": "날짜", "line": "호선", "station": "역명"}
+    parsed = []
+    for r in rows:
+        if not isinstance(r, dict):
+            raise ValueError(f"요청 행은 객체여야 함: {r!r}")
+        row = {aliases.get(k, k): v for k, v in r.items()}
+        missing = [c for c in ("날짜", "호선", "역명") if c not in row]
+        if missing:
+            raise ValueError(f"필수 항목 누락: {missing}")
+        # 잘못된 값은 배치에 들어가기 전에 이 요청만 400으로 거절
+        try:
+            row["날짜"] = pd.Timestamp(row["날짜"]).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise ValueError(f"잘못된 날짜: {row['날짜']}") from None
+        for col in WEATHER_COLS:
+            try:
+                row[col] = float(row.get(col, 0) or 0)
+            except (TypeError, ValueError):
+                raise ValueError(f"잘못된 {col} 값: {row[col]}") from None
+        parsed.append(row)
+    if not parsed:
+        raise ValueError("요청 행이 비어 있음")
+    return parsed
+
+
+# 동시 접속이 몰려도 연결이 거절되지 않도록 listen backlog 확대
+class PredictionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def make_handler(batcher, predictor):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "models": predictor.model_types,
+                                 "stations": int(len(predictor.le_station.classes_)),
+                                 "batching": batcher.snapshot()})
+            else:
+                self._send(404, {"status": "error", "message": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send(404, {"status": "error", "message": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                rows = _parse_rows(json.loads(self.rfile.read(length) or b"{}"))
+            except (ValueError, TypeError) as e:
+                self._send(400, {"status": "error", "message": str(e)})
+                return
+            try:
+                self._send(200, {"status": "ok", "predictions": batcher.submit(rows)})
+            except Exception as e:
+                self._send(500, {"status": "error", "message": str(e)})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="상주형 지하철 승하차 예측 서버")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--bucket", help="모델을 읽을 S3 버킷 (기본: 예측 Lambda 설정값)")
+    src.add_argument("--model-dir", help="model/*.joblib (또는 bundle_*.npy) 을 내려받은 로컬 폴더")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=512, help="한 번의 predict에 넣을 최대 행 수")
+    parser.add_argument("--max-latency-ms", type=float, default=10, help="요청을 모으는 최대 대기 시간")
+    args = parser.parse_args()
+
+    if args.model_dir:
+        predictor = ResidentPredictor.from_dir(args.model_dir)
+    else:
+        predictor = ResidentPredictor.from_s3(bucket=args.bucket)
+    batcher = MicroBatcher(predictor.predict_frame, args.max_batch_size, args.max_latency_ms)
+
+    server = PredictionHTTPServer((args.host, args.port), make_handler(batcher, predictor))
+    print(f"예측 서버 시작: http://{args.host}:{args.port} (models={predictor.model_types})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
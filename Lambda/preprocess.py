@@ -1,8 +1,12 @@
-import boto3
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from datetime import datetime, timedelta
-from io import BytesIO
+
+import db
+import instrument
+import lag_features
+import s3_io
+import storage
 
 # ==== 환경/상수 ====
 DB_USER = ""
@@ -13,6 +17,7 @@ DB_NAME = "subway"
 
 S3_BUCKET = ""
 S3_KEY_PREFIX = "prepared_data"  # 결과 저장 폴더 (CSV)
+LATEST_MANIFEST_KEY = f"{S3_KEY_PREFIX}/_latest.json"  # 최신 전처리 결과 포인터
 # ===================
 
 def safe_to_datetime(series):
@@ -29,33 +34,119 @@ def safe_to_datetime(series):
     
     return result
 
-def lambda_handler(event, context):
-    try:
-        s3 = boto3.client("s3")
-        engine = create_engine(
-            f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-        )
-
+# 역 목록 × 날짜 → 예측 입력 행 (prepared_data CSV와 같은 컬럼)
+# dates의 날짜마다 역 전체, 날씨는 일 평균, 공휴일여부 0/1, 수치 결측 0
+# 백테스트(backtest.py)도 같은 함수로 여러 날짜를 한 번에 만듦
+def build_input_frame(stations, weather, holiday, dates):
+    weather = weather.copy()
+    holiday = holiday.copy()
+    weather['날짜'] = safe_to_datetime(weather['날짜']).dt.normalize()
+    holiday['날짜'] = safe_to_datetime(holiday['날짜']).dt.normalize()
+
+    # 구분의 "강수형태","강수 형태" 해당 값들 때문에 띄여쓰기 없애기
+    weather['구분'] = weather['구분'].astype(str).str.replace(" ", "", regex=False)
+
+    # 학습을 위해서 melt 풀어주기
+    weather_daily = (
+        weather.pivot_table(index='날짜', columns='구분', values='값', aggfunc='mean')
+               .reset_index()
+    )
+    # 역명, 호선명만 있는 테이블 × 날짜
+    df = stations.merge(pd.DataFrame({'날짜': pd.DatetimeIndex(dates).normalize()}), how='cross')
+
+    # weather과 station 조인
+    # 조인한 테이블과 공휴일 데이터 조인
+    # 모두 '날짜' 컬럼으로
+    df = df.merge(weather_daily, on='날짜', how='left') \
+           .merge(holiday[['날짜','공휴일여부']], on='날짜', how='left')
+
+    # 공휴일여부 0/1
+    df['공휴일여부'] = df['공휴일여부'].fillna('N').map({'Y': 1, 'N': 0}).fillna(0).astype(int)
+
+    # 기상 수치 결측 0
+    for col in ['기온','강수형태','강수','습도','풍속']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    # 날짜 파생
+    df['년'] = df['날짜'].dt.year
+    df['월'] = df['날짜'].dt.month
+    df['일'] = df['날짜'].dt.day
+    return df
+
+# 최신 전처리 결과를 가리키는 manifest 저장
+# CSV 업로드가 끝난 뒤 한 번의 PUT으로 덮어쓰므로 항상 완성된 파일만 가리킴
+# 예측 Lambda는 prepared_data/ 전체를 나열하지 않고 이 파일 하나만 GET
+def _write_manifest(s3, target_date, key, rows):
+    s3_io.write_json(s3, S3_BUCKET, LATEST_MANIFEST_KEY, {
+        "date": str(target_date.date()),
+        "key": key,
+        "rows": int(rows),
+        "updated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    })
+
+# (since, until] 구간의 subway_stats 행 (날짜는 date로 맞춤)
+def read_actual_rows(engine, since, until):
+    return pd.read_sql(
+        text(f"SELECT * FROM (SELECT {db.use_date(engine)} AS 날짜, 호선, 역명, 구분, 인원수 FROM subway_stats) s "
+             "WHERE 날짜 > :since AND 날짜 <= :until"),
+        engine, params={"since": pd.Timestamp(since).date(), "until": pd.Timestamp(until).date()}
+    )
+
+# (since, until] 구간의 공휴일 날짜 집합
+def read_holiday_days(engine, since, until):
+    day = db.as_date(engine, "날짜")
+    holidays = pd.read_sql(
+        text(f"SELECT 날짜 FROM holidays_stats WHERE 공휴일여부 = 'Y' "
+             f"AND {day} > :since AND {day} <= :until"),
+        engine, params={"since": pd.Timestamp(since).date(), "until": pd.Timestamp(until).date()}
+    )
+    return set(safe_to_datetime(holidays['날짜']).dt.normalize())
+
+# 역별 lag/rolling 피처
+# S3의 상태에 (상태 마지막 날짜, max_date] 구간만 DB에서 읽어 반영 → 역 수만큼의 갱신만 발생
+# 상태가 없으면 max_date 이전 BOOTSTRAP_DAYS일로 새로 만듦
+def _attach_lag_features(s3, engine, df, max_date, target_date, is_holiday):
+    max_date = pd.Timestamp(max_date).normalize()
+    state = lag_features.load_state_s3(s3, S3_BUCKET)
+    if state is None or state.last_date is None:
+        state = lag_features.LagState()
+        since = max_date - pd.Timedelta(days=lag_features.BOOTSTRAP_DAYS)
+    else:
+        since = state.last_date
+
+    applied = 0
+    if since < max_date:
+        rows = read_actual_rows(engine, since, max_date)
+        if not rows.empty:
+            holiday_days = read_holiday_days(engine, since, max_date)
+            applied = lag_features.catch_up(state, lag_features.daily_actuals(rows), holiday_days)
+
+    df = lag_features.attach(df, state, target_date, is_holiday)
+    if applied:
+        lag_features.save_state_s3(s3, S3_BUCKET, state)
+    return df, applied
+
+# DATABASE_URL 환경 변수가 있으면 그 DB (로컬 PostgreSQL/SQLite, db.py)
+def _create_engine():
+    return db.create_engine(db.postgres_url(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME))
+
+# 예측일 입력 행 생성 (DB 조회 → 가공 → lag 피처)
+# 반환: (df, info) - df가 None이면 info가 그대로 응답 (데이터 없음 등)
+# 로컬 파이프라인(pipeline_runner.py)은 S3 저장 없이 df를 예측 단계에 바로 넘김
+def prepare_frame(s3, engine):
+    with instrument.step("db_read") as st:
         # subway_stats에서 max(사용일자)+1일
         # SQL에서 max(사용일자) 구해서 가져오기
         # 날짜가 (YYYYMMDD, YYYY-MM-DD HH:MI:SS) 두가지가 섞여있음
-        q_max = text("""
-            SELECT MAX(
-                CASE
-                    WHEN "사용일자" ~ '^[0-9]{8}$' THEN to_date("사용일자",'YYYYMMDD')
-                    WHEN "사용일자" ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}' THEN to_date(left("사용일자",10),'YYYY-MM-DD')
-                    ELSE NULL
-                END
-            ) AS max_date
-            FROM subway_stats
-        """)
-      
+        q_max = text(f"SELECT MAX({db.use_date(engine)}) AS max_date FROM subway_stats")
+
         max_row = pd.read_sql(q_max, engine)
         max_date = max_row.loc[0, 'max_date']
-      
+
         if pd.isna(max_date):
-            return {"message": "subway_stats에서 max(사용일자) 계산 실패"}
-          
+            return None, {"message": "subway_stats에서 max(사용일자) 계산 실패"}
+
         # target_date는 max_date +1일
         target_date = (pd.to_datetime(max_date) + pd.Timedelta(days=1)).normalize()
 
@@ -67,66 +158,57 @@ def lambda_handler(event, context):
             engine
         )
         if stations.empty:
-            return {"message": "역 목록이 비어 있음"}
+            return None, {"message": "역 목록이 비어 있음"}
 
         # target_date의 weather/holiday만 로드
         weather = pd.read_sql(
-            text("SELECT 날짜, 구분, 값 FROM weather_stats WHERE 날짜::date = :td"),
+            text(f"SELECT 날짜, 구분, 값 FROM weather_stats WHERE {db.as_date(engine, '날짜')} = :td"),
             engine, params={"td": target_date.date()}
         )
         holiday = pd.read_sql(
-            text("SELECT 날짜, 공휴일여부 FROM holidays_stats WHERE 날짜::date = :td"),
+            text(f"SELECT 날짜, 공휴일여부 FROM holidays_stats WHERE {db.as_date(engine, '날짜')} = :td"),
             engine, params={"td": target_date.date()}
         )
-        if weather.empty or holiday.empty:
-            return {"status": "no_data",
-                    "message": "해당 날짜의 날씨/공휴일 데이터 없음"}
-
-        # 가공/머지
-        weather['날짜'] = safe_to_datetime(weather['날짜']).dt.normalize()
-        holiday['날짜'] = safe_to_datetime(holiday['날짜']).dt.normalize()
-      
-        # 구분의 "강수형태","강수 형태" 해당 값들 때문에 띄여쓰기 없애기
-        weather['구분'] = weather['구분'].astype(str).str.replace(" ", "", regex=False)
-
-        # 학습을 위해서 melt 풀어주기
-        weather_daily = (
-            weather.pivot_table(index='날짜', columns='구분', values='값', aggfunc='mean')
-                   .reset_index()
-        )
-        # 역명, 호선명만 있는 테이블 가져오기
-        df = stations.copy()
-      
-        df['날짜'] = target_date
-        # weather과 station 조인
-        # 조인한 테이블과 공휴일 데이터 조인
-        # 모두 '날짜' 컬럼으로
-        df = df.merge(weather_daily, on='날짜', how='left') \
-               .merge(holiday[['날짜','공휴일여부']], on='날짜', how='left')
-
-        # 공휴일여부 0/1
-        df['공휴일여부'] = df['공휴일여부'].fillna('N').map({'Y': 1, 'N': 0}).fillna(0).astype(int)
-
-        # 기상 수치 결측 0
-        for col in ['기온','강수형태','강수','습도','풍속']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-
-        # 날짜 파생
-        df['년'] = pd.to_datetime(df['날짜']).dt.year
-        df['월'] = pd.to_datetime(df['날짜']).dt.month
-        df['일'] = pd.to_datetime(df['날짜']).dt.day
+        st.rows_out = len(stations) + len(weather) + len(holiday)
+    if weather.empty or holiday.empty:
+        return None, {"status": "no_data",
+                      "message": "해당 날짜의 날씨/공휴일 데이터 없음"}
+
+    # 가공/머지
+    with instrument.step("build_frame", rows_in=len(stations)) as st:
+        df = build_input_frame(stations, weather, holiday, [target_date])
+        st.rows_out = len(df)
+
+    # 역별 지난주 같은 요일/7·28일 평균/공휴일 보정 기준선 (학습 때와 같은 상태로 계산)
+    with instrument.step("lag_features", rows_in=len(df)) as st:
+        df, lag_days = _attach_lag_features(s3, engine, df, max_date, target_date,
+                                            bool(df['공휴일여부'].max()))
+        st.rows_out = len(df)
+    return df, {"target_date": str(target_date.date()), "lag_days_applied": lag_days}
+
+# 전처리 결과 CSV + manifest 저장, 반환: 저장 키
+def save_prepared(s3, df, target_date):
+    target_date = pd.Timestamp(target_date)
+    key = f"{S3_KEY_PREFIX}/{target_date.strftime('%Y-%m-%d')}.csv"
+    with instrument.step("s3_write", rows_in=len(df)):
+        s3_io.write_csv(s3, S3_BUCKET, key, df)
+        _write_manifest(s3, target_date, key, len(df))
+    return key
+
+@instrument.handler
+def lambda_handler(event, context):
+    try:
+        s3 = storage.client()
+        s3_io.reset_stats()
+        df, info = prepare_frame(s3, _create_engine())
+        if df is None:
+            return info
 
         # S3 CSV 저장
-        key = f"{S3_KEY_PREFIX}/{target_date.strftime('%Y-%m-%d')}.csv"
-        buf = BytesIO()
-
-        df.to_csv(buf, index=False)
-        buf.seek(0)
-        s3.upload_fileobj(buf, S3_BUCKET, key,
-                          ExtraArgs={"ContentType": "text/csv; charset=utf-8"})
+        key = save_prepared(s3, df, info["target_date"])
 
-        return {"status": "prepared", "s3_key": key, "rows": int(len(df)), "target_date": str(target_date.date())}
+        return {"status": "prepared", "s3_key": key, "rows": int(len(df)), **info,
+                "transfers": s3_io.transfer_summary()}
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -0,0 +1,262 @@
+"""
+수집/파이프라인 누락 날짜 일괄 복구 (Error/ 폴더의 날짜를 직접 고쳐 하루씩 돌리던 스크립트 대체)
+
+1. 탐지 : 소스/단계마다 SQL 한 번 - 날짜 시리즈(PostgreSQL generate_series, SQLite 재귀 CTE) anti-join
+          - subway  : subway_stats 사용일자 (최신 = 오늘 - SUBWAY_DELAY_DAYS)
+          - weather : weather_stats 날짜 (최신 = 어제)
+          - holiday : holidays_stats 날짜 (최신 = 어제)
+          오늘 날짜는 21:00 수집 Lambda 몫 (낮에 복구하면 하루치가 덜 찬 날씨가 들어가고
+          수집 Lambda는 이미 있는 날짜로 보고 건너뜀)
+          - pred    : pred_data 날짜 (최신 = subway_stats 마지막 날짜 + 1일)
+                      모델 행(xgb/lgb/ens)이 하나라도 있으면 완료로 봄 → 앙상블 행 도입 이전 날짜의
+                      당시 예측을 현재 모델로 덮어쓰지 않음
+          이미 있는 날짜는 건너뜀
+2. 수집 : 빠진 (소스, 날짜)마다 time_date_collection의 fetch 함수를 스레드 풀(--workers)에서 동시에 실행
+          DB 쓰기는 메인 스레드에서 하나씩, 쓰기 직전에 다시 확인해서 그 사이 Lambda가 채운 날짜는 건너뜀
+          공휴일은 holidays 라이브러리로 만들어 네트워크 없이 복구
+          날씨 초단기실황 API는 최근 하루 정도만 제공 → WEATHER_API_DAYS일보다 오래된 날짜는 호출하지 않고
+          unrecoverable로 보고 (종관기상관측(ASOS) CSV를 받아 Error/weather_1day.py로 적재)
+3. 예측 : 수집 후 다시 찾은 pred 누락 날짜 전체를 한 프레임으로 (backtest.py와 같은 벡터화 경로)
+          전처리(역 × 날짜, 전날까지 실제값으로 lag 재생) → 모델마다 predict 한 번 → 앙상블 Lambda와 같은 병합
+          → pred_data upsert → 대시보드 집계 갱신
+          예측일 D는 날씨/공휴일(D)과 전날(D-1) 실제값이 있어야 만들어짐 (없으면 not_ready로 남김)
+
+사용 예:
+    python Lambda/recovery.py --start 2025-08-01 --dry-run
+    python Lambda/recovery.py --start 2025-08-01 --end 2025-08-31 --workers 8 --bucket subway-whitenut-bucket
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+# 예측 모듈 폴더와 공용 모듈이 있는 Lambda/ 폴더를 import 경로에 추가
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.join(_HERE, "Xgboost"), os.path.join(_HERE, "LightGBM"), _HERE):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+import Xgboost_Lightgbm as merge
+import backtest
+import db
+import feature_matrix
+import instrument
+import lag_features
+import preprocess
+import time_date_collection as collection
+from resident_predictor import PREDICTOR_MODULES, ResidentPredictor
+
+LOOKBACK_DAYS = 30                 # --start를 주지 않으면 최근 30일
+DEFAULT_WORKERS = 4                # 동시에 수집할 (소스, 날짜) 수
+WEATHER_API_DAYS = 1               # 초단기실황 API로 받을 수 있는 날짜 (오늘 - 1일부터)
+
+# 소스: (테이블, 날짜 컬럼, time_date_collection의 fetch 함수 이름)
+SOURCES = {
+    "subway": ("subway_stats", "사용일자", "fetch_subway_data"),
+    "weather": ("weather_stats", "날짜", "fetch_weather_data"),
+    "holiday": ("holidays_stats", "날짜", "fetch_holiday_data"),
+}
+
+
+def _date_sql(engine, source):
+    if source == "subway":
+        return db.use_date(engine)
+    if source == "pred":
+        return db.as_date(engine, "날짜")
+    return db.as_date(engine, SOURCES[source][1])
+
+
+def find_gaps(engine, source, start, end):
+    """[start, end] 중 source에 한 행도 없는 날짜 (날짜 시리즈 LEFT JOIN 기존 날짜, SQL 한 번)"""
+    if start > end:
+        return []
+    table = "pred_data" if source == "pred" else SOURCES[source][0]
+    day = _date_sql(engine, source)
+    rows = pd.read_sql(text(f"""
+        SELECT s.d FROM ({db.date_series(engine)}) s
+        LEFT JOIN (
+            SELECT DISTINCT {day} AS d FROM {table}
+            WHERE {day} BETWEEN :start AND :end
+        ) t ON t.d = s.d
+        WHERE t.d IS NULL
+        ORDER BY s.d
+    """), engine, params={"start": start, "end": end})
+    return [d.date() for d in pd.to_datetime(rows["d"])]
+
+
+def _max_subway_date(engine):
+    value = pd.read_sql(text(f"SELECT MAX({db.use_date(engine)}) AS d FROM subway_stats"), engine).loc[0, "d"]
+    return None if pd.isna(value) else pd.Timestamp(value).date()
+
+
+def detect(engine, start, end, today):
+    """소스/단계별 누락 날짜 {이름: [date]}"""
+    latest = {
+        "subway": today - timedelta(days=collection.SUBWAY_DELAY_DAYS),
+        "weather": today - timedelta(days=1),
+        "holiday": today - timedelta(days=1),
+    }
+    gaps = {name: find_gaps(engine, name, start, min(end, latest[name])) for name in SOURCES}
+    max_subway = _max_subway_date(engine)
+    if max_subway is None:
+        gaps["pred"] = []
+    elif not inspect(engine).has_table("pred_data"):
+        gaps["pred"] = [d.date() for d in pd.date_range(start, min(end, max_subway + timedelta(days=1)))]
+    else:
+        gaps["pred"] = find_gaps(engine, "pred", start, min(end, max_subway + timedelta(days=1)))
+    return gaps
+
+
+def split_unrecoverable(gaps, today):
+    """gaps에서 API로 받을 수 없는 날짜를 떼어냄, 반환: (수집할 gaps, {소스: [date]})"""
+    oldest = today - timedelta(days=WEATHER_API_DAYS)
+    weather = gaps.get("weather", [])
+    unrecoverable = {"weather": [d for d in weather if d < oldest]}
+    return {**gaps, "weather": [d for d in weather if d >= oldest]}, unrecoverable
+
+
+def recollect(gaps, workers=DEFAULT_WORKERS):
+    """
+    gaps: {소스: [date]} → 소스별 {"recovered": [...], "skipped": [...], "failed": {날짜: 오류}}
+    API 호출은 스레드 풀에서 동시에, DB 쓰기는 완료 순서대로 메인 스레드에서
+    """
+    result = {name: {"recovered": [], "skipped": [], "failed": {}} for name in gaps}
+    tasks = [(name, day) for name, days in gaps.items() for day in days]
+    if not tasks:
+        return result
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        futures = {pool.submit(getattr(collection, SOURCES[name][2]), day): (name, day) for name, day in tasks}
+        for fut in as_completed(futures):
+            name, day = futures[fut]
+            table, column, _ = SOURCES[name]
+            try:
+                df = fut.result()
+                if collection.is_data_exists(table, column, day):
+                    result[name]["skipped"].append(str(day))
+                    continue
+                with instrument.step(f"{name}_db_write", rows_in=len(df)):
+                    df.to_sql(table, collection.engine, if_exists="append", index=False)
+                result[name]["recovered"].append(str(day))
+                print(f"[{name}] {day} 복구 ({len(df)}행)")
+            except Exception as e:
+                result[name]["failed"][str(day)] = str(e)
+                print(f"[{name}] {day} 실패: {e}")
+    for r in result.values():
+        r["recovered"].sort()
+        r["skipped"].sort()
+    return result
+
+
+def repredict(engine, predictor, dates, event=None):
+    """
+    dates의 예측을 한 번에 다시 만들어 pred_data에 upsert
+    반환: 예측한 날짜, 입력 부족으로 못 만든 날짜(not_ready), pred_data 병합 결과, 대시보드 갱신 결과
+    """
+    event = event or {}
+    dates = sorted(dates)
+    lag = any(f in predictor.features for f in lag_features.FEATURE_NAMES)
+    warmup = lag_features.BOOTSTRAP_DAYS if lag else 0
+    with instrument.step("predict_load") as st:
+        stations, weather, holiday, actual_rows, holiday_days = backtest.load_range(
+            engine, dates[0], dates[-1], warmup)
+        st.rows_out = len(actual_rows)
+
+    # 전처리 Lambda처럼 전날 실제값이 있는 날짜만 (없으면 lag 피처가 하루 밀림)
+    actuals = lag_features.daily_actuals(actual_rows) if not actual_rows.empty else pd.DataFrame(
+        columns=["날짜", "호선", "역명"] + list(lag_features.TARGETS))
+    observed = set(pd.to_datetime(actuals["날짜"]).dt.date) if not actuals.empty else set()
+    wanted = {pd.Timestamp(d) for d in dates if d - timedelta(days=1) in observed}
+    weather = weather[preprocess.safe_to_datetime(weather["날짜"]).dt.normalize().isin(wanted)]
+    holiday = holiday[preprocess.safe_to_datetime(holiday["날짜"]).dt.normalize().isin(wanted)]
+
+    with instrument.step("predict_frame") as st:
+        df = backtest.build_frame(stations, weather, holiday, actuals, holiday_days, predictor.features)
+        st.rows_out = len(df)
+    done = sorted({d.date() for d in pd.to_datetime(df["날짜"])}) if not df.empty else []
+    out = {"dates": [str(d) for d in done], "not_ready": [str(d) for d in dates if d not in set(done)]}
+    if df.empty:
+        return out
+
+    with instrument.step("predict", rows_in=len(df)) as st:
+        prepared, X = feature_matrix.build(df, predictor.features, predictor.le_line, predictor.le_station)
+        frames = {}
+        for model, artifact in predictor.boosters.items():
+            values = PREDICTOR_MODULES[model]._predict_targets(artifact, model, X, feature_matrix.raw_predict)
+            frames[model] = backtest._long(prepared, values, model)
+        st.rows_out = sum(len(f) for f in frames.values())
+
+    df_all, df_ens, settings = merge._merge_frames(frames["xgb"], frames["lgb"], event)
+    out.update(merge._write_db(df_all, engine))
+    out["dashboard"] = merge._refresh_dashboard(engine, out["dates"], event)
+    return out
+
+
+def run(engine, start, end, today=None, workers=DEFAULT_WORKERS, sources=None, dry_run=False,
+        predictor_loader=None):
+    """탐지 → 수집 복구 → (다시 탐지) → 예측 복구, 반환: 단계별 결과 dict"""
+    today = today or datetime.today().date()
+    sources = set(sources or list(SOURCES) + ["pred"])
+    instrument.reset("recovery")
+
+    with instrument.step("detect"):
+        gaps = detect(engine, start, end, today)
+    out = {"start": str(start), "end": str(end),
+           "gaps": {name: [str(d) for d in days] for name, days in gaps.items() if name in sources}}
+    fetchable, unrecoverable = split_unrecoverable(gaps, today)
+    out["unrecoverable"] = {name: [str(d) for d in days] for name, days in unrecoverable.items()
+                            if name in sources and days}
+    if dry_run:
+        return out
+
+    collect = {name: fetchable[name] for name in SOURCES if name in sources and fetchable[name]}
+    if collect:
+        out["collected"] = recollect(collect, workers)
+        with instrument.step("detect"):
+            gaps = detect(engine, start, end, today)
+
+    if "pred" in sources and gaps["pred"]:
+        out["predicted"] = repredict(engine, predictor_loader(), gaps["pred"])
+    out["instrument"] = instrument.summary()
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="수집/예측 누락 날짜 탐지 및 일괄 복구")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--bucket", help="모델을 읽을 S3 버킷")
+    src.add_argument("--model-dir", help="model/*.joblib (또는 bundle_*.npy) 로컬 폴더")
+    parser.add_argument("--start", default=None, help=f"시작일 YYYY-MM-DD (기본: 오늘 - {LOOKBACK_DAYS}일)")
+    parser.add_argument("--end", default=None, help="종료일 YYYY-MM-DD (기본: 오늘, 소스별 최신 날짜까지만)")
+    parser.add_argument("--sources", default="subway,weather,holiday,pred",
+                        help="복구할 소스/단계 (쉼표 구분: subway, weather, holiday, pred)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="동시에 수집할 (소스, 날짜) 수")
+    parser.add_argument("--dry-run", action="store_true", help="누락 날짜만 출력")
+    args = parser.parse_args()
+
+    today = datetime.today().date()
+    start = pd.Timestamp(args.start).date() if args.start else today - timedelta(days=LOOKBACK_DAYS)
+    end = pd.Timestamp(args.end).date() if args.end else today
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    unknown = set(sources) - set(SOURCES) - {"pred"}
+    if unknown:
+        parser.error(f"알 수 없는 소스: {sorted(unknown)}")
+
+    def load_predictor():
+        return (ResidentPredictor.from_dir(args.model_dir) if args.model_dir
+                else ResidentPredictor.from_s3(bucket=args.bucket))
+
+    result = run(preprocess._create_engine(), start, end, today, args.workers, sources, args.dry_run,
+                 load_predictor)
+    print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    failed = sum(len(r["failed"]) for r in result.get("collected", {}).values())
+    return 1 if failed or result["unrecoverable"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+예측 Lambda 코드(predict_xgboost / predict_lightgbm)를 그대로 쓰는 상주형 예측기
+
+Lambda는 호출마다 모델/인코더를 S3에서 새로 받지만,
+여기서는 한 번 로드한 부스터·인코더·피처 목록을 메모리에 유지하고
+임의의 (날짜, 호선, 역명, 날씨) 행을 한 번의 batch predict로 처리
+lag 피처로 학습한 모델이면 lag 상태(features/lag_state.npz)도 함께 로드해서
+요청 행에 전처리 Lambda와 같은 lag 피처를 붙임 (상태 마지막 날짜 이전/상태에 없는 역은 NaN = 학습 때의 missing)
+"""
+import os
+import sys
+
+# 예측 모듈 폴더와 공용 모듈(s3_io 등)이 있는 Lambda/ 폴더를 import 경로에 추가
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.join(_HERE, "Xgboost"), os.path.join(_HERE, "LightGBM"), _HERE):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import Xgboost_Lightgbm as merge
+import feature_matrix
+import lag_features
+import model_bundle
+import predict_lightgbm
+import predict_xgboost
+import storage
+
+# 모델 이름 → 예측 Lambda 모듈 (pipeline_runner/backtest/recovery도 이 매핑을 import)
+PREDICTOR_MODULES = {"xgb": predict_xgboost, "lgb": predict_lightgbm}
+MODEL_KEYS = {"xgb": predict_xgboost.MODEL_XGB_KEY, "lgb": predict_lightgbm.MODEL_LGB_KEY}
+TARGETS = ("승차", "하차")
+
+
+class ResidentPredictor:
+    """
+    boosters: {"xgb": 모델 파일 dict, "lgb": ...}
+              분리형({"승차": {...}, "하차": {...}})/결합형({"joint": {...}, ...}) 모두 가능
+    features/le_line/le_station: 학습 시 저장된 피처 목록과 인코더 (두 모델 공통)
+    lag_state: lag_features.LagState (lag 피처를 쓰는 모델만, 없으면 lag 피처는 NaN)
+    """
+
+    def __init__(self, boosters, features, le_line, le_station, lag_state=None):
+        self.boosters = boosters
+        self.features = list(features)
+        self.le_line = le_line
+        self.le_station = le_station
+        self.lag_state = lag_state
+
+    # S3의 model/ 아래 joblib 파일에서 로드 (Lambda와 동일한 경로)
+    @classmethod
+    def from_s3(cls, bucket=None, model_types=("xgb", "lgb"), s3=None):
+        s3 = s3 or storage.client()
+        boosters, shared = {}, None
+        for model in model_types:
+            models, features, le_line, le_station = PREDICTOR_MODULES[model]._load_artifacts(s3, bucket)
+            boosters[model] = models
+            shared = shared or (features, le_line, le_station)
+        predictor = cls(boosters, *shared)
+        if predictor.uses_lag:
+            predictor.lag_state = lag_features.load_state_s3(s3, bucket or predict_xgboost.S3_BUCKET)
+        return predictor
+
+    # 로컬 폴더에서 로드 (S3 model/ 폴더를 그대로 내려받은 구조)
+    # 번들(bundle_{xgb|lgb}.npy)이 있으면 번들, 없으면 joblib 파일
+    # lag 상태: lag_state_path → model_dir/lag_state.npz → model_dir/../features/lag_state.npz (S3 구조)
+    @classmethod
+    def from_dir(cls, model_dir, model_types=("xgb", "lgb"), lag_state_path=None):
+        predictor = cls._load_dir(model_dir, model_types)
+        if predictor.uses_lag:
+            name = os.path.basename(lag_features.STATE_KEY)
+            candidates = [lag_state_path] if lag_state_path else [
+                os.path.join(model_dir, name), os.path.join(model_dir, os.pardir, lag_features.STATE_KEY)]
+            for path in candidates:
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        predictor.lag_state = lag_features.LagState.from_bytes(f.read())
+                    break
+        return predictor
+
+    @classmethod
+    def _load_dir(cls, model_dir, model_types):
+        bundles = {m: os.path.join(model_dir, os.path.basename(model_bundle.BUNDLE_KEYS[m])) for m in model_types}
+        if all(os.path.exists(path) for path in bundles.values()):
+            boosters, shared = {}, None
+            for model, path in bundles.items():
+                models, features, le_line, le_station = model_bundle.load(path)
+                boosters[model] = models
+                shared = shared or (features, le_line, le_station)
+            return cls(boosters, *shared)
+
+        def load(key):
+            return joblib.load(os.path.join(model_dir, os.path.basename(key)))
+
+        boosters = {}
+        for model in model_types:
+            boosters[model] = load(MODEL_KEYS[model])
+        return cls(
+            boosters,
+            load(predict_xgboost.FEATURES_KEY),
+            load(predict_xgboost.LINE_ENCODER_KEY),
+            load(predict_xgboost.STATION_ENCODER_KEY),
+        )
+
+    @property
+    def model_types(self):
+        return list(self.boosters)
+
+    @property
+    def uses_lag(self):
+        return any(f in self.features for f in lag_features.FEATURE_NAMES)
+
+    def lag_columns(self, day, stations, is_holiday=False):
+        """
+        stations(호선, 역명) 행의 day 예측용 lag 피처 {이름: float32 배열}
+        상태가 없거나 day가 상태 마지막 날짜 이전이면 NaN (그 시점의 상태를 다시 만들 수 없음)
+        """
+        day = pd.Timestamp(day).normalize()
+        state = self.lag_state
+        if state is None or (state.last_date is not None and day <= state.last_date):
+            values = np.full((len(stations), len(lag_features.FEATURE_NAMES)), np.nan, dtype=np.float32)
+        else:
+            keys = lag_features.LagState.station_keys(stations)
+            values = state.features_for(day, keys, is_holiday).to_numpy(dtype=np.float32)
+        return {name: values[:, j] for j, name in enumerate(lag_features.FEATURE_NAMES)}
+
+    def attach_lag(self, df):
+        """lag 피처를 쓰는 모델이고 입력에 lag 컬럼이 없으면 (날짜, 공휴일여부)별로 lag_columns를 붙임"""
+        if not self.uses_lag or all(f in df.columns for f in lag_features.FEATURE_NAMES):
+            return df
+        df = df.reset_index(drop=True)
+        days = pd.to_datetime(df["날짜"]).dt.normalize()
+        holiday = (pd.to_numeric(df["공휴일여부"], errors="coerce").fillna(0).to_numpy() > 0
+                   if "공휴일여부" in df.columns else np.zeros(len(df), dtype=bool))
+        out = np.full((len(df), len(lag_features.FEATURE_NAMES)), np.nan, dtype=np.float32)
+        for (day, is_holiday), idx in df.groupby([days, holiday]).indices.items():
+            cols = self.lag_columns(day, df.iloc[idx], bool(is_holiday))
+            out[idx] = np.column_stack([cols[name] for name in lag_features.FEATURE_NAMES])
+        for j, name in enumerate(lag_features.FEATURE_NAMES):
+            df[name] = out[:, j]
+        return df
+
+    # 모델 입력 행렬 X(행별 호선 lines)에 대해 {"승차_xgb": array, ..., "승차": 앙상블, "하차": 앙상블}
+    # 결합형 모델은 모델당 predict 한 번으로 두 타깃을 함께 계산
+    # 앙상블은 앙상블 Lambda와 같은 가중치(ENSEMBLE_WEIGHTS/LINE_WEIGHTS)로, pred_data처럼 모델별 정수 예측값에서 계산
+    def predict_matrix(self, X, lines):
+        by_model = {model: PREDICTOR_MODULES[model]._predict_targets(artifact, model, X, feature_matrix.raw_predict)
+                    for model, artifact in self.boosters.items()}
+        out = {}
+        for target in TARGETS:
+            preds = []
+            for model, by_target in by_model.items():
+                y = np.clip(np.asarray(by_target[target], dtype=float), 0, None)
+                out[f"{target}_{model}"] = y
+                preds.append(np.rint(y))
+            out[target] = merge._weighted_average(np.column_stack(preds), lines, self.model_types)
+        return out
+
+    def predict_frame(self, df):
+        """
+        df: 날짜, 호선, 역명 (+ 기온, 강수형태, 강수, 습도, 풍속, 공휴일여부) 행
+            lag 피처를 쓰는 모델이면 lag_state로 lag 컬럼을 붙여서 예측
+        반환: 입력과 같은 순서/길이의 DataFrame
+              미등록 호선/역명 행은 예측 컬럼이 NaN
+        """
+        n = len(df)
+        src = self.attach_lag(df.reset_index(drop=True))
+        src["_row"] = np.arange(n)
+        prepared, X = predict_xgboost._prepare_features(src, self.features, self.le_line, self.le_station)
+
+        result = pd.DataFrame({
+            "날짜": pd.to_datetime(df["날짜"]).dt.strftime("%Y-%m-%d").to_numpy(),
+            "호선": df["호선"].astype(str).str.strip().to_numpy(),
+            "역명": df["역명"].astype(str).str.strip().to_numpy(),
+        })
+        if prepared.empty:
+            for target in TARGETS:
+                for model in self.model_types:
+                    result[f"{target}_{model}"] = np.nan
+                result[target] = np.nan
+            return result
+
+        rows = prepared["_row"].to_numpy()
+        for col, values in self.predict_matrix(X, prepared["호선"].to_numpy()).items():
+            full = np.full(n, np.nan)
+            full[rows] = np.rint(values)
+            result[col] = full
+        return result
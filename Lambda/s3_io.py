@@ -0,0 +1,158 @@
+"""
+모든 Lambda가 공유하는 S3 입출력 모듈
+
+- fetch_many   : 서로 독립적인 객체(모델, 인코더, 입력 CSV 등)를 스레드 풀에서 동시에 가져오기
+- read_csv     : 응답 Body를 BytesIO로 한 번 더 복사하지 않고 바로 pandas로 스트리밍
+- load_joblib  : 멀티파트(범위 분할) 다운로드로 /tmp에 받은 뒤 로드 → 메모리에 사본 2개를 들지 않음
+- download_to_tmp: /tmp 고정 경로로 내려받기 (모델 번들을 mmap으로 열 때), 없으면 None
+- write_csv    : 일정 크기까지는 메모리, 넘으면 /tmp로 넘어가는 임시 파일에 쓰고 멀티파트 업로드
+- 모든 전송은 객체별 소요 시간/바이트를 기록 → transfer_summary()를 핸들러 응답에 포함
+
+pandas/joblib은 import 비용이 커서 사용하는 함수 안에서 import (예측 이미지 cold-start 단축)
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+
+MB = 1024 * 1024
+MAX_WORKERS = 8                    # 동시에 가져올 객체 수
+SPOOL_MAX_BYTES = 32 * MB          # write_csv: 이 크기를 넘으면 메모리 대신 /tmp 파일 사용
+TMP_DIR = os.environ.get("S3_IO_TMP_DIR", tempfile.gettempdir())
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * MB,
+    multipart_chunksize=8 * MB,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+_stats = []
+_stats_lock = threading.Lock()
+
+
+def _record(op, key, nbytes, started):
+    with _stats_lock:
+        _stats.append({
+            "op": op,
+            "key": key,
+            "bytes": int(nbytes),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+
+# Lambda 컨테이너는 재사용되므로 핸들러 시작 시 초기화
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def transfer_stats():
+    with _stats_lock:
+        return list(_stats)
+
+
+# 핸들러 응답용 요약 (객체 수, 총 바이트, 객체별 지연)
+def transfer_summary():
+    stats = transfer_stats()
+    return {
+        "objects": len(stats),
+        "bytes": sum(s["bytes"] for s in stats),
+        "ms": round(sum(s["ms"] for s in stats), 1),
+        "by_key": stats,
+    }
+
+
+def fetch_many(tasks, max_workers=MAX_WORKERS):
+    """
+    tasks: {이름: 인자 없는 함수}
+    반환: {이름: 결과}  (하나라도 실패하면 해당 예외를 그대로 발생)
+    boto3 client는 스레드 간 공유 가능
+    """
+    if not tasks:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+        futures = {name: pool.submit(fn) for name, fn in tasks.items()}
+        return {name: fut.result() for name, fut in futures.items()}
+
+
+def read_csv(s3, bucket, key, encoding="utf-8", **kwargs):
+    import pandas as pd
+
+    started = time.perf_counter()
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    df = pd.read_csv(obj["Body"], encoding=encoding, **kwargs)
+    _record("get", key, obj.get("ContentLength", 0), started)
+    return df
+
+
+def write_csv(s3, bucket, key, df):
+    started = time.perf_counter()
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, dir=TMP_DIR) as buf:
+        df.to_csv(buf, index=False, encoding="utf-8")
+        size = buf.tell()
+        buf.seek(0)
+        s3.upload_fileobj(buf, bucket, key, Config=TRANSFER_CONFIG,
+                          ExtraArgs={"ContentType": "text/csv; charset=utf-8"})
+    _record("put", key, size, started)
+    return size
+
+
+# manifest/index(JSON) 읽기 - 아직 없으면 None
+def read_json(s3, bucket, key):
+    started = time.perf_counter()
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        return None
+    body = obj["Body"].read()
+    _record("get", key, len(body), started)
+    return json.loads(body.decode("utf-8"))
+
+
+# 한 번의 PUT으로 통째로 덮어쓰므로 읽는 쪽은 항상 완성된 내용만 봄
+def write_json(s3, bucket, key, payload):
+    started = time.perf_counter()
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+    _record("put", key, len(body), started)
+
+
+# 모델/인코더 joblib 로드
+# 큰 모델은 TRANSFER_CONFIG에 따라 범위 분할 병렬 다운로드
+# (joblib 역직렬화 시점에 부스팅 라이브러리도 함께 import 됨)
+def load_joblib(s3, bucket, key):
+    import joblib
+
+    started = time.perf_counter()
+    fd, path = tempfile.mkstemp(suffix=".joblib", dir=TMP_DIR)
+    os.close(fd)
+    try:
+        s3.download_file(bucket, key, path, Config=TRANSFER_CONFIG)
+        size = os.path.getsize(path)
+        obj = joblib.load(path)
+    finally:
+        os.remove(path)
+    _record("get", key, size, started)
+    return obj
+
+
+# /tmp의 고정 경로로 내려받기 (모델 번들처럼 파일째 mmap으로 여는 객체)
+# 객체가 없으면 None
+def download_to_tmp(s3, bucket, key):
+    from botocore.exceptions import ClientError
+
+    started = time.perf_counter()
+    path = os.path.join(TMP_DIR, key.replace("/", "__"))
+    try:
+        s3.download_file(bucket, key, path, Config=TRANSFER_CONFIG)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+            return None
+        raise
+    _record("get", key, os.path.getsize(path), started)
+    return path
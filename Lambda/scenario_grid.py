@@ -0,0 +1,174 @@
+"""
+what-if 날씨 시나리오 일괄 예측
+
+한 예측일에 대해 (기온, 강수, 강수형태, 습도, 풍속) 시나리오 K개 × 역 S개 전체를
+행 단위 루프 없이 broadcasting으로 입력 행렬을 만들어 batch predict
+- 날짜 파생/요일 one-hot: 예측 Lambda의 _onehot_weekday (1행만 계산 후 상수 열로 사용)
+- 호선/역명 인코딩: 예측 Lambda의 _safe_label_encode (S행만 계산 후 np.repeat)
+- lag 피처(lag 피처로 학습한 모델만): 상주 lag 상태로 역마다 한 번 계산 후 np.repeat (시나리오와 무관)
+- 열 순서: 학습 시 저장된 features 목록
+행렬 버퍼는 max_rows 행 크기로 한 번만 할당해 시나리오 구간마다 재사용 → 메모리 상한 고정
+
+사용 예:
+    python Lambda/scenario_grid.py --model-dir ./model --stations prepared_data/2025-08-22.csv \\
+        --date 2025-08-22 --temp 15,20,25,30 --rain 0,5,10,30 --rain-type 0,1 --humidity 50,90 --wind 1,4 \\
+        --out scenario_2025-08-22.csv
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from resident_predictor import TARGETS, ResidentPredictor, predict_xgboost
+
+# 시나리오 컬럼 (전처리 결과 CSV와 같은 이름)
+SCENARIO_COLS = ["기온", "강수", "강수형태", "습도", "풍속"]
+DEFAULT_MAX_ROWS = 262_144
+
+
+def make_scenario_grid(기온=(0,), 강수=(0,), 강수형태=(0,), 습도=(0,), 풍속=(0,)):
+    """각 값 목록의 데카르트 곱 → 시나리오 DataFrame (scenario_id 0..K-1)"""
+    axes = [np.asarray(v, dtype=np.float32) for v in (기온, 강수, 강수형태, 습도, 풍속)]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    grid = pd.DataFrame({c: m.ravel() for c, m in zip(SCENARIO_COLS, mesh)})
+    grid.index.name = "scenario_id"
+    return grid
+
+
+# 날짜 관련 열(년/월/일/요일_*)은 모든 행에서 같으므로 1행으로 한 번만 계산
+def _date_constants(target_date, holiday):
+    one = predict_xgboost._onehot_weekday(pd.DataFrame({"날짜": [target_date]}))
+    consts = {c: float(one[c].iloc[0]) for c in one.columns if c not in ("날짜", "요일문자")}
+    consts["공휴일여부"] = float(holiday)
+    return consts
+
+
+def _encode_stations(predictor, stations):
+    stations = stations[["호선", "역명"]].astype(str).apply(lambda s: s.str.strip()).drop_duplicates()
+    stations = stations.reset_index(drop=True)
+    line_enc, mask_line = predict_xgboost._safe_label_encode(predictor.le_line, stations["호선"], "호선")
+    station_enc, mask_station = predict_xgboost._safe_label_encode(predictor.le_station, stations["역명"], "역명")
+    mask = mask_line & mask_station
+    kept = stations[mask].reset_index(drop=True)
+    enc = {
+        "호선_enc": line_enc[mask[mask_line].to_numpy()].astype(np.float32),
+        "역명_enc": station_enc[mask[mask_station].to_numpy()].astype(np.float32),
+    }
+    return kept, enc
+
+
+def predict_scenario_grid(predictor, target_date, scenarios, stations, holiday=0,
+                          max_rows=DEFAULT_MAX_ROWS):
+    """
+    predictor: ResidentPredictor
+    scenarios: SCENARIO_COLS를 가진 DataFrame (make_scenario_grid 결과 등)
+    stations : 호선, 역명 DataFrame (보통 해당 날짜의 prepared_data CSV)
+    반환: (result, stats)
+          result - 역 × 시나리오 행, 모델별/앙상블 승차·하차 예측값 (float32)
+          stats  - 행 수, 구간 수, 버퍼 크기, 소요 시간
+    """
+    t0 = time.perf_counter()
+    target_date = pd.Timestamp(target_date).normalize()
+    kept, station_cols = _encode_stations(predictor, stations)
+    if predictor.uses_lag:
+        station_cols.update(predictor.lag_columns(target_date, kept, bool(holiday)))
+    scen = scenarios.reset_index(drop=True)
+    for col in SCENARIO_COLS:
+        if col not in scen.columns:
+            scen[col] = 0
+    scen_vals = {c: scen[c].to_numpy(dtype=np.float32) for c in SCENARIO_COLS}
+    consts = _date_constants(target_date, holiday)
+
+    n_station, n_scen = len(kept), len(scen)
+    if n_station == 0 or n_scen == 0:
+        raise ValueError("예측할 역 또는 시나리오가 없음")
+
+    # 시나리오 구간 크기: 버퍼 행 수(n_station × chunk)가 max_rows를 넘지 않게
+    chunk = max(1, min(n_scen, max_rows // n_station))
+    n_feat = len(predictor.features)
+    buf = np.empty((n_station * chunk, n_feat), dtype=np.float32)
+
+    # 결과: [역, 시나리오] 2차원 배열
+    out_cols = [f"{t}_{m}" for t in TARGETS for m in predictor.model_types] + list(TARGETS)
+    out = {c: np.empty((n_station, n_scen), dtype=np.float32) for c in out_cols}
+
+    n_chunks = 0
+    for start in range(0, n_scen, chunk):
+        stop = min(start + chunk, n_scen)
+        k = stop - start
+        X = buf[: n_station * k]
+        # 행 순서: 역 i의 시나리오 start..stop-1 이 연속 (행 = i * k + j)
+        for j, feat in enumerate(predictor.features):
+            if feat in station_cols:
+                X[:, j] = np.repeat(station_cols[feat], k)
+            elif feat in scen_vals:
+                X[:, j] = np.tile(scen_vals[feat][start:stop], n_station)
+            else:
+                X[:, j] = consts.get(feat, np.nan)   # 알 수 없는 피처는 학습 때처럼 missing
+        lines = np.repeat(kept["호선"].to_numpy(), k)
+        for col, values in predictor.predict_matrix(X, lines).items():
+            out[col][:, start:stop] = values.reshape(n_station, k)
+        n_chunks += 1
+
+    # 역 × 시나리오 long 형식으로 펼치기 (역이 바깥 순서)
+    result = pd.DataFrame({
+        "날짜": target_date.strftime("%Y-%m-%d"),
+        "호선": np.repeat(kept["호선"].to_numpy(), n_scen),
+        "역명": np.repeat(kept["역명"].to_numpy(), n_scen),
+        "scenario_id": np.tile(np.arange(n_scen), n_station),
+    })
+    for c in SCENARIO_COLS:
+        result[c] = np.tile(scen_vals[c], n_station)
+    for col in out_cols:
+        result[col] = out[col].ravel()
+
+    stats = {
+        "stations": n_station,
+        "scenarios": n_scen,
+        "rows": n_station * n_scen,
+        "chunks": n_chunks,
+        "buffer_mb": round(buf.nbytes / 1024 / 1024, 1),
+        "elapsed_sec": round(time.perf_counter() - t0, 3),
+    }
+    return result, stats
+
+
+def _floats(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="날씨 시나리오 × 전체 역 일괄 예측")
+    src = parser.add_mutually_exclusive_group()
+    src.add_argument("--bucket", help="모델을 읽을 S3 버킷")
+    src.add_argument("--model-dir", help="model/*.joblib (또는 bundle_*.npy) 로컬 폴더")
+    parser.add_argument("--stations", required=True, help="호선,역명 컬럼이 있는 CSV (예: prepared_data CSV)")
+    parser.add_argument("--date", required=True, help="예측일 YYYY-MM-DD")
+    parser.add_argument("--holiday", type=int, default=0, help="공휴일여부 0/1")
+    parser.add_argument("--temp", type=_floats, default=[0.0], help="기온 목록 (쉼표 구분)")
+    parser.add_argument("--rain", type=_floats, default=[0.0], help="강수 목록")
+    parser.add_argument("--rain-type", type=_floats, default=[0.0], help="강수형태 목록")
+    parser.add_argument("--humidity", type=_floats, default=[0.0], help="습도 목록")
+    parser.add_argument("--wind", type=_floats, default=[0.0], help="풍속 목록")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS, help="한 번에 predict할 최대 행 수")
+    parser.add_argument("--out", help="결과 CSV 경로 (생략 시 요약만 출력)")
+    args = parser.parse_args()
+
+    predictor = (ResidentPredictor.from_dir(args.model_dir) if args.model_dir
+                 else ResidentPredictor.from_s3(bucket=args.bucket))
+    scenarios = make_scenario_grid(args.temp, args.rain, args.rain_type, args.humidity, args.wind)
+    stations = pd.read_csv(args.stations, encoding="utf-8")
+
+    result, stats = predict_scenario_grid(predictor, args.date, scenarios, stations,
+                                          holiday=args.holiday, max_rows=args.max_rows)
+    print(stats)
+    if args.out:
+        result.to_csv(args.out, index=False, encoding="utf-8")
+    else:
+        summary = result.groupby("scenario_id")[list(TARGETS)].sum()
+        print(scenarios.join(summary).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+S3 저장소 공용 모듈 (S3 / 로컬 폴더 / 메모리)
+
+모든 Lambda와 train.py는 boto3.client("s3") 대신 storage.client()로 클라이언트를 만듦
+STORAGE_URL 환경 변수로 저장소 선택
+- 없음 또는 "s3"            : boto3 S3 client (배포 환경)
+- "file:///경로" 또는 경로   : 로컬 폴더, 객체 = 경로/버킷/키 (네트워크 없이 실행, 결과를 파일로 확인)
+- "memory://"               : 프로세스 메모리 (pipeline_runner처럼 한 프로세스에서 전 단계를 돌릴 때, 프로세스 안에서 공유)
+
+로컬/메모리 저장소는 이 프로젝트가 쓰는 S3 client 메서드만 같은 형태로 구현
+(get_object, put_object, upload_fileobj, download_file, get_paginator("list_objects_v2"), exceptions.NoSuchKey)
+→ s3_io 등 호출하는 쪽 코드는 그대로, 없는 키는 S3와 같은 ClientError(NoSuchKey)
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import boto3
+from botocore.exceptions import ClientError
+
+STORAGE_URL_ENV = "STORAGE_URL"
+PAGE_SIZE = 1000                   # list_objects_v2 한 페이지 최대 키 수 (S3와 같음)
+
+
+# 같은 폴더의 임시 파일에 다 쓴 뒤 os.replace → 기존 파일을 mmap으로 열고 있는 쪽은 이전 내용을 그대로 봄
+def _atomic_write(path, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class NoSuchKey(ClientError):
+    def __init__(self, bucket, key, operation="GetObject"):
+        super().__init__({"Error": {"Code": "NoSuchKey", "Message": f"키 없음: {bucket}/{key}",
+                                    "Key": key}}, operation)
+
+
+class _ObjectStore:
+    """S3 client 메서드 → _read/_write/_list 세 가지로 구현 (하위 클래스가 저장 방식 결정)"""
+
+    exceptions = SimpleNamespace(NoSuchKey=NoSuchKey)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        body = self._read(Bucket, Key)
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif hasattr(Body, "read"):
+            Body = Body.read()
+        self._write(Bucket, Key, bytes(Body))
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._write(Bucket, Key, Fileobj.read())
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        body = self._read(Bucket, Key, "HeadObject")
+        _atomic_write(Filename, lambda f: f.write(body))
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(f"지원하지 않는 paginator: {operation_name}")
+        return SimpleNamespace(paginate=self._paginate)
+
+    # S3처럼 키 사전순, 페이지마다 최대 PAGE_SIZE개, 결과가 없으면 Contents 없음
+    def _paginate(self, Bucket, Prefix="", **kwargs):
+        objects = sorted(self._list(Bucket, Prefix), key=lambda o: o["Key"])
+        if not objects:
+            yield {"KeyCount": 0}
+            return
+        for i in range(0, len(objects), PAGE_SIZE):
+            page = objects[i:i + PAGE_SIZE]
+            yield {"Contents": page, "KeyCount": len(page)}
+
+
+class LocalStorage(_ObjectStore):
+    """root/버킷/키 파일 (쓰기는 임시 파일 → rename이라 읽는 쪽은 완성된 파일만 봄)"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def _path(self, bucket, key):
+        base = os.path.normpath(os.path.join(self.root, bucket))
+        path = os.path.normpath(os.path.join(base, key))
+        if not path.startswith(base + os.sep):
+            raise ValueError(f"잘못된 키: {key}")
+        return path
+
+    def _read(self, bucket, key, operation="GetObject"):
+        try:
+            with open(self._path(bucket, key), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            raise NoSuchKey(bucket, key, operation) from None
+
+    def _write(self, bucket, key, body):
+        self._replace(bucket, key, lambda f: f.write(body))
+
+    def _replace(self, bucket, key, write):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, write)
+
+    def _list(self, bucket, prefix):
+        base = os.path.normpath(os.path.join(self.root, bucket))
+        objects = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, base).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    stat = os.stat(path)
+                    objects.append({"Key": key, "Size": stat.st_size,
+                                    "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc)})
+        return objects
+
+    # 큰 파일(모델, 스풀된 CSV)은 메모리에 통째로 올리지 않고 파일끼리 복사
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        self._replace(Bucket, Key, lambda f: shutil.copyfileobj(Fileobj, f))
+
+    # /tmp의 번들 경로는 고정이라 직접 덮어쓰면 이전 번들의 mmap이 바뀐 내용을 읽음 → 임시 파일 → rename
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        try:
+            with open(self._path(Bucket, Key), "rb") as src:
+                _atomic_write(Filename, lambda f: shutil.copyfileobj(src, f))
+        except (FileNotFoundError, IsADirectoryError):
+            raise NoSuchKey(Bucket, Key, "HeadObject") from None
+
+
+class MemoryStorage(_ObjectStore):
+    """{(버킷, 키): (바이트, 수정 시각)} - 스레드 간 공유 가능"""
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def _read(self, bucket, key, operation="GetObject"):
+        with self._lock:
+            item = self._objects.get((bucket, key))
+        if item is None:
+            raise NoSuchKey(bucket, key, operation)
+        return item[0]
+
+    def _write(self, bucket, key, body):
+        with self._lock:
+            self._objects[(bucket, key)] = (body, datetime.now(timezone.utc))
+
+    def _list(self, bucket, prefix):
+        with self._lock:
+            items = list(self._objects.items())
+        return [{"Key": k, "Size": len(body), "LastModified": modified}
+                for (b, k), (body, modified) in items if b == bucket and k.startswith(prefix)]
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+_memory = MemoryStorage()
+
+
+def client(url=None):
+    """url(없으면 STORAGE_URL 환경 변수)에 맞는 S3 client 또는 같은 메서드를 가진 저장소"""
+    url = url if url is not None else os.environ.get(STORAGE_URL_ENV, "")
+    if url in ("", "s3"):
+        return boto3.client("s3")
+    if url == "memory://":
+        return _memory
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+    return LocalStorage(url)
@@ -1,10 +1,12 @@
 import requests
 import pandas as pd
-from sqlalchemy import create_engine
 from datetime import datetime, timedelta
 from sqlalchemy import text  
 import holidays
 
+import db
+import instrument
+
 # 환경 변수 또는 직접 키
 SUBWAY_KEY = "지하철 API 키"  # 지하철 API 키
 WEATHER_KEY = "날씨 API 키"  # 날씨 API 키
@@ -17,19 +19,22 @@ DB_PORT = "5432"
 DB_NAME = "subway"
 TABLE_NAME = "pred_data"
 
-engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+SUBWAY_DELAY_DAYS = 4  # 지하철 승하차 데이터는 4일 늦게 제공 (오늘 수집 = 오늘 - 4일)
+
+# DATABASE_URL 환경 변수가 있으면 그 DB (로컬 PostgreSQL/SQLite, db.py)
+engine = db.create_engine(db.postgres_url(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME))
 
 
 def is_data_exists(table_name, date_column, target_date):
-    # date_column::date 형변환 처리
-    query = text(f"SELECT 1 FROM {table_name} WHERE {date_column}::date = :target_date LIMIT 1")
+    # date_column → date 형변환 처리 (DB 방언별 SQL은 db.as_date)
+    query = text(f"SELECT 1 FROM {table_name} WHERE {db.as_date(engine, date_column)} = :target_date LIMIT 1")
     with engine.connect() as conn:
         result = conn.execute(query, {"target_date": target_date})
         return result.fetchone() is not None
       
-# 지하철 승하차 데이터
-def fetch_subway_data():
-    target_date = datetime.today() - timedelta(days=4)
+# 지하철 승하차 데이터 (target_date를 주지 않으면 오늘 - SUBWAY_DELAY_DAYS, 복구 스크립트는 날짜 지정)
+def fetch_subway_data(target_date=None):
+    target_date = target_date or (datetime.today() - timedelta(days=SUBWAY_DELAY_DAYS))
     target_date_str = target_date.strftime("%Y%m%d")
 
     url = f"http://openapi.seoul.go.kr:8088/{SUBWAY_KEY}/json/CardSubwayStatsNew/1/999/{target_date_str}"
@@ -63,9 +68,10 @@ def fetch_subway_data():
     else:
         raise ValueError(f"{target_date_str} 지하철 데이터가 없습니다")
 
-# 날씨 데이터
-def fetch_weather_data():
-    base_date = datetime.today().strftime('%Y%m%d')
+# 날씨 데이터 (target_date를 주지 않으면 오늘)
+# 초단기실황 API는 최근 하루 정도만 제공 → 복구 스크립트(recovery.py)는 오래된 날짜를 호출하지 않음
+def fetch_weather_data(target_date=None):
+    base_date = (target_date or datetime.today()).strftime('%Y%m%d')
     base_times = [f"{h:02}00" for h in range(24)]
     nx, ny = "60", "127"
     url = "http://apis.data.go.kr/1360000/VilageFcstInfoService_2.0/getUltraSrtNcst"
@@ -130,8 +136,8 @@ def fetch_weather_data():
     return melt_df
 
 # 공휴일 데이터터
-def fetch_holiday_data():
-    today = datetime.today().date()
+def fetch_holiday_data(target_date=None):
+    today = target_date or datetime.today().date()
     weekday = today.strftime('%a')
     weekday_kor = {
         'Mon': '월', 'Tue': '화', 'Wed': '수',
@@ -153,29 +159,39 @@ def fetch_holiday_data():
 
 # 중복 방지 추가
 # 같은 날짜는 DB에 적재되지 않게 설정정
-def lambda_handler(event, context): 
+@instrument.handler
+def lambda_handler(event, context):
     try:
         # 지하철 (사용일자 = 오늘 - 4)
-        subway_date = (datetime.today() - timedelta(days=4)).date()
+        subway_date = (datetime.today() - timedelta(days=SUBWAY_DELAY_DAYS)).date()
         if not is_data_exists("subway_stats", "사용일자", subway_date):
-            subway_df = fetch_subway_data()
-            subway_df.to_sql("subway_stats", engine, if_exists="append", index=False)
+            with instrument.step("subway_fetch") as st:
+                subway_df = fetch_subway_data()
+                st.rows_out = len(subway_df)
+            with instrument.step("subway_db_write", rows_in=len(subway_df)):
+                subway_df.to_sql("subway_stats", engine, if_exists="append", index=False)
         else:
             print(f"지하철 {subway_date} 데이터는 이미 존재합니다.")
 
         # 날씨 (날짜 = 오늘)
         weather_date = datetime.today().date()
         if not is_data_exists("weather_stats", "날짜", weather_date):
-            weather_df = fetch_weather_data()
-            weather_df.to_sql("weather_stats", engine, if_exists="append", index=False)
+            with instrument.step("weather_fetch") as st:
+                weather_df = fetch_weather_data()
+                st.rows_out = len(weather_df)
+            with instrument.step("weather_db_write", rows_in=len(weather_df)):
+                weather_df.to_sql("weather_stats", engine, if_exists="append", index=False)
         else:
             print(f"날씨 {weather_date} 데이터는 이미 존재합니다.")
 
         # 공휴일 (날짜 = 오늘)
         holiday_date = datetime.today().date()
         if not is_data_exists("holidays_stats", "날짜", holiday_date):
-            holiday_df = fetch_holiday_data()
-            holiday_df.to_sql("holidays_stats", engine, if_exists="append", index=False)
+            with instrument.step("holiday_fetch") as st:
+                holiday_df = fetch_holiday_data()
+                st.rows_out = len(holiday_df)
+            with instrument.step("holiday_db_write", rows_in=len(holiday_df)):
+                holiday_df.to_sql("holidays_stats", engine, if_exists="append", index=False)
         else:
             print(f"공휴일 {holiday_date} 데이터는 이미 존재합니다.")
 
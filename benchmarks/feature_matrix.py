@@ -0,0 +1,118 @@
+"""
+예측 입력 행렬 생성 비교: DataFrame 열 추가 + astype(float) (이전 방식) vs feature_matrix.build
+
+하루치 입력(역 수 × --repeat-days 행)으로 아래 항목을 기록해서 benchmarks/results/feature_matrix.jsonl 에 누적
+- build_ms      : 입력 DataFrame → X (중앙값)
+- peak_alloc_mb : tracemalloc 기준 생성 중 최대 추가 할당
+- x_mb / dtype  : 결과 행렬 크기와 타입
+- predict_ms    : 만든 X로 모델 predict (DataFrame float64 vs ndarray float32)
+
+사용 예:
+    python benchmarks/feature_matrix.py model_dir --input prepared_data/2025-08-22.csv
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Lambda"))
+
+import numpy as np
+import pandas as pd
+
+import feature_matrix
+from resident_predictor import PREDICTOR_MODULES, ResidentPredictor, predict_xgboost
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "feature_matrix.jsonl")
+
+
+# feature_matrix 도입 전 _prepare_features와 같은 처리 (비교 기준)
+def _legacy_prepare(df, features, le_line, le_station):
+    df = predict_xgboost._onehot_weekday(df)
+    df['호선'] = df['호선'].astype(str).str.strip()
+    df['역명'] = df['역명'].astype(str).str.strip()
+    line_enc, mask_line = predict_xgboost._safe_label_encode(le_line, df['호선'], "호선")
+    station_enc, mask_station = predict_xgboost._safe_label_encode(le_station, df['역명'], "역명")
+    mask = mask_line & mask_station
+    df = df[mask].reset_index(drop=True)
+    df['호선_enc'] = line_enc[mask[mask_line].to_numpy()]
+    df['역명_enc'] = station_enc[mask[mask_station].to_numpy()]
+    for col in feature_matrix.ZERO_FILL_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0) if col in df.columns else 0
+    for col in features:
+        if col not in df.columns:
+            df[col] = np.nan   # 없는 피처(lag 등)는 feature_matrix와 같이 missing (값 비교용)
+    return df, df[features].astype(float)
+
+
+def _input_frame(args, predictor):
+    if args.input:
+        df = pd.read_csv(args.input)
+    else:
+        df = pd.DataFrame({"호선": predictor.le_line.classes_[0], "역명": predictor.le_station.classes_})
+        df["날짜"], df["기온"], df["강수"], df["공휴일여부"] = "2025-08-22", 25.0, 0.0, 0
+    return pd.concat([df] * args.repeat_days, ignore_index=True)
+
+
+def _measure(build, df, predictor, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        build(df.copy())
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    _, X = build(df.copy())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    for model, artifact in predictor.boosters.items():
+        PREDICTOR_MODULES[model]._predict_targets(artifact, model, X, feature_matrix.raw_predict)
+    return X, {
+        "build_ms": round(float(np.median(times)), 2),
+        "peak_alloc_mb": round(peak / 1024 / 1024, 2),
+        "x_mb": round(X.values.nbytes / 1024 / 1024 if hasattr(X, "values") else X.nbytes / 1024 / 1024, 2),
+        "dtype": str(X.dtypes.iloc[0] if hasattr(X, "dtypes") else X.dtype),
+        "predict_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="예측 입력 행렬 생성 비교")
+    parser.add_argument("model_dir", help="S3 model/ 폴더를 내려받은 로컬 폴더")
+    parser.add_argument("--input", default=None, help="prepared_data CSV (없으면 인코더의 역 목록으로 생성)")
+    parser.add_argument("--repeat-days", type=int, default=1, help="입력을 몇 배로 늘릴지 (행 수 확인용)")
+    parser.add_argument("--repeat", type=int, default=10, help="측정 반복 횟수")
+    parser.add_argument("--no-save", action="store_true", help="결과를 feature_matrix.jsonl에 기록하지 않음")
+    args = parser.parse_args()
+
+    predictor = ResidentPredictor.from_dir(args.model_dir)
+    df = _input_frame(args, predictor)
+    fs, le_line, le_station = predictor.features, predictor.le_line, predictor.le_station
+
+    X_old, legacy = _measure(lambda d: _legacy_prepare(d, fs, le_line, le_station), df, predictor, args.repeat)
+    X_new, matrix = _measure(lambda d: feature_matrix.build(d, fs, le_line, le_station), df, predictor, args.repeat)
+    rec = {
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "rows": int(len(df)),
+        "features": len(fs),
+        "same_values": bool(np.allclose(X_old.to_numpy(dtype=np.float32), X_new, equal_nan=True)),
+        "legacy": legacy,
+        "feature_matrix": matrix,
+    }
+    print(f"{rec['rows']}행 × {rec['features']}열 (값 일치: {rec['same_values']})")
+    for key in ("build_ms", "peak_alloc_mb", "x_mb", "predict_ms"):
+        print(f"{key:14s} {legacy[key]:>10} → {matrix[key]:>10}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
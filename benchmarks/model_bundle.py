@@ -0,0 +1,121 @@
+"""
+모델 로드 시간 비교: joblib 4개(현재) vs 모델 번들 1개(model_bundle.py)
+
+예측 Lambda 하나(xgb 또는 lgb)가 S3에서 내려받은 뒤 예측 가능한 상태가 되기까지를 측정
+(다운로드 시간은 제외, /tmp에 이미 있는 파일 기준)
+- files          : 읽는 파일 수 (= S3 GET 수)
+- mb             : 파일 크기 합계
+- load_ms        : 파일 → (models, features, le_line, le_station) 까지 (중앙값)
+- booster_ms     : 번들만, load_ms 중 부스터 역직렬화 시간 (XGBoost load_model 복사/트리 구성, LightGBM 문자열 파싱)
+                   번들은 GET/압축 해제/unpickle을 없애지만 이 부분은 joblib과 마찬가지로 모델 크기에 비례
+- first_predict_ms: 로드 직후 하루치 행 predict 한 번 (지연 초기화 비용 확인용)
+결과는 benchmarks/results/model_bundle.jsonl 에 누적
+
+사용 예:
+    aws s3 sync s3://<버킷>/model model_dir
+    python benchmarks/model_bundle.py model_dir
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "Lambda"))
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import feature_matrix
+import model_bundle
+from resident_predictor import PREDICTOR_MODULES
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "model_bundle.jsonl")
+JOBLIB_FILES = ("model_{name}_only.joblib", "features.joblib", "line_encoder.joblib", "station_encoder.joblib")
+
+
+def _load_joblib(model_dir, name):
+    files = [os.path.join(model_dir, f.format(name=name)) for f in JOBLIB_FILES]
+    return tuple(joblib.load(f) for f in files), files
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return round(float(np.median(times)), 2), result
+
+
+# 학습 때 저장된 인코더로 역 전체 × 하루 입력 (예측 Lambda와 같은 _prepare_features 경로)
+def _day_matrix(features, le_line, le_station):
+    n = min(len(le_line.classes_), len(le_station.classes_))
+    df = pd.DataFrame({"날짜": "2025-01-06", "호선": np.resize(le_line.classes_, n), "역명": le_station.classes_[:n]})
+    _, X = PREDICTOR_MODULES["xgb"]._prepare_features(df, features, le_line, le_station)
+    return X
+
+
+# 번들의 부스터 구간만 역직렬화 (mmap/헤더/인코더 비용 제외)
+def _booster_loads(bundle_path):
+    raw = np.load(bundle_path, mmap_mode="r", allow_pickle=False)
+    header = model_bundle.read_header(raw)
+    return [model_bundle._load_booster(model_bundle._segment(raw, header, seg), header["model"])
+            for seg in header["segments"] if seg.startswith("booster/")]
+
+
+def measure(model_dir, bundle_dir, name, repeat):
+    rec = {"measured_at": datetime.now().isoformat(timespec="seconds"), "model": name}
+    bundle_path = os.path.join(bundle_dir, os.path.basename(model_bundle.BUNDLE_KEYS[name]))
+    _load_joblib(model_dir, name)      # 첫 호출(라이브러리 import) 제외
+    model_bundle.load(bundle_path)
+
+    for label, fn, files in (
+        ("joblib", lambda: _load_joblib(model_dir, name)[0], _load_joblib(model_dir, name)[1]),
+        ("bundle", lambda: model_bundle.load(bundle_path), [bundle_path]),
+    ):
+        ms, (models, features, le_line, le_station) = _median_ms(fn, repeat)
+        X = _day_matrix(features, le_line, le_station)
+        t0 = time.perf_counter()
+        PREDICTOR_MODULES[name]._predict_targets(models, name, X, feature_matrix.raw_predict)
+        rec[label] = {
+            "files": len(files),
+            "mb": round(sum(os.path.getsize(f) for f in files) / 1024 / 1024, 2),
+            "load_ms": ms,
+            "first_predict_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+    rec["bundle"]["booster_ms"], _ = _median_ms(lambda: _booster_loads(bundle_path), repeat)
+    return rec
+
+
+def main():
+    parser = argparse.ArgumentParser(description="joblib vs 모델 번들 로드 시간 비교")
+    parser.add_argument("model_dir", help="S3 model/ 폴더를 내려받은 로컬 폴더 (joblib 파일)")
+    parser.add_argument("--repeat", type=int, default=10, help="로드 반복 횟수")
+    parser.add_argument("--no-save", action="store_true", help="결과를 model_bundle.jsonl에 기록하지 않음")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as bundle_dir:
+        model_bundle.from_joblib_dir(args.model_dir, bundle_dir)
+        records = [measure(args.model_dir, bundle_dir, name, args.repeat) for name in ("xgb", "lgb")]
+
+    print("\n=== joblib vs 번들 ===")
+    for rec in records:
+        j, b = rec["joblib"], rec["bundle"]
+        print(f"{rec['model']}: 파일 {j['files']}개 {j['mb']:.2f}MB → {b['files']}개 {b['mb']:.2f}MB, "
+              f"로드 {j['load_ms']:.1f}ms → {b['load_ms']:.1f}ms (부스터 역직렬화 {b['booster_ms']:.1f}ms), "
+              f"첫 predict {j['first_predict_ms']:.1f}ms → {b['first_predict_ms']:.1f}ms")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+분리형(승차/하차 모델 따로) vs 결합형(한 모델로 승차·하차 동시 예측) 비교
+
+레이아웃마다 아래 항목을 기록해서 benchmarks/results/multi_output.jsonl 에 누적
+- rmse            : 조합별 검증 RMSE (train.py와 같은 shuffle=False 80/20 분할)
+- train_sec       : 전체 학습 wall time (workers=1, 모든 코어 사용)
+- artifact_mb     : model_xgb_only / model_lgb_only joblib 크기 (compress=3)
+- predict_ms      : 예측 Lambda와 같은 경로(_predict_targets)로 하루치 행을 예측한 시간 (중앙값)
+
+사용 예:
+    python train.py --cache-dir .dataset_cache --no-upload    # 캐시 한 번 생성
+    python benchmarks/multi_output.py --cache-dir .dataset_cache
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (ROOT, os.path.join(ROOT, "Lambda")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import joblib
+import numpy as np
+
+import dataset_cache
+import train
+from resident_predictor import PREDICTOR_MODULES
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "multi_output.jsonl")
+
+
+def _artifact_mb(payload):
+    buf = BytesIO()
+    joblib.dump(payload, buf, compress=3, protocol=4)
+    return round(buf.tell() / 1024 / 1024, 2)
+
+
+# 예측 Lambda 입력과 같은 형태(DataFrame, float)의 하루치 행렬로 predict 시간 측정
+def _predict_ms(models, name, X_day, repeat):
+    module = PREDICTOR_MODULES[name]
+    module._predict_targets(models, name, X_day)   # 첫 호출(워밍업) 제외
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        module._predict_targets(models, name, X_day)
+        times.append((time.perf_counter() - t0) * 1000)
+    return round(float(np.median(times)), 2)
+
+
+def measure(df, features, layout, repeat):
+    report = {}
+    models = train.train_models(df, features, workers=1, report=report, layout=layout)
+    last_day = df['날짜'].max()
+    X_day = df.loc[df['날짜'] == last_day, features].astype(float).reset_index(drop=True)
+    rec = {
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "layout": layout,
+        "rows": int(len(df)),
+        "day_rows": int(len(X_day)),
+        "train_sec": report["wall_sec"],
+        "fit_sec": report["fit_sec"],
+        "rmse": report["rmse"],
+        "artifact_mb": {},
+        "predict_ms": {},
+    }
+    for name in ("xgb", "lgb"):
+        rec["artifact_mb"][name] = _artifact_mb(train.model_file_payload(models, name))
+        rec["predict_ms"][name] = _predict_ms(train.model_file_payload(models, name), name, X_day, repeat)
+    return rec
+
+
+def _load_frame(args):
+    if args.from_db:
+        df, _, _ = train.build_training_frame(train._create_engine(), cache_dir=None)
+        return df, train.features
+    key = args.cache_key or dataset_cache.latest_key(args.cache_dir)
+    cached = dataset_cache.load_frame(args.cache_dir, key) if key else None
+    if not cached:
+        raise SystemExit(f"{args.cache_dir}에 데이터셋 캐시 없음 - train.py --cache-dir 로 먼저 생성하거나 --from-db 사용")
+    return cached[0], dataset_cache.load_meta(args.cache_dir, key)["features"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="분리형 vs 결합형(multi-output) 모델 비교")
+    parser.add_argument("--cache-dir", default=dataset_cache.CACHE_DIR, help="dataset_cache 폴더")
+    parser.add_argument("--cache-key", default=None, help="사용할 캐시 키 (기본: 가장 최근)")
+    parser.add_argument("--from-db", action="store_true", help="캐시 대신 DB에서 로드")
+    parser.add_argument("--repeat", type=int, default=20, help="predict 시간 측정 반복 횟수")
+    parser.add_argument("--no-save", action="store_true", help="결과를 multi_output.jsonl에 기록하지 않음")
+    args = parser.parse_args()
+
+    df, features = _load_frame(args)
+    records = [measure(df, features, layout, args.repeat) for layout in ("split", "joint")]
+
+    print("\n=== 분리형 vs 결합형 ===")
+    split, joint = records
+    for key in split["rmse"]:
+        print(f"RMSE {key:8s} {split['rmse'][key]:>10.2f} → {joint['rmse'][key]:>10.2f}")
+    print(f"학습 시간     {split['train_sec']:>10.1f}s → {joint['train_sec']:>10.1f}s")
+    for name in ("xgb", "lgb"):
+        print(f"{name} 모델 크기 {split['artifact_mb'][name]:>9.2f}MB → {joint['artifact_mb'][name]:>9.2f}MB")
+        print(f"{name} 예측 시간 {split['predict_ms'][name]:>9.2f}ms → {joint['predict_ms'][name]:>9.2f}ms "
+              f"(하루 {split['day_rows']}행)")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+파이프라인 단계별 벤치마크 (합성 데이터, 완전 오프라인)
+
+synthetic_data.generate로 만든 역 N개 × Y년 데이터로 아래 단계를 측정해서
+benchmarks/results/pipeline.jsonl 에 누적
+- train_preprocess : train.preprocess (컴팩트 타입 변환 후 일 단위 pivot/병합)
+- train_models     : train.train_models (최근 --train-days일, split 레이아웃, workers=1)
+- preprocess_frame : 전처리 Lambda의 계산 부분만 (preprocess.build_input_frame + lag 상태 BOOTSTRAP_DAYS일 반영/부착)
+- feature_build    : 예측 Lambda 입력 행렬 생성 (feature_matrix.build)
+- predict_xgb/lgb  : 예측 Lambda와 같은 _predict_targets
+- ensemble         : 앙상블 Lambda 병합/가중 평균 (Xgboost_Lightgbm._merge_frames, --ensemble-days일치)
+- handler_*        : 단계 Lambda 핸들러 그대로 (preprocess → predict_xgb/lgb → ensemble)
+                     합성 데이터를 넣은 임시 SQLite(DATABASE_URL)와 memory:// 저장소(STORAGE_URL)에서 실행
+                     → DB 조회/저장소 읽기·쓰기/upsert/대시보드 집계까지 포함 (RDS/S3 왕복 지연은 제외)
+                     전처리는 매번 lag 상태를 전날까지로 되돌려 운영처럼 하루치만 반영
+단계마다 워밍업 1회 후 --repeat회 중앙값/최소값 (학습 단계는 TRAIN_REPEAT회)
+
+기준선: --save-baseline 으로 results/pipeline_baseline.json 에 규모(역 수, 연수, 학습 일수)별 저장
+        기준선이 없으면 같은 규모의 직전 기록과 비교
+기준 대비 threshold 이상 느려진 단계는 REGRESSION 으로 표시하고 종료코드 1
+
+사용 예:
+    python benchmarks/pipeline.py --stations 600 --years 1 --save-baseline
+    python benchmarks/pipeline.py --stations 600 --years 1 --threshold 0.15
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (ROOT, os.path.join(ROOT, "Lambda")):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import numpy as np
+import pandas as pd
+
+import db
+import feature_matrix
+import instrument
+import lag_features
+import preprocess
+import synthetic_data
+import storage
+import train
+import Xgboost_Lightgbm as merge
+from resident_predictor import PREDICTOR_MODULES
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+RESULTS_PATH = os.path.join(RESULTS_DIR, "pipeline.jsonl")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "pipeline_baseline.json")
+TRAIN_REPEAT = 1
+HANDLER_BUCKET = "pipeline-bench"
+
+
+def _measure(fn, setup, repeat):
+    """setup() 결과를 fn에 넘겨 시간 측정 (setup 시간 제외), 첫 호출은 워밍업"""
+    result = fn(*setup())
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        t0 = time.perf_counter()
+        result = fn(*args)
+        times.append((time.perf_counter() - t0) * 1000)
+    return {"median_ms": round(float(np.median(times)), 2), "min_ms": round(float(np.min(times)), 2)}, result
+
+
+# train.load_training_data와 같은 컴팩트 타입 (DB 청크 대신 합성 데이터 전체)
+def _compact(subway, weather, holiday):
+    return (train._compact_subway(subway.copy()), train._compact_weather(weather.copy()),
+            train._compact_holiday(holiday.copy()))
+
+
+# 전처리 Lambda가 DB에서 읽는 형태: 역 목록, 예측일 날씨/공휴일, lag 상태용 최근 실제값
+def _lambda_inputs(subway, weather, holiday):
+    target = pd.Timestamp(holiday["날짜"].max())
+    max_date = target - pd.Timedelta(days=1)
+    since = max_date - pd.Timedelta(days=lag_features.BOOTSTRAP_DAYS)
+    rows = subway.assign(날짜=pd.to_datetime(subway["사용일자"], format="mixed").dt.normalize())
+    rows = rows.loc[rows["날짜"] > since, ["날짜", "호선", "역명", "구분", "인원수"]].reset_index(drop=True)
+    holiday_days = set(pd.to_datetime(holiday.loc[holiday["공휴일여부"] == "Y", "날짜"]))
+    return {
+        "stations": subway[["호선", "역명"]].drop_duplicates().reset_index(drop=True),
+        "weather": weather[pd.to_datetime(weather["날짜"]) == target].reset_index(drop=True),
+        "holiday": holiday[pd.to_datetime(holiday["날짜"]) == target].reset_index(drop=True),
+        "target": target,
+        "rows": rows,
+        "holiday_days": {d for d in holiday_days if since < d <= max_date},
+    }
+
+
+def _preprocess_frame(inputs):
+    df = preprocess.build_input_frame(inputs["stations"], inputs["weather"], inputs["holiday"], [inputs["target"]])
+    state = lag_features.LagState()
+    lag_features.catch_up(state, lag_features.daily_actuals(inputs["rows"]), inputs["holiday_days"])
+    return lag_features.attach(df, state, inputs["target"], bool(df["공휴일여부"].max()))
+
+
+def _check(result):
+    if result.get("status") not in ("ok", "prepared"):
+        raise RuntimeError(f"핸들러 실패: {result}")
+    return result
+
+
+# 단계 Lambda 핸들러를 임시 SQLite + memory:// 저장소에서 측정
+# pipeline_runner --storage/--database-url/--bucket과 같은 방식으로 환경 변수/모듈 버킷을 바꿨다가 되돌림
+def _handler_cases(tables, inputs, models, features, le_line, le_station, repeat):
+    modules = (preprocess, *PREDICTOR_MODULES.values(), merge)
+    saved_env = {k: os.environ.get(k) for k in (storage.STORAGE_URL_ENV, db.DATABASE_URL_ENV)}
+    saved_buckets = {module: module.S3_BUCKET for module in modules}
+    s3 = storage.client("memory://")
+    cases = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ[storage.STORAGE_URL_ENV] = "memory://"
+        os.environ[db.DATABASE_URL_ENV] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        for module in modules:
+            module.S3_BUCKET = HANDLER_BUCKET
+        engine = db.create_engine()
+        try:
+            for name, df in tables.items():
+                df.to_sql(name, engine, index=False)
+            train.save_to_s3_split(models, le_line, le_station, features, HANDLER_BUCKET)
+
+            # 전날까지 반영된 lag 상태 (핸들러가 max_date 하루만 이어서 반영)
+            max_date = inputs["target"] - pd.Timedelta(days=1)
+            rows = inputs["rows"]
+            state = lag_features.LagState()
+            lag_features.catch_up(state, lag_features.daily_actuals(rows[rows["날짜"] < max_date]),
+                                  inputs["holiday_days"])
+
+            def reset_state():
+                lag_features.save_state_s3(s3, HANDLER_BUCKET, state)
+                return ()
+
+            cases["handler_preprocess"], prepared = _measure(
+                lambda: _check(preprocess.lambda_handler({}, None)), reset_state, repeat)
+            cases["handler_preprocess"]["rows"] = prepared["rows"]
+            cases["handler_preprocess"]["lag_days_applied"] = prepared["lag_days_applied"]
+
+            event = {"s3_key": prepared["s3_key"]}
+            for name, module in PREDICTOR_MODULES.items():
+                cases[f"handler_predict_{name}"], out = _measure(
+                    lambda: _check(module.lambda_handler(event, None)), lambda: (), repeat)
+                cases[f"handler_predict_{name}"]["rows"] = out["rows"]
+
+            cases["handler_ensemble"], out = _measure(
+                lambda: _check(merge.lambda_handler({}, None)), lambda: (), repeat)
+            cases["handler_ensemble"]["rows"] = out["rows"]
+        finally:
+            engine.dispose()
+            s3.clear()
+            for module, bucket in saved_buckets.items():
+                module.S3_BUCKET = bucket
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    return cases
+
+
+def run(args):
+    subway, weather, holiday = synthetic_data.generate(args.stations, args.years, seed=args.seed)
+    features = train.training_features()
+    cases = {}
+
+    # 학습 전처리
+    cases["train_preprocess"], df = _measure(train.preprocess, lambda: _compact(subway, weather, holiday),
+                                             min(args.repeat, TRAIN_REPEAT))
+    cases["train_preprocess"]["rows"] = int(len(df))
+
+    # 학습 (최근 train_days일)
+    df, le_line, le_station = train.encode(df)
+    recent = df[df["날짜"] > df["날짜"].max() - pd.Timedelta(days=args.train_days)].reset_index(drop=True)
+    cases["train_models"], models = _measure(lambda d: train.train_models(d, features, workers=1),
+                                             lambda: (recent,), min(args.repeat, TRAIN_REPEAT))
+    cases["train_models"]["rows"] = int(len(recent))
+
+    # 전처리 Lambda 계산 부분 (DB/저장소 제외, 핸들러 전체는 아래 handler_preprocess)
+    inputs = _lambda_inputs(subway, weather, holiday)
+    cases["preprocess_frame"], prepared = _measure(_preprocess_frame, lambda: (inputs,), args.repeat)
+    cases["preprocess_frame"]["rows"] = int(len(prepared))
+
+    # 예측 Lambda: 입력 행렬 → predict
+    cases["feature_build"], (_, X) = _measure(
+        lambda d: feature_matrix.build(d, features, le_line, le_station), lambda: (prepared,), args.repeat)
+    cases["feature_build"]["rows"] = int(len(X))
+    outputs = {}
+    for name, module in PREDICTOR_MODULES.items():
+        payload = train.model_file_payload(models, name)
+        cases[f"predict_{name}"], _ = _measure(
+            lambda x: module._predict_targets(payload, name, x, feature_matrix.raw_predict), lambda: (X,), args.repeat)
+        cases[f"predict_{name}"]["rows"] = int(len(X))
+        day = module._predict_rows(prepared, payload, features, le_line, le_station)
+        outputs[name] = pd.concat([day.assign(날짜=(pd.Timestamp(day["날짜"].iloc[0]) - pd.Timedelta(days=i))
+                                               .strftime("%Y-%m-%d")) for i in range(args.ensemble_days)],
+                                  ignore_index=True)
+
+    # 앙상블 Lambda (범위 모드처럼 ensemble_days일을 한 번에)
+    cases["ensemble"], (df_all, _, _) = _measure(
+        lambda x, l: merge._merge_frames(x, l, {}),
+        lambda: (outputs["xgb"].copy(), outputs["lgb"].copy()), args.repeat)
+    cases["ensemble"]["rows"] = int(len(df_all))
+
+    # 단계 Lambda 핸들러 (임시 SQLite + memory:// 저장소)
+    tables = {"subway_stats": subway, "weather_stats": weather, "holidays_stats": holiday}
+    cases.update(_handler_cases(tables, inputs, models, features, le_line, le_station, args.repeat))
+
+    return {
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "config": _config(args),
+        "cases": cases,
+    }
+
+
+def _config(args):
+    return {"stations": args.stations, "years": args.years, "train_days": args.train_days,
+            "ensemble_days": args.ensemble_days, "seed": args.seed}
+
+
+def _config_key(config):
+    return ",".join(f"{k}={config[k]}" for k in sorted(config))
+
+
+def _load_baseline(config):
+    key = _config_key(config)
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            saved = json.load(f).get(key)
+        if saved:
+            return saved, "baseline"
+    if not os.path.exists(RESULTS_PATH):
+        return None, None
+    last = None
+    with open(RESULTS_PATH, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("config") and _config_key(rec["config"]) == key:
+                last = rec
+    return last, "previous" if last else None
+
+
+def _save_baseline(rec):
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baselines = json.load(f)
+    baselines[_config_key(rec["config"])] = rec
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2)
+
+
+# 기준 대비 중앙값 증가율이 threshold를 넘는 단계 목록
+def compare(current, reference, threshold):
+    regressions = []
+    if not reference:
+        return regressions
+    for name, case in current["cases"].items():
+        old, new = reference["cases"].get(name, {}).get("median_ms"), case["median_ms"]
+        if old and new and (new - old) / old > threshold:
+            regressions.append(f"{name}: {old}ms → {new}ms (+{(new - old) / old:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 데이터로 파이프라인 단계별 시간 측정")
+    parser.add_argument("--stations", type=int, default=600, help="역 수")
+    parser.add_argument("--years", type=int, default=1, help="데이터 기간(년)")
+    parser.add_argument("--train-days", type=int, default=365, help="train_models에 쓸 최근 일수")
+    parser.add_argument("--ensemble-days", type=int, default=30, help="앙상블 한 번에 병합할 날짜 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="측정 반복 횟수 (학습 단계 제외)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="회귀 판정 증가율 (기본 10%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="이번 결과를 이 규모의 기준선으로 저장")
+    parser.add_argument("--no-save", action="store_true", help="결과를 pipeline.jsonl에 기록하지 않음")
+    args = parser.parse_args()
+
+    # 단계/핸들러가 출력하는 EMF 로그 줄은 생략
+    instrument.EMIT_EMF = False
+    rec = run(args)
+    reference, source = _load_baseline(rec["config"])
+    regressions = compare(rec, reference, args.threshold)
+
+    print(f"\n{_config_key(rec['config'])}" + (f" (비교: {source} {reference['measured_at']})" if reference else ""))
+    for name, case in rec["cases"].items():
+        old = reference["cases"].get(name, {}).get("median_ms") if reference else None
+        print(f"{name:18s} {case['median_ms']:>12.2f}ms  rows={case['rows']:<10}" + (f" (기준 {old}ms)" if old else ""))
+    for r in regressions:
+        print(f"[REGRESSION] {r}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    if not args.no_save:
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    if args.save_baseline:
+        _save_baseline(rec)
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+예측 Docker 이미지 cold-start 측정
+
+이미지마다 아래 항목을 기록해서 benchmarks/results/startup.jsonl 에 누적
+- image_mb        : 이미지 크기
+- import_ms       : python -X importtime 으로 잰 핸들러 모듈 import 합계 (init 단계 비용)
+- import_full_ms  : 핸들러가 실제로 쓰는 무거운 모듈(pandas, numpy, joblib, 부스팅 라이브러리)까지 포함한 합계
+- init_ms         : Lambda RIE 로그의 Init Duration
+- first_invoke_ms : 첫 호출 왕복 시간 (lazy import + 모델 로드 + 예측 포함)
+                    컨테이너에 로컬 저장소(STORAGE_URL=file://)를 마운트하고 --model-dir의 모델과
+                    한 행짜리 입력 CSV를 넣어 두어, 핸들러가 실제 경로(입력/모델 로드 → 예측 → 저장)를 끝까지 실행
+- probe_status    : 첫 호출 응답의 status (ok가 아니면 first_invoke_ms는 그 지점까지의 시간)
+
+사용 예:
+    docker build -f Lambda/Xgboost/Dockerfile -t subway-xgb Lambda
+    docker build -f Lambda/LightGBM/Dockerfile -t subway-lgb Lambda
+    python benchmarks/startup.py subway-xgb subway-lgb --model-dir ./model
+
+직전 기록보다 threshold 이상 느려지면 REGRESSION 으로 표시하고 종료코드 1
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "startup.jsonl")
+RIE_URL = "http://localhost:{port}/2015-03-31/functions/function/invocations"
+HANDLER_SOURCES = {
+    "predict_xgboost": os.path.join(ROOT, "Lambda", "Xgboost", "predict_xgboost.py"),
+    "predict_lightgbm": os.path.join(ROOT, "Lambda", "LightGBM", "predict_lightgbm.py"),
+}
+
+# 컨테이너 안 로컬 저장소 경로와 첫 호출 입력 (prepared_data/ 아래 CSV 한 개)
+PROBE_ROOT = "/tmp/startup_probe"
+PROBE_KEY = "prepared_data/__startup_probe__.csv"
+PROBE_EVENT = {"s3_key": PROBE_KEY}
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+INIT_DURATION = re.compile(r"Init Duration:\s*([\d.]+)\s*ms")
+
+
+def _docker(*args, check=True):
+    return subprocess.run(["docker", *args], capture_output=True, text=True, check=check)
+
+
+def _handler_module(image):
+    cmd = json.loads(_docker("image", "inspect", "--format", "{{json .Config.Cmd}}", image).stdout)
+    return cmd[0].split(".")[0]
+
+
+def _heavy_modules(module):
+    lib = "xgboost" if "xgb" in module else "lightgbm"
+    return ["pandas", "numpy", "joblib", "sklearn", lib]
+
+
+# -X importtime 출력에서 최상위(들여쓰기 없는) 모듈의 cumulative 합계 (인터프리터 시작 import 포함)
+def _import_ms(image, modules):
+    stmt = "import " + ", ".join(modules)
+    res = _docker("run", "--rm", "--entrypoint", "python3", image, "-X", "importtime", "-c", stmt)
+    total_us, top = 0, []
+    for line in res.stderr.splitlines():
+        m = IMPORT_LINE.match(line)
+        if not m or len(m.group(3)) != 1:
+            continue
+        cumulative = int(m.group(2))
+        total_us += cumulative
+        top.append((cumulative, m.group(4)))
+    top.sort(reverse=True)
+    return round(total_us / 1000, 1), [{"module": n, "ms": round(us / 1000, 1)} for us, n in top[:5]]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+
+def _wait_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("localhost", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"RIE 포트 {port} 응답 없음")
+
+
+# 핸들러 모듈의 S3_BUCKET 값 (로컬 저장소에서는 버킷 이름이 폴더 이름)
+def _bucket(module):
+    with open(HANDLER_SOURCES[module], encoding="utf-8") as f:
+        m = re.search(r'^S3_BUCKET = "(.*)"', f.read(), re.M)
+    return m.group(1) if m else ""
+
+
+# 로컬 저장소 폴더: 버킷/model/ (--model-dir 복사) + 버킷/prepared_data/ 입력 한 행
+# 입력 CSV를 주지 않으면 임의 역 한 행 (미등록 역이라 예측은 건너뛰지만 import/모델 로드까지는 실행)
+def _probe_fixture(module, model_dir, input_csv=None):
+    root = tempfile.mkdtemp(prefix="startup_probe_")
+    bucket_dir = os.path.join(root, _bucket(module))
+    shutil.copytree(model_dir, os.path.join(bucket_dir, "model"))
+    key_path = os.path.join(bucket_dir, *PROBE_KEY.split("/"))
+    os.makedirs(os.path.dirname(key_path), exist_ok=True)
+    if input_csv:
+        with open(input_csv, encoding="utf-8") as src, open(key_path, "w", encoding="utf-8") as dst:
+            dst.write(src.readline())
+            dst.write(src.readline())
+    else:
+        with open(key_path, "w", encoding="utf-8") as f:
+            f.write("날짜,호선,역명,기온,강수형태,강수,습도,풍속,공휴일여부\n2025-08-22,1호선,서울역,25,0,0,60,2,0\n")
+    return root
+
+
+# RIE(Runtime Interface Emulator)로 컨테이너를 띄우고 첫 호출
+def _invoke_cold(image, fixture):
+    port = _free_port()
+    cid = _docker("run", "-d", "--rm", "-p", f"{port}:8080",
+                  "-v", f"{fixture}:{PROBE_ROOT}", "-e", f"STORAGE_URL=file://{PROBE_ROOT}",
+                  "-e", "AWS_EC2_METADATA_DISABLED=true", image).stdout.strip()
+    try:
+        _wait_port(port)
+        req = urllib.request.Request(RIE_URL.format(port=port),
+                                     data=json.dumps(PROBE_EVENT).encode("utf-8"), method="POST")
+        t0 = time.perf_counter()
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            body = resp.read()
+        first_invoke_ms = (time.perf_counter() - t0) * 1000
+        try:
+            status = json.loads(body).get("status")
+        except (ValueError, AttributeError):
+            status = None
+        time.sleep(0.5)  # REPORT 로그가 flush 될 때까지 대기
+        logs = _docker("logs", cid, check=False)
+        m = INIT_DURATION.search(logs.stdout + logs.stderr)
+        init_ms = float(m.group(1)) if m else None
+    finally:
+        _docker("stop", cid, check=False)
+    return init_ms, round(first_invoke_ms, 1), status
+
+
+def measure(image, model_dir, input_csv=None):
+    module = _handler_module(image)
+    size = int(_docker("image", "inspect", "--format", "{{.Size}}", image).stdout.strip())
+    import_ms, _ = _import_ms(image, [module])
+    import_full_ms, top = _import_ms(image, [module] + _heavy_modules(module))
+    fixture = _probe_fixture(module, model_dir, input_csv)
+    try:
+        init_ms, first_invoke_ms, status = _invoke_cold(image, fixture)
+    finally:
+        shutil.rmtree(fixture, ignore_errors=True)
+    return {
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "image": image,
+        "module": module,
+        "image_mb": round(size / 1024 / 1024, 1),
+        "import_ms": import_ms,
+        "import_full_ms": import_full_ms,
+        "top_imports": top,
+        "init_ms": init_ms,
+        "first_invoke_ms": first_invoke_ms,
+        "probe_status": status,
+    }
+
+
+def _previous(image):
+    if not os.path.exists(RESULTS_PATH):
+        return None
+    last = None
+    with open(RESULTS_PATH, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("image") == image:
+                last = rec
+    return last
+
+
+# 직전 기록 대비 증가율이 threshold를 넘는 지표 목록
+def compare(current, previous, threshold):
+    regressions = []
+    if not previous:
+        return regressions
+    for key in ("image_mb", "import_ms", "import_full_ms", "init_ms", "first_invoke_ms"):
+        # 첫 호출이 끝난 지점(probe_status)이 다르면 비교하지 않음
+        if key == "first_invoke_ms" and previous.get("probe_status") != current.get("probe_status"):
+            continue
+        old, new = previous.get(key), current.get(key)
+        if old and new and (new - old) / old > threshold:
+            regressions.append(f"{key}: {old} → {new}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="예측 이미지 cold-start 측정")
+    parser.add_argument("images", nargs="+", help="docker 이미지 이름 (예: subway-xgb)")
+    parser.add_argument("--model-dir", required=True, help="S3 model/ 폴더를 내려받은 로컬 폴더 (첫 호출에서 로드)")
+    parser.add_argument("--input", default=None, help="prepared_data CSV (첫 행만 사용, 없으면 임의 역 한 행)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="회귀 판정 증가율 (기본 10%%)")
+    parser.add_argument("--no-save", action="store_true", help="결과를 startup.jsonl에 기록하지 않음")
+    args = parser.parse_args()
+
+    failed = False
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    for image in args.images:
+        rec = measure(image, args.model_dir, args.input)
+        regressions = compare(rec, _previous(image), args.threshold)
+        print(json.dumps(rec, ensure_ascii=False))
+        for r in regressions:
+            print(f"[REGRESSION] {image} {r}")
+        failed = failed or bool(regressions)
+        if not args.no_save:
+            with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
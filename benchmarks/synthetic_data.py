@@ -0,0 +1,145 @@
+"""
+합성 데이터 생성기 (subway_stats / weather_stats / holidays_stats 와 같은 스키마)
+
+API/RDS 없이 규모를 바꿔 가며 벤치마크하기 위한 데이터 (예: 역 600개 × 1~10년)
+- subway_stats  : 사용일자(문자열), 역명, 호선, 구분(승차/하차), 인원수
+                  역별 기본 이용량(로그정규) × 요일/공휴일 계수 × 계절 × 비 오는 날 감소 × 잡음
+                  사용일자는 실제 DB처럼 앞부분은 'YYYY-MM-DD HH:MI:SS', 뒷부분은 'YYYYMMDD'
+- weather_stats : 날짜, 시간(HH00), 구분(기온, 강수, 습도, 강수 형태, 풍속, 풍향), 값 - 시간 단위
+- holidays_stats: 날짜, 요일, 공휴일여부(Y/N), 공휴일이름 - 양력 고정 공휴일 + 연 6일 임의 공휴일(명절 대용)
+weather/holidays는 마지막 사용일자 다음 날(예측일)까지 생성
+
+사용 예:
+    python benchmarks/synthetic_data.py --stations 600 --years 3 --out synthetic/
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+WEEKDAYS = ['월', '화', '수', '목', '금', '토', '일']
+WEEKDAY_FACTOR = np.array([1.0, 1.02, 1.02, 1.01, 1.05, 0.72, 0.55])
+HOLIDAY_FACTOR = 0.5
+FIXED_HOLIDAYS = {(1, 1): "신정", (3, 1): "삼일절", (5, 5): "어린이날", (6, 6): "현충일",
+                  (8, 15): "광복절", (10, 3): "개천절", (10, 9): "한글날", (12, 25): "성탄절"}
+EXTRA_HOLIDAYS_PER_YEAR = 6
+WEATHER_CATEGORIES = ["기온", "강수", "습도", "강수 형태", "풍속", "풍향"]
+ISO_DATE_FRACTION = 0.3      # 앞쪽 30% 날짜는 'YYYY-MM-DD 00:00:00' 형식
+DEFAULT_END = "2025-07-31"
+
+
+def _stations(n, rng):
+    lines = [f"{i}호선" for i in range(1, 10)]
+    line = np.array(lines)[np.arange(n) % len(lines)]
+    name = np.array([f"역{i:04d}" for i in range(n)])
+    return pd.DataFrame({"호선": line, "역명": name})
+
+
+def _holidays(days, rng):
+    name = pd.Series([FIXED_HOLIDAYS.get((d.month, d.day)) for d in days], index=days, dtype=object)
+    for year in days.year.unique():
+        in_year = np.flatnonzero((days.year == year) & name.isna().to_numpy())
+        extra = rng.choice(in_year, size=min(EXTRA_HOLIDAYS_PER_YEAR, len(in_year)), replace=False)
+        name.iloc[extra] = "명절"
+    return pd.DataFrame({
+        "날짜": days.strftime("%Y-%m-%d"),
+        "요일": np.array(WEEKDAYS)[days.dayofweek.to_numpy()],
+        "공휴일여부": np.where(name.notna(), "Y", "N"),
+        "공휴일이름": name.to_numpy(),
+    })
+
+
+def _weather(days, rng):
+    n_days = len(days)
+    doy = days.dayofyear.to_numpy()
+    season = np.sin(2 * np.pi * (doy - 105) / 365.25)                    # 7월 최고, 1월 최저
+    rain_prob = np.where(np.isin(days.month.to_numpy(), [6, 7, 8]), 0.45, 0.15)
+    rain_day = rng.random(n_days) < rain_prob
+    rain_daily = np.where(rain_day, rng.gamma(1.2, 6.0, n_days), 0.0)
+
+    hours = np.arange(24)
+    temp = (12.5 + 14 * season)[:, None] + 4 * np.sin(2 * np.pi * (hours - 9) / 24)[None, :] \
+        + rng.normal(0, 1.5, (n_days, 24))
+    rain = np.where(rng.random((n_days, 24)) < 0.4, rain_daily[:, None] / 10, 0.0) * rain_day[:, None]
+    humidity = np.clip((60 + 15 * season)[:, None] + 20 * (rain > 0) + rng.normal(0, 8, (n_days, 24)), 10, 100)
+    values = {
+        "기온": temp,
+        "강수": rain,
+        "습도": humidity,
+        "강수 형태": (rain > 0).astype(float),
+        "풍속": rng.gamma(2.0, 1.2, (n_days, 24)),
+        "풍향": rng.uniform(0, 360, (n_days, 24)),
+    }
+    frames = [pd.DataFrame({
+        "날짜": np.repeat(days.to_numpy(), 24),
+        "시간": np.tile([f"{h:02d}00" for h in hours], n_days),
+        "구분": cat,
+        "값": np.round(values[cat].ravel(), 1),
+    }) for cat in WEATHER_CATEGORIES]
+    weather = pd.concat(frames, ignore_index=True)
+    return weather, rain_daily
+
+
+def _subway(stations, days, holiday_flag, rain_daily, rng):
+    n_st, n_days = len(stations), len(days)
+    base = rng.lognormal(np.log(4000), 0.9, n_st)
+    ratio = rng.normal(1.0, 0.08, n_st)                                   # 하차/승차 비율
+    doy, year = days.dayofyear.to_numpy(), days.year.to_numpy()
+    day_factor = WEEKDAY_FACTOR[days.dayofweek.to_numpy()]
+    day_factor = np.where(holiday_flag, HOLIDAY_FACTOR, day_factor)
+    day_factor = day_factor * (1 + 0.05 * np.sin(2 * np.pi * doy / 365.25))
+    day_factor = day_factor * (1 - np.minimum(rain_daily, 60) / 600)      # 비 10mm당 약 1.7% 감소
+    trend = 1 + 0.02 * (year - year.min())
+
+    level = base[None, :] * (day_factor * trend)[:, None]                 # (날짜, 역)
+    board = level * rng.lognormal(0, 0.08, level.shape)
+    alight = level * ratio[None, :] * rng.lognormal(0, 0.08, level.shape)
+
+    n_iso = int(n_days * ISO_DATE_FRACTION)
+    keys = np.concatenate([days[:n_iso].strftime("%Y-%m-%d 00:00:00"), days[n_iso:].strftime("%Y%m%d")])
+    values = np.stack([board, alight], axis=2)                            # (날짜, 역, 구분)
+    return pd.DataFrame({
+        "사용일자": np.repeat(keys, n_st * 2),
+        "역명": np.tile(np.repeat(stations["역명"].to_numpy(), 2), n_days),
+        "호선": np.tile(np.repeat(stations["호선"].to_numpy(), 2), n_days),
+        "구분": np.tile(["승차", "하차"], n_days * n_st),
+        "인원수": np.rint(values.ravel()).astype(np.int64),
+    })
+
+
+def generate(stations=600, years=1, end=DEFAULT_END, seed=0):
+    """
+    반환: (subway, weather, holiday) - 각각 DB 테이블과 같은 컬럼
+    subway는 end까지, weather/holiday는 end 다음 날(예측일)까지
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end).normalize()
+    days = pd.date_range(end - pd.DateOffset(years=years) + pd.Timedelta(days=1), end + pd.Timedelta(days=1))
+    station_df = _stations(stations, rng)
+    holiday = _holidays(days, rng)
+    weather, rain_daily = _weather(days, rng)
+    observed = days[:-1]
+    subway = _subway(station_df, observed, (holiday["공휴일여부"] == "Y").to_numpy()[:-1], rain_daily[:-1], rng)
+    return subway, weather, holiday
+
+
+def main():
+    parser = argparse.ArgumentParser(description="subway/weather/holidays 합성 데이터 생성")
+    parser.add_argument("--stations", type=int, default=600)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--end", default=DEFAULT_END, help="마지막 사용일자 YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="저장 폴더 (테이블별 Parquet)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    frames = generate(args.stations, args.years, args.end, args.seed)
+    for table, df in zip(("subway_stats", "weather_stats", "holidays_stats"), frames):
+        path = os.path.join(args.out, f"{table}.parquet")
+        df.to_parquet(path, index=False)
+        print(f"{table}: {len(df):,}행 → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+학습 데이터셋 캐시
+
+같은 원본 데이터(워터마크)와 같은 피처 목록이면 SQL 로드/전처리/인코딩 결과를 재사용
+- frame.pkl        : 전처리+인코딩이 끝난 학습 프레임 (category/float32 타입 그대로)
+- encoders.joblib  : 호선/역명 LabelEncoder
+- meta.json        : 키 구성 정보, 마지막에 써서 완성 표시로 사용
+
+LightGBM/XGBoost 데이터셋(bin 계산)은 캐시하지 않음
+- train.py는 sklearn 래퍼(XGBRegressor/LGBMRegressor)에 DataFrame을 넘겨 학습
+- search.py는 rolling-origin 폴드마다 데이터셋을 만들어 trial끼리 공유
+→ 고정 train/val 분할 바이너리를 읽는 곳이 없음
+
+키 = sha1(원본 워터마크 + 피처 목록)
+원본 워터마크는 테이블별 행 수와 마지막 날짜 (데이터가 추가/수정되면 키가 바뀜)
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import joblib
+import pandas as pd
+from sqlalchemy import text
+
+CACHE_DIR = os.environ.get("DATASET_CACHE_DIR", ".dataset_cache")
+TARGETS = ['승차', '하차']
+
+# 테이블별 날짜 컬럼 (date 변환 SQL은 DB 방언에 맞게 db.as_date로 생성)
+WATERMARK_DATE_COLS = {
+    "subway_stats": "사용일자",
+    "weather_stats": "날짜",
+    "holidays_stats": "날짜",
+}
+
+
+def source_watermark(engine):
+    """테이블별 {rows, max_date} - 집계 쿼리 3번이라 전체 로드보다 훨씬 가벼움"""
+    import db  # Lambda/db.py (train.py가 import 경로에 추가)
+
+    mark = {}
+    with engine.connect() as conn:
+        for table, col in WATERMARK_DATE_COLS.items():
+            sql = f"SELECT COUNT(*), MAX({db.as_date(engine, col)}) FROM {table}"
+            rows, max_date = conn.execute(text(sql)).one()
+            mark[table] = {"rows": int(rows), "max_date": str(max_date)}
+    return mark
+
+
+def cache_key(watermark, features):
+    payload = json.dumps({
+        "watermark": watermark,
+        "features": list(features),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _path(cache_dir, key, name=None):
+    return os.path.join(cache_dir, key, name) if name else os.path.join(cache_dir, key)
+
+
+def exists(cache_dir, key):
+    return os.path.exists(_path(cache_dir, key, "meta.json"))
+
+
+def save(cache_dir, key, df, features, le_line, le_station, watermark):
+    """
+    학습 프레임과 인코더 저장
+    임시 폴더에 모두 쓴 뒤 이름을 바꿔서, 중간에 실패해도 불완전한 캐시가 남지 않음
+    """
+    t0 = time.perf_counter()
+    final = _path(cache_dir, key)
+    tmp = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    keep = [c for c in ['날짜', '호선', '역명'] + TARGETS + list(features) if c in df.columns]
+    df[keep].to_pickle(os.path.join(tmp, "frame.pkl"))
+    joblib.dump({"line": le_line, "station": le_station}, os.path.join(tmp, "encoders.joblib"))
+
+    meta = {
+        "key": key,
+        "watermark": watermark,
+        "features": list(features),
+        "rows": int(len(df)),
+        "build_sec": round(time.perf_counter() - t0, 1),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    return meta
+
+
+def load_meta(cache_dir, key):
+    if not exists(cache_dir, key):
+        return None
+    with open(_path(cache_dir, key, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_frame(cache_dir, key):
+    """캐시된 (df, le_line, le_station) - 없으면 None"""
+    if not exists(cache_dir, key):
+        return None
+    df = pd.read_pickle(_path(cache_dir, key, "frame.pkl"))
+    enc = joblib.load(_path(cache_dir, key, "encoders.joblib"))
+    return df, enc["line"], enc["station"]
+
+
+def latest_key(cache_dir=CACHE_DIR):
+    """가장 최근에 만든 캐시 키 (실험 스크립트에서 DB 접속 없이 사용)"""
+    if not os.path.isdir(cache_dir):
+        return None
+    keys = [k for k in os.listdir(cache_dir) if exists(cache_dir, k)]
+    if not keys:
+        return None
+    return max(keys, key=lambda k: os.path.getmtime(_path(cache_dir, k, "meta.json")))
+
+
+def prune(cache_dir, keep=3):
+    """최근 keep개만 남기고 삭제"""
+    if not os.path.isdir(cache_dir):
+        return []
+    keys = sorted((k for k in os.listdir(cache_dir) if exists(cache_dir, k)),
+                  key=lambda k: os.path.getmtime(_path(cache_dir, k, "meta.json")), reverse=True)
+    for k in keys[keep:]:
+        shutil.rmtree(_path(cache_dir, k), ignore_errors=True)
+    return keys[keep:]
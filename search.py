@@ -0,0 +1,274 @@
+"""
+시계열 백테스트 + 하이퍼파라미터 탐색
+
+train.py는 train_test_split(shuffle=False) 한 번과 고정 파라미터(트리 100개, depth 6, lr 0.1)로 학습
+여기서는
+- rolling-origin 폴드: 날짜순으로 [처음 ~ t) 학습, [t ~ t+horizon) 검증, t를 horizon씩 뒤로 이동
+- 폴드마다 early stopping (검증 RMSE가 early_stopping_rounds 동안 개선 없으면 중단)
+- 폴드×타깃별 LightGBM Dataset / XGBoost QuantileDMatrix를 한 번만 만들어 모든 trial이 공유
+  (스레드 풀이라 복사 없음, bin 계산도 한 번)
+- trial을 병렬 실행, 전체 wall-clock 예산을 넘기면 새 trial을 시작하지 않고 진행 중인 trial도 폴드 사이에서 중단
+- 결과: trial별 타깃별 RMSE/MAE, 최적 트리 수, 소요 시간 → leaderboard.csv / leaderboard.json
+
+사용 예:
+    python train.py --cache-dir .dataset_cache --no-upload    # 캐시 한 번 생성
+    python search.py --cache-dir .dataset_cache --trials 40 --workers 4 --budget-min 30
+    python search.py --from-db --models lgb --folds 4 --horizon-days 14
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+import dataset_cache
+
+TARGETS = ['승차', '하차']
+MAX_BIN = 255                 # 공유 데이터셋을 한 번만 만들기 위해 bin 수는 고정
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+RESULTS_DIR = "search_results"
+
+# trial마다 각 항목에서 하나씩 무작위 선택
+SEARCH_SPACE = {
+    "xgb": {
+        "max_depth": [4, 6, 8, 10],
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "min_child_weight": [1, 5, 10, 30],
+        "subsample": [0.7, 0.85, 1.0],
+        "colsample_bytree": [0.7, 0.85, 1.0],
+        "reg_lambda": [0.5, 1, 5, 10],
+    },
+    "lgb": {
+        "num_leaves": [31, 63, 127, 255],
+        "max_depth": [-1, 6, 10],
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "min_child_samples": [20, 50, 100],
+        "bagging_fraction": [0.7, 0.85, 1.0],
+        "feature_fraction": [0.7, 0.85, 1.0],
+        "lambda_l2": [0, 1, 5, 10],
+    },
+}
+
+# train.py 기본값 (모델마다 맨 앞 trial로 포함해 비교 기준으로 사용)
+BASELINE = {
+    "xgb": {"max_depth": 6, "learning_rate": 0.1},
+    "lgb": {"max_depth": 6, "learning_rate": 0.1},
+}
+
+
+def rolling_folds(dates, n_folds, horizon_days, min_train_days=30):
+    """
+    dates: 행별 날짜 (날짜순 정렬된 상태)
+    반환: [(train_end, valid_end), ...] 행 위치 - 학습 [0, train_end), 검증 [train_end, valid_end)
+    행이 날짜순이므로 슬라이스만으로 분할 (복사 없음)
+    """
+    days = pd.DatetimeIndex(dates).normalize()
+    unique = days.unique().sort_values()
+    folds = []
+    for i in range(n_folds, 0, -1):
+        valid_start = len(unique) - i * horizon_days
+        valid_stop = valid_start + horizon_days
+        if valid_start < min_train_days:
+            continue
+        train_end = int(np.searchsorted(days, unique[valid_start], side="left"))
+        valid_end = (int(np.searchsorted(days, unique[valid_stop], side="left"))
+                     if valid_stop < len(unique) else len(days))
+        folds.append((train_end, valid_end))
+    if not folds:
+        raise ValueError(f"날짜 {len(unique)}일로는 폴드를 만들 수 없음 (horizon {horizon_days}일 × {n_folds})")
+    return folds
+
+
+class SharedFolds:
+    """
+    X/y는 한 번만 float32 행렬로 만들고 폴드는 그 슬라이스(view)
+    폴드×타깃×모델별 학습용 데이터셋은 처음 요청될 때 한 번 만들어 모든 trial 스레드가 공유
+    """
+
+    def __init__(self, df, features, folds):
+        self.features = list(features)
+        self.folds = folds
+        self.X = np.ascontiguousarray(df[self.features].to_numpy(dtype=np.float32))
+        self.y = {t: df[t].to_numpy(dtype=np.float32) for t in TARGETS}
+        self._cache = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _build(self, model, fold, target):
+        train_end, valid_end = self.folds[fold]
+        X_train, X_valid = self.X[:train_end], self.X[train_end:valid_end]
+        y_train, y_valid = self.y[target][:train_end], self.y[target][train_end:valid_end]
+        if model == "xgb":
+            train = xgb.QuantileDMatrix(X_train, y_train, max_bin=MAX_BIN + 1)
+            valid = xgb.QuantileDMatrix(X_valid, y_valid, ref=train)
+        else:
+            params = {"max_bin": MAX_BIN, "verbose": -1}
+            train = lgb.Dataset(X_train, y_train, params=params, free_raw_data=False).construct()
+            valid = lgb.Dataset(X_valid, y_valid, reference=train, params=params).construct()
+        return train, valid, X_valid, y_valid
+
+    def get(self, model, fold, target):
+        key = (model, fold, target)
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            lock = self._locks.setdefault(key, threading.Lock())
+        # 같은 데이터셋을 여러 trial이 동시에 만들지 않도록 키별 잠금
+        with lock:
+            with self._lock:
+                if key in self._cache:
+                    return self._cache[key]
+            built = self._build(model, fold, target)
+            with self._lock:
+                self._cache[key] = built
+            return built
+
+
+# 검증 예측은 공유 행렬의 view(X_valid)로 바로 수행
+def _fit_predict(model, params, train, valid, X_valid, n_threads):
+    if model == "xgb":
+        p = {"objective": "reg:squarederror", "tree_method": "hist", "max_bin": MAX_BIN + 1,
+             "nthread": n_threads, "seed": 42, **params}
+        booster = xgb.train(p, train, MAX_ROUNDS, evals=[(valid, "valid")],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        best = booster.best_iteration + 1
+        return booster.inplace_predict(X_valid, iteration_range=(0, best)), best
+    p = {"objective": "regression", "max_bin": MAX_BIN, "num_threads": n_threads,
+         "seed": 42, "verbose": -1, **params}
+    if p.get("bagging_fraction", 1.0) < 1.0:
+        p["bagging_freq"] = 1
+    booster = lgb.train(p, train, MAX_ROUNDS, valid_sets=[valid],
+                        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+    best = booster.best_iteration or booster.current_iteration()
+    return booster.predict(X_valid, num_iteration=best, num_threads=n_threads), best
+
+
+def run_trial(shared, trial, deadline, n_threads):
+    """trial: {"trial", "model", "params"} → leaderboard 한 행"""
+    t0 = time.perf_counter()
+    row = {"trial": trial["trial"], "model": trial["model"],
+           "params": json.dumps(trial["params"], sort_keys=True), "status": "ok"}
+    for target in TARGETS:
+        errors, best_iters = [], []
+        for fold in range(len(shared.folds)):
+            if time.time() > deadline:
+                row["status"] = "timeout"
+                row["runtime_sec"] = round(time.perf_counter() - t0, 1)
+                return row
+            train, valid, X_valid, y_valid = shared.get(trial["model"], fold, target)
+            pred, best = _fit_predict(trial["model"], trial["params"], train, valid, X_valid, n_threads)
+            errors.append(np.clip(pred, 0, None) - y_valid)
+            best_iters.append(best)
+        err = np.concatenate(errors)
+        row[f"rmse_{target}"] = round(float(np.sqrt(np.mean(err ** 2))), 2)
+        row[f"mae_{target}"] = round(float(np.mean(np.abs(err))), 2)
+        row[f"best_iter_{target}"] = int(np.median(best_iters))
+    row["rmse_mean"] = round(float(np.mean([row[f"rmse_{t}"] for t in TARGETS])), 2)
+    row["runtime_sec"] = round(time.perf_counter() - t0, 1)
+    return row
+
+
+def sample_trials(models, n_trials, seed=42):
+    rng = random.Random(seed)
+    trials, seen = [], set()
+    for model in models:
+        trials.append({"model": model, "params": dict(BASELINE[model])})
+        seen.add((model, json.dumps(BASELINE[model], sort_keys=True)))
+    attempts = 0
+    while len(trials) < n_trials and attempts < n_trials * 20:
+        attempts += 1
+        model = models[len(trials) % len(models)]
+        params = {k: rng.choice(v) for k, v in SEARCH_SPACE[model].items()}
+        sig = (model, json.dumps(params, sort_keys=True))
+        if sig in seen:
+            continue
+        seen.add(sig)
+        trials.append({"model": model, "params": params})
+    for i, t in enumerate(trials):
+        t["trial"] = i
+    return trials
+
+
+def search(df, features, models=("xgb", "lgb"), n_trials=20, n_folds=3, horizon_days=14,
+           workers=2, threads=None, budget_sec=3600, seed=42):
+    """반환: leaderboard DataFrame (rmse_mean 오름차순, timeout trial은 맨 뒤)"""
+    if not df['날짜'].is_monotonic_increasing:
+        df = df.sort_values('날짜', kind='stable').reset_index(drop=True)
+    folds = rolling_folds(df['날짜'], n_folds, horizon_days)
+    shared = SharedFolds(df, features, folds)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    trials = sample_trials(list(models), n_trials, seed)
+    deadline = time.time() + budget_sec
+
+    print(f"폴드 {len(folds)}개 (검증 {horizon_days}일씩), trial {len(trials)}개, "
+          f"workers={workers} × threads={threads}, 예산 {budget_sec / 60:.0f}분")
+    rows = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_trial, shared, t, deadline, threads) for t in trials]
+        for fut in futures:
+            row = fut.result()
+            rows.append(row)
+            if row["status"] == "ok":
+                print(f"trial {row['trial']:3d} {row['model']} RMSE {row['rmse_mean']:.2f} "
+                      f"({row['runtime_sec']}s) {row['params']}")
+
+    board = pd.DataFrame(rows)
+    board["_timeout"] = board["status"] != "ok"
+    sort_cols = ["_timeout"] + (["rmse_mean"] if "rmse_mean" in board.columns else [])
+    board = board.sort_values(sort_cols).drop(columns="_timeout").reset_index(drop=True)
+    return board
+
+
+def _load_frame(args):
+    if args.from_db:
+        import train
+        df, _, _ = train.build_training_frame(train._create_engine(), cache_dir=args.cache_dir)
+        return df, train.features
+    key = args.cache_key or dataset_cache.latest_key(args.cache_dir)
+    cached = dataset_cache.load_frame(args.cache_dir, key) if key else None
+    if not cached:
+        raise SystemExit(f"{args.cache_dir}에 데이터셋 캐시 없음 - train.py --cache-dir 로 먼저 생성하거나 --from-db 사용")
+    meta = dataset_cache.load_meta(args.cache_dir, key)
+    print(f"데이터셋 캐시 {key} ({meta['rows']:,}행)")
+    return cached[0], meta["features"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="시계열 백테스트 + 하이퍼파라미터 탐색")
+    parser.add_argument("--cache-dir", default=dataset_cache.CACHE_DIR, help="dataset_cache 폴더")
+    parser.add_argument("--cache-key", default=None, help="사용할 캐시 키 (기본: 가장 최근)")
+    parser.add_argument("--from-db", action="store_true", help="캐시 대신 DB에서 로드")
+    parser.add_argument("--models", default="xgb,lgb", help="탐색할 모델 (쉼표 구분)")
+    parser.add_argument("--trials", type=int, default=20, help="trial 수 (모델별 기준 trial 포함)")
+    parser.add_argument("--folds", type=int, default=3, help="rolling-origin 폴드 수")
+    parser.add_argument("--horizon-days", type=int, default=14, help="폴드별 검증 기간(일)")
+    parser.add_argument("--workers", type=int, default=2, help="동시에 실행할 trial 수")
+    parser.add_argument("--threads", type=int, default=None, help="trial당 스레드 수 (기본: 코어 수 // workers)")
+    parser.add_argument("--budget-min", type=float, default=60, help="전체 wall-clock 예산(분)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=RESULTS_DIR, help="leaderboard 저장 폴더")
+    args = parser.parse_args()
+
+    df, features = _load_frame(args)
+    board = search(df, features, [m.strip() for m in args.models.split(",")], args.trials,
+                   args.folds, args.horizon_days, args.workers, args.threads,
+                   args.budget_min * 60, args.seed)
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    board.to_csv(os.path.join(args.out, f"leaderboard_{stamp}.csv"), index=False, encoding="utf-8-sig")
+    with open(os.path.join(args.out, f"leaderboard_{stamp}.json"), "w", encoding="utf-8") as f:
+        json.dump(board.to_dict(orient="records"), f, ensure_ascii=False, indent=2)
+    print(board.head(10).to_string())
+
+
+if __name__ == "__main__":
+    main()
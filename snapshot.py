@@ -0,0 +1,254 @@
+"""
+학습 데이터 스냅샷 (연/월 파티션 Parquet)
+
+train.py가 매번 RDS에서 전체 이력을 다시 읽지 않도록 로컬에 컴팩트 타입 그대로 보관
+    training_snapshot/
+        _snapshot.json                       ← 테이블별 워터마크, 파일 목록, 원본 워터마크
+        subway/year=2025/month=08/part-<실행 토큰>-<청크 번호>.parquet
+        weather/year=2025/month=08/...
+        holiday/year=2025/month=08/...
+- 처음 실행: DB 전체를 청크 단위로 읽어 청크마다 바로 파티션 파일로 기록 (메모리에 전체를 올리지 않음)
+- 이후 실행: 테이블별 워터마크(마지막 날짜) 이후 날짜만 DB에서 읽어 새 파일로 추가
+- 읽기: 필요한 컬럼만(column projection), 필요한 연/월 폴더만(partition filter) 읽음
+- _snapshot.json에 등록된 파일만 스냅샷으로 인정 → 추가 도중 실패해도 다음 실행에서 미등록 파일 정리
+- compact: 지난 달 파티션의 여러 파일(매일 추가분)을 파일 하나로 병합
+
+사용 예:
+    python snapshot.py update                 # 없으면 전체 구축, 있으면 새 날짜만 추가
+    python snapshot.py info
+    python snapshot.py compact
+    python train.py --snapshot-dir training_snapshot
+"""
+import argparse
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+SNAPSHOT_DIR = os.environ.get("TRAINING_SNAPSHOT_DIR", "training_snapshot")
+META_FILE = "_snapshot.json"
+DATE_COLS = {"subway": "사용일자", "weather": "날짜", "holiday": "날짜"}
+PARTITION_RE = re.compile(r"year=(\d{4})/month=(\d{2})/")
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise SystemExit("학습 스냅샷은 pyarrow가 필요합니다: pip install pyarrow")
+
+
+def read_meta(root=SNAPSHOT_DIR):
+    path = os.path.join(root, META_FILE)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# 임시 파일에 쓴 뒤 교체 → 읽는 쪽은 항상 완성된 메타만 봄
+def _write_meta(root, meta):
+    meta["updated_at"] = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    tmp = os.path.join(root, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(root, META_FILE))
+
+
+def _write_partitions(root, name, chunk, token):
+    """청크 하나를 연/월별 파일로 기록, 반환: 스냅샷 기준 상대 경로 목록"""
+    date_col = DATE_COLS[name]
+    files = []
+    for (year, month), part in chunk.groupby([chunk[date_col].dt.year, chunk[date_col].dt.month], sort=True):
+        rel = f"{name}/year={year:04d}/month={month:02d}/part-{token}.parquet"
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part.to_parquet(path, index=False, compression="zstd")
+        files.append(rel)
+    return files
+
+
+def _remove_orphans(root, meta):
+    """메타에 등록되지 않은 parquet 파일 삭제 (이전 실행이 중간에 실패한 흔적)"""
+    known = {f for t in meta["tables"].values() for f in t.get("files", [])}
+    removed = 0
+    for name in DATE_COLS:
+        for dirpath, _, filenames in os.walk(os.path.join(root, name)):
+            for fn in filenames:
+                rel = os.path.relpath(os.path.join(dirpath, fn), root).replace(os.sep, "/")
+                if fn.endswith(".parquet") and rel not in known:
+                    os.remove(os.path.join(dirpath, fn))
+                    removed += 1
+    return removed
+
+
+def update(engine, root=SNAPSHOT_DIR, chunk_rows=None):
+    """
+    DB → 스냅샷 추가
+    테이블별 워터마크 이후 날짜만 청크 단위로 읽어 파티션 파일로 기록한 뒤 메타 갱신
+    반환: 테이블별 추가 행 수/파일 수, 소요 시간
+    """
+    _require_pyarrow()
+    import dataset_cache
+    import train
+
+    chunk_rows = chunk_rows or train.CHUNK_ROWS
+    os.makedirs(root, exist_ok=True)
+    meta = read_meta(root)
+    summary = {"orphans_removed": _remove_orphans(root, meta), "tables": {}}
+    t0 = time.perf_counter()
+    # 실행마다 고유한 토큰 (같은 초에 두 번 실행돼도 기존 파일을 덮어쓰지 않게)
+    run_token = datetime.utcnow().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+    for name, _, compact in train.TRAINING_TABLES:
+        state = meta["tables"].setdefault(name, {"watermark": None, "rows": 0, "files": []})
+        since = state["watermark"]
+        params = {"since": since} if since else None
+        added_rows, added_files, max_date = 0, [], None
+        sql = train.table_sql(name, since, engine)
+        for i, chunk in enumerate(train.iter_sql_chunks(engine, sql, compact, chunk_rows, params)):
+            if chunk.empty:
+                continue
+            added_files += _write_partitions(root, name, chunk, f"{run_token}-{i:05d}")
+            added_rows += len(chunk)
+            chunk_max = chunk[DATE_COLS[name]].max()
+            max_date = chunk_max if max_date is None else max(max_date, chunk_max)
+        if added_rows:
+            state["files"] += added_files
+            state["rows"] += added_rows
+            state["watermark"] = max_date.strftime("%Y-%m-%d")
+        summary["tables"][name] = {"since": since, "rows": added_rows, "files": len(added_files),
+                                   "watermark": state["watermark"]}
+
+    # 원본 DB 워터마크도 함께 기록 (dataset_cache 키와 같은 형식)
+    meta["source_watermark"] = dataset_cache.source_watermark(engine)
+    _write_meta(root, meta)
+    summary["sec"] = round(time.perf_counter() - t0, 1)
+    return summary
+
+
+def _month_of(rel):
+    m = PARTITION_RE.search(rel)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def partition_files(root, name, since=None, until=None):
+    """연/월 폴더 이름만 보고 고른 파일 목록 (파일을 열지 않음)"""
+    files = read_meta(root)["tables"].get(name, {}).get("files", [])
+    lo = (pd.Timestamp(since).year, pd.Timestamp(since).month) if since else None
+    hi = (pd.Timestamp(until).year, pd.Timestamp(until).month) if until else None
+    picked = []
+    for rel in files:
+        ym = _month_of(rel)
+        if (lo and ym < lo) or (hi and ym > hi):
+            continue
+        picked.append(rel)
+    return picked
+
+
+# 파일 하나 읽기 - 문자열 컬럼은 category로 (train.load_training_data와 같은 타입)
+def _read_part(path, columns=None):
+    import pyarrow.parquet as pq
+
+    part = pq.read_table(path, columns=columns).to_pandas()
+    for col in part.columns:
+        if part[col].dtype == object:
+            part[col] = part[col].astype("category")
+    return part
+
+
+def read_table(root, name, columns=None, since=None, until=None):
+    """
+    스냅샷 테이블 읽기
+    columns: 읽을 컬럼 (None이면 전체) - Parquet 컬럼 단위로만 읽음
+    since  : 이 날짜 다음 날부터 (증분 학습), until: 이 날짜까지
+    반환 타입은 train.load_training_data와 같음 (문자열 → category, int32/float32/datetime64 유지)
+    """
+    _require_pyarrow()
+    import train
+
+    date_col = DATE_COLS[name]
+    read_cols = list(columns) if columns else None
+    if read_cols and (since or until) and date_col not in read_cols:
+        read_cols.append(date_col)
+
+    frames = []
+    for rel in partition_files(root, name, since, until):
+        part = _read_part(os.path.join(root, rel), read_cols)
+        if since:
+            part = part[part[date_col] > pd.Timestamp(since)]
+        if until:
+            part = part[part[date_col] <= pd.Timestamp(until)]
+        if not part.empty:
+            frames.append(part)
+    if not frames:
+        return pd.DataFrame(columns=list(columns) if columns else [])
+    frame = train._concat_compact(frames)
+    return frame[list(columns)] if columns else frame
+
+
+def compact_partitions(root=SNAPSHOT_DIR, min_files=2):
+    """
+    지난 달(워터마크가 속한 달 이전) 파티션 중 파일이 min_files개 이상인 곳을 파일 하나로 병합
+    메타를 먼저 교체한 뒤 예전 파일 삭제
+    """
+    _require_pyarrow()
+    import train
+
+    meta = read_meta(root)
+    merged = 0
+    for name, state in meta["tables"].items():
+        if not state.get("watermark"):
+            continue
+        wm = pd.Timestamp(state["watermark"])
+        by_month = {}
+        for rel in state["files"]:
+            by_month.setdefault(_month_of(rel), []).append(rel)
+        for (year, month), rels in sorted(by_month.items()):
+            if (year, month) >= (wm.year, wm.month) or len(rels) < min_files:
+                continue
+            parts = [_read_part(os.path.join(root, r)) for r in rels]
+            frame = train._concat_compact(parts).sort_values(DATE_COLS[name], kind="stable")
+            token = "compact-" + datetime.utcnow().strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:8]
+            new = _write_partitions(root, name, frame, token)
+            state["files"] = [f for f in state["files"] if f not in rels] + new
+            _write_meta(root, meta)
+            for r in rels:
+                os.remove(os.path.join(root, r))
+            merged += 1
+    return merged
+
+
+def info(root=SNAPSHOT_DIR):
+    meta = read_meta(root)
+    out = {"root": root, "source_watermark": meta.get("source_watermark"),
+           "updated_at": meta.get("updated_at"), "tables": {}}
+    for name, state in meta["tables"].items():
+        size = sum(os.path.getsize(os.path.join(root, f)) for f in state["files"]
+                   if os.path.exists(os.path.join(root, f)))
+        out["tables"][name] = {"watermark": state["watermark"], "rows": state["rows"],
+                               "files": len(state["files"]), "mb": round(size / 1024 / 1024, 1)}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="학습 데이터 스냅샷 (연/월 파티션 Parquet)")
+    parser.add_argument("command", choices=["update", "info", "compact"])
+    parser.add_argument("--root", default=SNAPSHOT_DIR, help="스냅샷 폴더")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="DB에서 한 번에 읽을 행 수")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        import train
+        print(json.dumps(update(train._create_engine(), args.root, args.chunk_rows), ensure_ascii=False))
+    elif args.command == "compact":
+        print(f"병합한 파티션 {compact_partitions(args.root)}개")
+    print(json.dumps(info(args.root), ensure_ascii=False, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,36 @@
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import time
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
+from pandas.api.types import union_categoricals
+from sqlalchemy import text
 import lightgbm as lgb
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
 from sklearn.preprocessing import LabelEncoder
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-import boto3
 from io import BytesIO
 import joblib
 
+import dataset_cache
+import snapshot
+
+# Lambda 쪽과 같은 lag/rolling 피처 모듈 사용
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Lambda"))
+import db
+import lag_features
+import model_bundle
+import storage
+
 # RDS 설정
 DB_USER = ""
 DB_PASSWORD = ""
@@ -19,17 +39,153 @@ DB_PORT = "5432"
 DB_NAME = "subway"
 TABLE_NAME = "pred_data"
 
-engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+# 한 번에 가져올 행 수 (server-side cursor로 스트리밍)
+CHUNK_ROWS = 200_000
+
+SUBWAY_SQL = "SELECT 사용일자, 역명, 호선, 구분, 인원수 FROM subway_stats"
+WEATHER_SQL = "SELECT 날짜, 구분, 값 FROM weather_stats"
+HOLIDAY_SQL = "SELECT 날짜, 요일, 공휴일여부 FROM holidays_stats"
+
+# 증분 학습 시 워터마크 이후 날짜만 읽기 위한 날짜 컬럼 (문자열/timestamp 모두 date로 비교)
+DATE_FILTER = {
+    "subway": "사용일자",
+    "weather": "날짜",
+    "holiday": "날짜",
+}
+
+# ===== 증분(warm-start) 학습 설정 =====
+STATE_KEY = "model/_training_state.json"   # 마지막으로 학습에 들어간 날짜(워터마크) 기록
+HOLDOUT_DAYS = 7          # 새로 들어온 날짜 중 마지막 N일은 검증용 (다음 실행에서 학습됨)
+ADD_TREES = 20            # trees 모드: 기존 부스터 뒤에 추가할 트리 수
+MAX_TREES = 300           # trees 모드 상한 (전체 학습 100개의 3배), 넘으면 그 모델은 refit으로 갱신 → 크기 고정
+                          # 매달 --mode full 재학습으로 트리 수를 처음 상태로 되돌림
+REFIT_DECAY = 0.9         # refit 모드(LightGBM): 기존 leaf 값 유지 비율
+RMSE_TOLERANCE = 0.02     # 갱신 모델 RMSE가 기존 대비 2% 이내로 나빠지는 것까지 허용
+
+# DATABASE_URL 환경 변수가 있으면 그 DB (로컬 PostgreSQL/SQLite, Lambda/db.py)
+def _create_engine():
+    return db.create_engine(db.postgres_url(DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME))
+
+# ===== 컴팩트 타입 변환 (청크가 도착할 때마다 적용) =====
+# 호선/역명/구분 → category, 인원수 → int32, 날씨 값 → float32, 날짜 → datetime64
+def _compact_subway(chunk):
+    chunk['사용일자'] = pd.to_datetime(chunk['사용일자'], format='mixed').dt.normalize()
+    for col in ['역명', '호선', '구분']:
+        chunk[col] = chunk[col].astype('category')
+    chunk['인원수'] = pd.to_numeric(chunk['인원수'], errors='coerce').fillna(0).astype('int32')
+    return chunk
+
+def _compact_weather(chunk):
+    chunk['날짜'] = pd.to_datetime(chunk['날짜'], format='mixed').dt.normalize()
+    chunk['구분'] = chunk['구분'].astype(str).str.replace(" ", "", regex=False).astype('category')
+    chunk['값'] = pd.to_numeric(chunk['값'], errors='coerce').astype('float32')
+    return chunk
+
+def _compact_holiday(chunk):
+    chunk['날짜'] = pd.to_datetime(chunk['날짜'], format='mixed').dt.normalize()
+    chunk['요일'] = chunk['요일'].astype('category')
+    return chunk
+
+# 청크마다 category 목록이 다르므로 합집합으로 맞춘 뒤 concat (그래야 category가 유지됨)
+def _concat_compact(chunks):
+    if not chunks:
+        return pd.DataFrame()
+    cat_cols = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    for col in cat_cols:
+        categories = union_categoricals([ch[col] for ch in chunks], ignore_order=True).categories
+        for ch in chunks:
+            ch[col] = ch[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+# server-side cursor로 chunk_rows행씩 읽어 컴팩트 타입으로 변환한 청크를 하나씩 반환
+def iter_sql_chunks(engine, sql, compact, chunk_rows=CHUNK_ROWS, params=None):
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunk_rows) as conn:
+        for chunk in pd.read_sql(text(sql), conn, params=params, chunksize=chunk_rows):
+            yield compact(chunk)
+
+def read_sql_chunked(engine, sql, compact, chunk_rows=CHUNK_ROWS, params=None):
+    return _concat_compact(list(iter_sql_chunks(engine, sql, compact, chunk_rows, params)))
 
-# 데이터 불러오기
-subway = pd.read_sql("SELECT 사용일자, 역명, 호선, 구분, 인원수 FROM subway_stats", engine)
-weather = pd.read_sql("SELECT * FROM weather_stats", engine)
-holiday = pd.read_sql("SELECT * FROM holidays_stats", engine)
+# (이름, SQL, 컴팩트 변환) - DB 로드와 학습 스냅샷(snapshot.py)이 함께 사용
+TRAINING_TABLES = [("subway", SUBWAY_SQL, _compact_subway),
+                   ("weather", WEATHER_SQL, _compact_weather),
+                   ("holiday", HOLIDAY_SQL, _compact_holiday)]
+
+# 학습에 쓰는 컬럼 (스냅샷에서는 이 컬럼만 읽음)
+TRAINING_COLUMNS = {
+    "subway": ["사용일자", "역명", "호선", "구분", "인원수"],
+    "weather": ["날짜", "구분", "값"],
+    "holiday": ["날짜", "요일", "공휴일여부"],
+}
+
+def table_sql(name, since=None, engine=None):
+    sql = dict((n, q) for n, q, _ in TRAINING_TABLES)[name]
+    return f"{sql} WHERE {db.as_date(engine, DATE_FILTER[name])} > :since" if since else sql
+
+def _peak_rss_mb():
+    # 리눅스 ru_maxrss 단위는 KB (macOS는 byte)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+# 같은 데이터를 기본 타입(object/int64/float64)으로 읽었을 때의 추정 크기
+def _default_dtype_bytes(df):
+    total = df.index.nbytes
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            str_sizes = np.array([sys.getsizeof(str(c)) for c in s.cat.categories])
+            counts = np.bincount(s.cat.codes[s.cat.codes >= 0], minlength=len(str_sizes))
+            total += 8 * len(s) + int((str_sizes * counts).sum())
+        elif s.dtype.kind in "iuf":
+            total += 8 * len(s)
+        else:
+            total += int(s.memory_usage(index=False, deep=True))
+    return total
+
+def _table_report(frame, started):
+    compact_bytes = int(frame.memory_usage(index=True, deep=True).sum())
+    default_bytes = _default_dtype_bytes(frame)
+    return {
+        "rows": int(len(frame)),
+        "compact_mb": round(compact_bytes / 1024 / 1024, 1),
+        "default_mb_est": round(default_bytes / 1024 / 1024, 1),
+        "reduction": round(default_bytes / compact_bytes, 2) if compact_bytes else None,
+        "load_sec": round(time.perf_counter() - started, 1),
+    }
+
+def load_training_data(engine, chunk_rows=CHUNK_ROWS, since=None, snapshot_dir=None):
+    """
+    subway_stats / weather_stats / holidays_stats를 청크 단위로 읽어 컴팩트 타입으로 조립
+    since(YYYY-MM-DD)를 주면 그 다음 날부터만 읽음 (증분 학습)
+    snapshot_dir을 주면 DB 대신 로컬 Parquet 스냅샷에서 읽음 (snapshot.py)
+    반환: subway, weather, holiday, 메모리 리포트(dict)
+    """
+    report = {"tables": {}, "source": "snapshot" if snapshot_dir else "db"}
+    frames = {}
+    params = {"since": since} if since else None
+    for name, _, compact in TRAINING_TABLES:
+        t0 = time.perf_counter()
+        if snapshot_dir:
+            frame = snapshot.read_table(snapshot_dir, name, columns=TRAINING_COLUMNS[name], since=since)
+        else:
+            frame = read_sql_chunked(engine, table_sql(name, since, engine), compact, chunk_rows, params)
+        report["tables"][name] = _table_report(frame, t0)
+        frames[name] = frame
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return frames["subway"], frames["weather"], frames["holiday"], report
+
+def print_memory_report(report):
+    print(f"=== 학습 데이터 메모리 ({report.get('source', 'db')}) ===")
+    for name, r in report["tables"].items():
+        print(f"{name:8s} {r['rows']:>12,}행  {r['compact_mb']:>8.1f}MB "
+              f"(기본 타입 추정 {r['default_mb_est']:.1f}MB, {r['reduction']}배 절감)  {r['load_sec']}s")
+    print(f"최대 RSS: {report['peak_rss_mb']}MB")
 
 # 전처리 함수
 def preprocess(subway, weather, holiday):
     subway.rename(columns={'사용일자': '날짜'}, inplace=True)
-    weather['구분'] = weather['구분'].str.replace(" ", "")
+    if not isinstance(weather['구분'].dtype, pd.CategoricalDtype):
+        weather['구분'] = weather['구분'].str.replace(" ", "")
     
     # 데이터 병합
     subway['날짜'] = pd.to_datetime(subway['날짜'], format='mixed')
@@ -37,26 +193,33 @@ def preprocess(subway, weather, holiday):
     holiday['날짜'] = pd.to_datetime(holiday['날짜'], format='mixed')
     
     # 시간 단위 → 일 단위 평균/최대값 집계
+    # category 컬럼은 observed=True로 실제 조합만 (아니면 호선×역명×날짜 전체 곱이 생성됨)
     weather_daily = weather.pivot_table(
         index='날짜',
         columns='구분',
         values='값',
-        aggfunc='mean'  # or max depending on category
-    ).reset_index()
+        aggfunc='mean',  # or max depending on category
+        observed=True
+    )
+    weather_daily.columns = weather_daily.columns.astype(str)
+    weather_daily = weather_daily.reset_index()
 
     subway_daily = subway.pivot_table(
         index=['날짜','호선','역명'],
         columns='구분',
         values='인원수',
-    ).reset_index()
+        observed=True
+    )
+    subway_daily.columns = subway_daily.columns.astype(str)
+    subway_daily = subway_daily.astype('float32').reset_index()
     
     # subway 기준으로 합치기
     df = subway_daily.merge(weather_daily, on='날짜', how='left')
     df = df.merge(holiday, on='날짜', how='left')
-    df['날짜'] = df['날짜'].dt.strftime('%Y%m%d')
+    df['날짜'] = df['날짜'].dt.normalize()
     
-    df['공휴일여부'] = df['공휴일여부'].map({'Y': 1, 'N': 0})
-    df['날짜'] = pd.to_datetime(df['날짜'])
+    # 스냅샷에서 읽으면 category이므로 문자열로 맞춘 뒤 변환
+    df['공휴일여부'] = df['공휴일여부'].astype(str).map({'Y': 1, 'N': 0})
     
     # 날짜에서 필요한 숫자형 파생변수 생성 예시
     df['년'] = df['날짜'].dt.year
@@ -65,17 +228,26 @@ def preprocess(subway, weather, holiday):
 
     return df
 
-df=preprocess(subway, weather, holiday)
 # 인코딩
 # 호선, 역명은 Label Encoding
-le_line = LabelEncoder()
-df['호선_enc'] = le_line.fit_transform(df['호선'])
-le_station = LabelEncoder()
-df['역명_enc'] = le_station.fit_transform(df['역명'])
-
-# 요일은 One-Hot Encoding
-df = pd.get_dummies(df, columns=['요일'])
-print(df)
+# category 컬럼은 고유값(categories)만 인코딩한 뒤 codes로 펼침 (문자열 전체 변환 없음)
+def _fit_label(series):
+    le = LabelEncoder()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.cat.remove_unused_categories()
+        categories = series.cat.categories.astype(str)
+        le.fit(categories)
+        return le, le.transform(categories)[series.cat.codes.to_numpy()].astype('int32')
+    return le, le.fit_transform(series.astype(str)).astype('int32')
+
+def encode(df):
+    le_line, df['호선_enc'] = _fit_label(df['호선'])
+    le_station, df['역명_enc'] = _fit_label(df['역명'])
+
+    # 요일은 One-Hot Encoding
+    df = pd.get_dummies(df, columns=['요일'])
+    return df, le_line, le_station
+
 # Feature와 Target 정의
 features = ['년','월','일',
     '공휴일여부',
@@ -89,75 +261,319 @@ features = ['년','월','일',
     '요일_월', '요일_화', '요일_수', '요일_목', '요일_금', '요일_토', '요일_일'
 ]
 
+# --lag-features: 역별 과거 승하차 피처 추가 (lag_features.FEATURE_NAMES)
+def training_features(lag=False):
+    return features + lag_features.FEATURE_NAMES if lag else list(features)
+
 # 승차와 하차 각각에 대한 모델 학습
-def train_models(df, features):
-    """
-    승차와 하차 각각에 대해 XGBoost와 LightGBM 모델 학습
-    """
-    models = {}
-    
-    for target in ['승차', '하차']:
-        print(f"\n=== {target} 예측 모델 학습 ===")
-        
-        X = df[features]
-        y = df[target]
-        
-        # 학습/검증 데이터 분리
-        X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, shuffle=False)
-        
-        models[target] = {}
-        
-        # XGBoost 모델
-        print("XGBoost 학습 중...")
-        xgb_model = xgb.XGBRegressor(
-            random_state=42,
-            n_estimators=100,
-            learning_rate=0.1,
-            max_depth=6,
-            n_jobs=-1
-        )
-        xgb_model.fit(X_train, y_train)
-        
-        xgb_pred = xgb_model.predict(X_val)
-        xgb_rmse = np.sqrt(mean_squared_error(y_val, xgb_pred))
-        print(f"XGBoost {target} 검증 RMSE: {xgb_rmse:.2f}")
-        
-        models[target]['xgb'] = xgb_model
-        
-        # LightGBM 모델
-        print("LightGBM 학습 중...")
-        lgb_model = lgb.LGBMRegressor(
+TARGETS = ['승차', '하차']
+TRAIN_JOBS = [(target, name) for target in TARGETS for name in ['xgb', 'lgb']]
+
+# 결합형(joint): 승차/하차를 모델 하나로 동시에 예측
+# - XGBoost : multi_output_tree (트리 하나의 leaf가 두 타깃 값을 함께 가짐), predict → (n, 2)
+# - LightGBM: 다중 출력 미지원 → 행을 타깃 수만큼 복제하고 방향 피처(0=승차, 1=하차)를 붙여 학습
+JOINT_JOBS = [('joint', 'xgb'), ('joint', 'lgb')]
+DIRECTION_COL = '방향'
+
+def _make_model(name, n_threads, joint=False):
+    if name == 'xgb':
+        extra = {"tree_method": "hist", "multi_strategy": "multi_output_tree"} if joint else {}
+        return xgb.XGBRegressor(
             random_state=42,
             n_estimators=100,
             learning_rate=0.1,
             max_depth=6,
-            verbose=-1
+            n_jobs=n_threads,
+            **extra
         )
-        lgb_model.fit(X_train, y_train)
-        
-        lgb_pred = lgb_model.predict(X_val)
-        lgb_rmse = np.sqrt(mean_squared_error(y_val, lgb_pred))
-        print(f"LightGBM {target} 검증 RMSE: {lgb_rmse:.2f}")
-        
-        models[target]['lgb'] = lgb_model
-        
+    return lgb.LGBMRegressor(
+        random_state=42,
+        n_estimators=100,
+        learning_rate=0.1,
+        max_depth=6,
+        n_jobs=n_threads,
+        verbose=-1
+    )
+
+PREDICT_N_JOBS = {'xgb': -1, 'lgb': None}
+
+# 방향 피처를 맨 뒤에 붙여 타깃 수만큼 세로로 이어 붙임 (예측 Lambda의 _predict_targets와 같은 순서)
+def _stack_directions(X, Y=None):
+    X_stacked = pd.concat([X.assign(**{DIRECTION_COL: j}) for j in range(len(TARGETS))], ignore_index=True)
+    if Y is None:
+        return X_stacked
+    return X_stacked, np.concatenate([Y[t].to_numpy() for t in TARGETS])
+
+# 프로세스 풀 워커가 fork로 물려받는 학습 데이터 (pickle 복사 없이 공유)
+_SPLITS = {}
+
+def _fit_job(target, name, n_threads):
+    X_train, X_val, y_train, y_val = _SPLITS[target]
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    model = _make_model(name, n_threads, joint=target == 'joint')
+    if target != 'joint':
+        model.fit(X_train, y_train)
+        pred = model.predict(X_val)
+    elif name == 'xgb':
+        model.fit(X_train, y_train)
+        P = model.predict(X_val)
+        pred = {t: P[:, j] for j, t in enumerate(TARGETS)}
+    else:
+        model.fit(*_stack_directions(X_train, y_train))
+        P = model.predict(_stack_directions(X_val)).reshape(len(TARGETS), len(X_val))
+        pred = {t: P[j] for j, t in enumerate(TARGETS)}
+    # 저장되는 모델은 예측 Lambda에서 모든 코어를 쓰도록 스레드 설정을 기존 값으로 복원
+    model.set_params(n_jobs=PREDICT_N_JOBS[name])
+    return {
+        "target": target,
+        "name": name,
+        "model": model,
+        "pred": pred,
+        "wall_sec": time.perf_counter() - wall0,
+        "cpu_sec": time.process_time() - cpu0,   # 프로세스 전체(모든 스레드) CPU 시간
+    }
+
+def _thread_budget(workers, cores=None):
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // workers)
+
+def train_models(df, features, workers=1, threads=None, report=None, layout="split"):
+    """
+    승차와 하차 각각에 대해 XGBoost와 LightGBM 모델 학습
+    layout="split" : 타깃별 모델 (승차/하차 × XGBoost/LightGBM = 4개)
+    layout="joint" : 모델별로 승차·하차를 함께 예측하는 모델 1개씩 (2개)
+    workers=1  : 조합을 차례로 학습 (각각 모든 코어 사용)
+    workers>1  : 프로세스 풀에서 동시에 학습, 작업당 threads개 스레드 (기본 코어 수 // workers)
+                 → 코어 수를 넘는 스레드가 생기지 않음
+    report에 dict를 넘기면 wall/CPU 시간, 코어 활용률, 조합별 검증 RMSE를 기록
+    """
+    jobs = JOINT_JOBS if layout == "joint" else TRAIN_JOBS
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs), cores))
+    threads = threads or _thread_budget(workers, cores)
+    # 학습/검증 데이터 분리
+    if layout == "joint":
+        _SPLITS['joint'] = train_test_split(df[features], df[TARGETS], test_size=0.2, shuffle=False)
+    else:
+        for target in TARGETS:
+            _SPLITS[target] = train_test_split(df[features], df[target], test_size=0.2, shuffle=False)
+
+    wall0 = time.perf_counter()
+    if workers <= 1:
+        results = [_fit_job(target, name, threads) for target, name in jobs]
+    else:
+        # fork: 부모가 OpenMP를 한 번도 쓰지 않은 상태에서 워커를 만들어야 안전
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(_fit_job, target, name, threads) for target, name in jobs]
+            results = [f.result() for f in futures]
+    wall = time.perf_counter() - wall0
+
+    if layout == "joint":
+        models = {"joint": {r["name"]: r["model"] for r in results},
+                  "targets": list(TARGETS),
+                  "direction_col": {"xgb": None, "lgb": DIRECTION_COL}}
+    else:
+        models = {target: {r["name"]: r["model"] for r in results if r["target"] == target}
+                  for target in TARGETS}
+
+    rmses = {}
+    for target in TARGETS:
+        print(f"\n=== {target} 예측 모델 학습 ===")
+        y_val = _SPLITS['joint'][3][target] if layout == "joint" else _SPLITS[target][3]
+        preds = {}
+        for r in results:
+            if r["target"] not in (target, 'joint'):
+                continue
+            pred = r["pred"][target] if layout == "joint" else r["pred"]
+            label = "XGBoost" if r["name"] == 'xgb' else "LightGBM"
+            rmse = np.sqrt(mean_squared_error(y_val, pred))
+            print(f"{label} {target} 검증 RMSE: {rmse:.2f} ({r['wall_sec']:.1f}s)")
+            preds[r["name"]] = pred
+            rmses[f"{target}_{r['name']}"] = round(float(rmse), 2)
+
         # 앙상블 성능
-        ensemble_pred = (xgb_pred + lgb_pred) / 2
+        ensemble_pred = (preds['xgb'] + preds['lgb']) / 2
         ensemble_rmse = np.sqrt(mean_squared_error(y_val, ensemble_pred))
         print(f"Ensemble {target} 검증 RMSE: {ensemble_rmse:.2f}")
-    
+        rmses[f"{target}_ens"] = round(float(ensemble_rmse), 2)
+    _SPLITS.clear()
+
+    cpu = sum(r["cpu_sec"] for r in results)
+    summary = {
+        "layout": layout,
+        "workers": workers,
+        "threads_per_job": threads,
+        "cores": cores,
+        "wall_sec": round(wall, 1),
+        "cpu_sec": round(cpu, 1),
+        "core_utilization": round(cpu / (wall * cores), 2) if wall else None,
+        "fit_sec": {f"{r['target']}_{r['name']}": round(r["wall_sec"], 2) for r in results},
+        "rmse": rmses,
+    }
+    print(f"학습 시간 {summary['wall_sec']}s (CPU {summary['cpu_sec']}s, "
+          f"코어 활용률 {summary['core_utilization']:.0%}, workers={workers} × threads={threads})")
+    if report is not None:
+        report.update(summary)
     return models
 
-# 모델 학습
-models = train_models(df, features)
+# train_test_split(shuffle=False, test_size=0.2)에서 학습 구간에 들어간 마지막 날짜
+# (pivot 결과는 날짜순 정렬)
+def _train_until(df, test_size=0.2):
+    n_train = len(df) - math.ceil(len(df) * test_size)
+    return df['날짜'].iloc[:n_train].max()
+
+# ===== 증분(warm-start) 학습 =====
+# 기존 인코더로 변환, 학습 때 없던 호선/역명은 제외 (전체 재학습 필요)
+def encode_with(df, le_line, le_station):
+    known = df['호선'].astype(str).isin(le_line.classes_) & df['역명'].astype(str).isin(le_station.classes_)
+    dropped = int((~known).sum())
+    df = df[known].reset_index(drop=True)
+    df['호선_enc'] = le_line.transform(df['호선'].astype(str)).astype('int32')
+    df['역명_enc'] = le_station.transform(df['역명'].astype(str)).astype('int32')
+    df = pd.get_dummies(df, columns=['요일'])
+    return df, dropped
+
+# 새 데이터에 없는 요일/날씨 컬럼은 0 (예측 Lambda와 동일)
+def _feature_matrix(df, features):
+    return df.reindex(columns=features, fill_value=0).astype('float32')
+
+def _continue_xgb(old, X, y, update, add_trees):
+    booster = old.get_booster()
+    if update == "refit":
+        # 트리 구조는 그대로 두고 leaf 값만 새 데이터로 갱신
+        # (refresh는 sklearn 래퍼가 쓰는 QuantileDMatrix를 지원하지 않아 xgb.train + DMatrix 사용)
+        model = copy.deepcopy(old)
+        params = {"process_type": "update", "updater": "refresh", "refresh_leaf": True,
+                  "objective": old.get_params()["objective"]}
+        model._Booster = xgb.train(params, xgb.DMatrix(X, label=y),
+                                   num_boost_round=booster.num_boosted_rounds(), xgb_model=booster)
+        return model
+    params = old.get_params()
+    params.update(n_estimators=add_trees)
+    model = xgb.XGBRegressor(**params)
+    model.fit(X, y, xgb_model=booster)
+    return model
+
+def _continue_lgb(old, X, y, update, add_trees):
+    if update == "refit":
+        model = copy.deepcopy(old)
+        # sklearn 래퍼는 refit을 제공하지 않아 내부 Booster를 교체 (XGBoost refit도 동일)
+        model._Booster = old.booster_.refit(X, y, decay_rate=REFIT_DECAY)
+        return model
+    params = old.get_params()
+    params.update(n_estimators=add_trees)
+    model = lgb.LGBMRegressor(**params)
+    model.fit(X, y, init_model=old.booster_)
+    return model
+
+# 부스터의 트리(라운드) 수 - LGBMRegressor는 booster_, XGBRegressor는 get_booster()
+def _num_trees(model):
+    booster = getattr(model, "booster_", None)
+    if booster is not None:
+        return booster.num_trees()
+    return model.get_booster().num_boosted_rounds()
+
+def _rmse(y, pred):
+    return float(np.sqrt(mean_squared_error(y, pred)))
+
+def incremental_update(models, df, features, holdout_days=HOLDOUT_DAYS, update="trees",
+                       add_trees=ADD_TREES, tolerance=RMSE_TOLERANCE, max_trees=MAX_TREES):
+    """
+    기존 모델에 새 날짜 데이터만 이어서 학습
+    - 마지막 holdout_days일은 검증용: 기존 모델 vs 갱신 모델 RMSE 비교
+    - 갱신 모델 RMSE <= 기존 RMSE * (1 + tolerance) 인 조합만 교체
+    - trees 모드에서 트리를 더하면 max_trees를 넘는 모델은 refit으로 갱신 (모델 크기/예측 시간 상한)
+    반환: (모델, 조합별 결과, 학습에 사용한 마지막 날짜 or None)
+    """
+    cut = df['날짜'].max() - pd.Timedelta(days=holdout_days)
+    train, hold = df[df['날짜'] <= cut], df[df['날짜'] > cut]
+    if train.empty or hold.empty:
+        return models, {}, None
+
+    X_train, X_hold = _feature_matrix(train, features), _feature_matrix(hold, features)
+    updated, results = {}, {}
+    for target in ['승차', '하차']:
+        updated[target] = {}
+        for name, cont in [('xgb', _continue_xgb), ('lgb', _continue_lgb)]:
+            old = models[target][name]
+            mode = update
+            if update == "trees" and _num_trees(old) + add_trees > max_trees:
+                mode = "refit"
+                print(f"{name.upper()} {target} 트리 {_num_trees(old)}개 - 상한 {max_trees}개라 refit으로 갱신 "
+                      f"(--mode full 재학습 시 초기화)")
+            t0 = time.perf_counter()
+            new = cont(old, X_train, train[target], mode, add_trees)
+            old_rmse = _rmse(hold[target], old.predict(X_hold))
+            new_rmse = _rmse(hold[target], new.predict(X_hold))
+            accepted = new_rmse <= old_rmse * (1 + tolerance)
+            updated[target][name] = new if accepted else old
+            results[f"{target}_{name}"] = {
+                "old_rmse": round(old_rmse, 2),
+                "new_rmse": round(new_rmse, 2),
+                "accepted": bool(accepted),
+                "update": mode,
+                "trees": _num_trees(updated[target][name]),
+                "fit_sec": round(time.perf_counter() - t0, 1),
+            }
+            print(f"{name.upper()} {target} 검증 RMSE: {old_rmse:.2f} → {new_rmse:.2f} "
+                  f"({'반영' if accepted else '유지'})")
+    return updated, results, train['날짜'].max()
 
 # S3 저장
 # XGB / LGB 따로
 bucket = "subway-whitenut-bucket"
 prefix = ""  # 루트에 저장
 
+def load_models_from_s3(bucket, prefix=""):
+    s3 = storage.client()
+
+    def download_joblib(key):
+        obj = s3.get_object(Bucket=bucket, Key=key)
+        return joblib.load(BytesIO(obj["Body"].read()))
+
+    xgb_only = download_joblib(f"{prefix}model/model_xgb_only.joblib")
+    lgb_only = download_joblib(f"{prefix}model/model_lgb_only.joblib")
+    if "joint" in xgb_only or "joint" in lgb_only:
+        raise SystemExit("결합형(joint) 모델은 증분 학습 미지원 - --mode full 로 재학습")
+    models = {t: {"xgb": xgb_only[t]["xgb"], "lgb": lgb_only[t]["lgb"]} for t in ['승차', '하차']}
+    return (models,
+            download_joblib(f"{prefix}model/line_encoder.joblib"),
+            download_joblib(f"{prefix}model/station_encoder.joblib"),
+            download_joblib(f"{prefix}model/features.joblib"))
+
+def read_training_state(bucket, prefix=""):
+    s3 = storage.client()
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=f"{prefix}{STATE_KEY}")
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(obj["Body"].read().decode("utf-8"))
+
+def write_training_state(bucket, prefix, watermark, mode, results=None):
+    state = {
+        "watermark": pd.Timestamp(watermark).strftime("%Y-%m-%d"),
+        "mode": mode,
+        "results": results or {},
+        "trained_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    }
+    storage.client().put_object(Bucket=bucket, Key=f"{prefix}{STATE_KEY}",
+                                Body=json.dumps(state, ensure_ascii=False).encode("utf-8"),
+                                ContentType="application/json")
+    return state
+
+# 모델 파일 하나(XGB 또는 LGB)에 들어갈 dict
+# 분리형: {"승차": {"xgb": m}, "하차": {"xgb": m}}
+# 결합형: {"joint": {"xgb": m}, "targets": ["승차", "하차"], "direction_col": None 또는 "방향"}
+def model_file_payload(models, name):
+    if "joint" in models:
+        return {"joint": {name: models["joint"][name]},
+                "targets": models["targets"],
+                "direction_col": models["direction_col"][name]}
+    return {target: {name: models[target][name]} for target in TARGETS}
+
 def save_to_s3_split(models, le_line, le_station, features, bucket, prefix=""):
-    s3 = boto3.client('s3')
+    s3 = storage.client()
 
     def upload_joblib(obj, key):
         buf = BytesIO()
@@ -166,23 +582,173 @@ def save_to_s3_split(models, le_line, le_station, features, bucket, prefix=""):
         s3.upload_fileobj(buf, bucket, key)
 
     # XGBoost만
-    xgb_only = {
-        "승차": {"xgb": models["승차"]["xgb"]},
-        "하차": {"xgb": models["하차"]["xgb"]}
-    }
-    upload_joblib(xgb_only, f"{prefix}model/model_xgb_only.joblib")
+    upload_joblib(model_file_payload(models, "xgb"), f"{prefix}model/model_xgb_only.joblib")
 
     # LightGBM만
-    lgb_only = {
-        "승차": {"lgb": models["승차"]["lgb"]},
-        "하차": {"lgb": models["하차"]["lgb"]}
-    }
-    upload_joblib(lgb_only, f"{prefix}model/model_lgb_only.joblib")
+    upload_joblib(model_file_payload(models, "lgb"), f"{prefix}model/model_lgb_only.joblib")
 
     # 인코더/피처
     upload_joblib(le_line,     f"{prefix}model/line_encoder.joblib")
     upload_joblib(le_station,  f"{prefix}model/station_encoder.joblib")
     upload_joblib(features,    f"{prefix}model/features.joblib")
 
-# 저장 실행
-save_to_s3_split(models, le_line, le_station, features, bucket, prefix)
+    # 예측 Lambda용 번들 (모델 하나 + 인코더 + 피처를 파일 하나로, model_bundle.py)
+    for name, key in model_bundle.BUNDLE_KEYS.items():
+        body = model_bundle.to_bytes(model_file_payload(models, name), features, le_line, le_station, name)
+        s3.put_object(Bucket=bucket, Key=f"{prefix}{key}", Body=body, ContentType="application/octet-stream")
+
+# 학습 이력 끝까지 반영한 lag 상태 저장 → 이후에는 전처리 Lambda가 하루씩 이어서 갱신
+def save_lag_state(df, bucket, prefix=""):
+    state = lag_features.build_state(df)
+    lag_features.save_state_s3(storage.client(), bucket, state, f"{prefix}{lag_features.STATE_KEY}")
+    return state
+
+def build_training_frame(engine, chunk_rows=CHUNK_ROWS, cache_dir=None, snapshot_dir=None, lag=False):
+    """
+    학습 프레임 (df, le_line, le_station)
+    cache_dir을 주면 원본 워터마크가 같을 때 SQL 로드/전처리를 건너뛰고 캐시 사용,
+    캐시가 없으면 전처리/인코딩까지 마친 프레임을 저장
+    snapshot_dir을 주면 스냅샷에 새 날짜만 추가한 뒤 스냅샷에서 로드
+    lag=True면 역별 lag/rolling 피처 컬럼 추가
+    """
+    key = watermark = None
+    used = training_features(lag)
+    if cache_dir:
+        watermark = dataset_cache.source_watermark(engine)
+        key = dataset_cache.cache_key(watermark, used)
+        cached = dataset_cache.load_frame(cache_dir, key)
+        if cached:
+            print(f"데이터셋 캐시 사용: {key}")
+            return cached
+
+    # 데이터 불러오기 (청크 스트리밍 + 컴팩트 타입)
+    if snapshot_dir:
+        print(snapshot.update(engine, snapshot_dir, chunk_rows))
+    subway, weather, holiday, report = load_training_data(engine, chunk_rows, snapshot_dir=snapshot_dir)
+    print_memory_report(report)
+
+    df = preprocess(subway, weather, holiday)
+    del subway, weather, holiday
+    if lag:
+        t0 = time.perf_counter()
+        df, _ = lag_features.add_training_features(df)
+        print(f"lag 피처 {len(lag_features.FEATURE_NAMES)}개 추가 ({time.perf_counter() - t0:.1f}s)")
+    df, le_line, le_station = encode(df)
+    print(df)
+    print(f"전처리 후 {df.memory_usage(deep=True).sum() / 1024 / 1024:.1f}MB, 최대 RSS {_peak_rss_mb()}MB")
+
+    if cache_dir:
+        meta = dataset_cache.save(cache_dir, key, df, used, le_line, le_station, watermark)
+        dataset_cache.prune(cache_dir)
+        print(f"데이터셋 캐시 저장: {key} ({meta['build_sec']}s)")
+    return df, le_line, le_station
+
+def run_full(args, engine):
+    df, le_line, le_station = build_training_frame(engine, args.chunk_rows, args.cache_dir, args.snapshot_dir,
+                                                   args.lag_features)
+    features = training_features(args.lag_features)
+
+    # 모델 학습
+    if args.compare_serial and args.workers > 1:
+        # 병렬을 먼저 실행 (부모 프로세스가 OpenMP를 쓰기 전에 fork)
+        parallel, serial = {}, {}
+        models = train_models(df, features, args.workers, args.threads, report=parallel, layout=args.layout)
+        train_models(df, features, 1, report=serial, layout=args.layout)
+        print(f"직렬 {serial['wall_sec']}s (활용률 {serial['core_utilization']:.0%}) → "
+              f"병렬 {parallel['wall_sec']}s (활용률 {parallel['core_utilization']:.0%}), "
+              f"{serial['wall_sec'] / parallel['wall_sec']:.2f}배")
+    else:
+        models = train_models(df, features, args.workers, args.threads, layout=args.layout)
+
+    # 저장 실행
+    if not args.no_upload:
+        save_to_s3_split(models, le_line, le_station, features, bucket, prefix)
+        if args.lag_features:
+            save_lag_state(df, bucket, prefix)
+        write_training_state(bucket, prefix, _train_until(df), "full" if args.layout == "split" else "full-joint")
+
+def run_incremental(args, engine):
+    state = read_training_state(bucket, prefix)
+    if not state:
+        raise SystemExit(f"{STATE_KEY} 없음 - 먼저 --mode full 로 전체 학습 필요")
+    since = state["watermark"]
+    models, le_line, le_station, saved_features = load_models_from_s3(bucket, prefix)
+    lag = any(f in saved_features for f in lag_features.FEATURE_NAMES)
+
+    # 워터마크 이후 날짜만 로드
+    # lag 피처 모델이면 워터마크 직전 BOOTSTRAP_DAYS일도 함께 읽어 상태를 채운 뒤 그 구간은 버림
+    load_since = since
+    if lag:
+        load_since = (pd.Timestamp(since) - timedelta(days=lag_features.BOOTSTRAP_DAYS)).strftime("%Y-%m-%d")
+    if args.snapshot_dir:
+        print(snapshot.update(engine, args.snapshot_dir, args.chunk_rows))
+    subway, weather, holiday, report = load_training_data(engine, args.chunk_rows, since=load_since,
+                                                          snapshot_dir=args.snapshot_dir)
+    print_memory_report(report)
+    if subway.empty:
+        print(f"{since} 이후 새 데이터 없음")
+        return
+
+    df = preprocess(subway, weather, holiday)
+    del subway, weather, holiday
+    if lag:
+        df, _ = lag_features.add_training_features(df)
+        df = df[df['날짜'] > pd.Timestamp(since)].reset_index(drop=True)
+        if df.empty:
+            print(f"{since} 이후 새 데이터 없음")
+            return
+    df, dropped = encode_with(df, le_line, le_station)
+    if dropped:
+        print(f"학습 때 없던 호선/역명 {dropped}행 제외 (전체 재학습 시 반영)")
+
+    models, results, trained_until = incremental_update(
+        models, df, saved_features, args.holdout_days, args.update, args.add_trees, args.tolerance,
+        args.max_trees)
+    if trained_until is None:
+        print(f"새 데이터가 검증 기간({args.holdout_days}일)보다 짧아 갱신 생략")
+        return
+
+    if args.no_upload:
+        return
+    if any(r["accepted"] for r in results.values()):
+        save_to_s3_split(models, le_line, le_station, saved_features, bucket, prefix)
+        write_training_state(bucket, prefix, trained_until, f"incremental-{args.update}", results)
+        print(f"모델 갱신 완료 (워터마크 {since} → {trained_until:%Y-%m-%d})")
+    else:
+        print("검증 RMSE 기준 미달 - 기존 모델 유지")
+
+def main():
+    parser = argparse.ArgumentParser(description="지하철 승하차 예측 모델 학습")
+    parser.add_argument("--mode", choices=["full", "incremental"], default="full",
+                        help="full: 전체 재학습 / incremental: 기존 모델에 새 날짜만 이어서 학습")
+    parser.add_argument("--update", choices=["trees", "refit"], default="trees",
+                        help="incremental 방식 - trees: 트리 추가 / refit: 기존 트리의 leaf 값만 갱신")
+    parser.add_argument("--add-trees", type=int, default=ADD_TREES, help="trees 모드에서 추가할 트리 수")
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES,
+                        help="trees 모드 모델당 최대 트리 수 (넘으면 refit으로 갱신)")
+    parser.add_argument("--holdout-days", type=int, default=HOLDOUT_DAYS, help="증분 학습 검증 기간(일)")
+    parser.add_argument("--tolerance", type=float, default=RMSE_TOLERANCE, help="허용 RMSE 악화 비율")
+    parser.add_argument("--layout", choices=["split", "joint"], default="split",
+                        help="split: 승차/하차 모델 분리 / joint: 승차·하차를 한 모델로 동시 예측")
+    parser.add_argument("--workers", type=int, default=len(TRAIN_JOBS),
+                        help="full 모드에서 동시에 학습할 조합 수 (1이면 직렬)")
+    parser.add_argument("--threads", type=int, default=None, help="작업당 스레드 수 (기본: 코어 수 // workers)")
+    parser.add_argument("--compare-serial", action="store_true", help="직렬 학습도 실행해 시간/코어 활용률 비교")
+    parser.add_argument("--cache-dir", default=None,
+                        help=f"데이터셋 캐시 폴더 (예: {dataset_cache.CACHE_DIR}), 원본이 같으면 로드/전처리 생략")
+    parser.add_argument("--snapshot-dir", default=None,
+                        help=f"학습 스냅샷 폴더 (예: {snapshot.SNAPSHOT_DIR}), 새 날짜만 DB에서 추가한 뒤 로컬 Parquet에서 로드")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="DB에서 한 번에 읽을 행 수")
+    parser.add_argument("--lag-features", action="store_true",
+                        help="역별 지난주 같은 요일/7·28일 평균/공휴일 보정 기준선 피처 추가 (lag 상태도 S3에 저장)")
+    parser.add_argument("--no-upload", action="store_true", help="학습만 하고 S3 저장은 생략")
+    args = parser.parse_args()
+
+    engine = _create_engine()
+    if args.mode == "incremental":
+        run_incremental(args, engine)
+    else:
+        run_full(args, engine)
+
+if __name__ == "__main__":
+    main()